@@ -147,6 +147,26 @@ MEDIA_ROOT = BASE_DIR / "media"
 AUTH_USER_MODEL = "accounts.CustomUser"
 
 STRIPE_API_KEY = env("STRIPE_API_KEY")
+# Durée de blocage des places pendant le paiement (Stripe impose au moins 30 minutes pour une session :
+# une valeur plus courte est portée à 31 minutes)
+SEAT_HOLD_MINUTES = env.int("SEAT_HOLD_MINUTES", 31)
+
+# File de traitement des commandes (webhook Stripe -> worker "manage.py run_fulfilment_worker")
+FULFILMENT_MAX_ATTEMPTS = env.int("FULFILMENT_MAX_ATTEMPTS", 5)
+# Délai (secondes) avant la 1re nouvelle tentative, doublé à chaque échec
+FULFILMENT_RETRY_BACKOFF = env.int("FULFILMENT_RETRY_BACKOFF", 30)
+# Au-delà de ce délai (secondes), une tâche "en cours" est considérée abandonnée par son worker
+FULFILMENT_LOCK_TIMEOUT = env.int("FULFILMENT_LOCK_TIMEOUT", 600)
+# Durée de conservation des identifiants d'événements Stripe déjà traités (Stripe relance pendant 3 jours)
+STRIPE_EVENT_RETENTION_DAYS = env.int("STRIPE_EVENT_RETENTION_DAYS", 30)
+
+# File d'envoi des emails (worker "manage.py deliver_outbox", une connexion SMTP réutilisée par worker)
+OUTBOX_BATCH_SIZE = env.int("OUTBOX_BATCH_SIZE", 50)
+OUTBOX_MAX_ATTEMPTS = env.int("OUTBOX_MAX_ATTEMPTS", 5)
+# Délai (secondes) avant la 1re nouvelle tentative d'envoi, doublé à chaque échec
+OUTBOX_RETRY_BACKOFF = env.int("OUTBOX_RETRY_BACKOFF", 60)
+# Au-delà de ce délai (secondes), un email "en cours d'envoi" est considéré abandonné par son worker
+OUTBOX_LOCK_TIMEOUT = env.int("OUTBOX_LOCK_TIMEOUT", 300)
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -160,5 +180,47 @@ EMAIL_HOST_PASSWORD = env('EMAIL_PWD')
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
 
+# Clés Fernet des QR Codes (la 1re chiffre, toutes déchiffrent) : "manage.py generate_qr_key" pour en créer une
+QR_CODE_KEYS = env.list("QR_CODE_KEYS", default=[])
+# Jetons des scanners autorisés à interroger le contrôle d'accès (en-tête "Authorization: Token <jeton>")
+GATE_API_TOKENS = env.list("GATE_API_TOKENS", default=[])
+# Index des billets valides : délai minimal (secondes) entre deux rafraîchissements incrémentaux
+# et délai au-delà duquel l'index d'un événement est entièrement rechargé (billets annulés)
+GATE_INDEX_REFRESH_INTERVAL = env.float("GATE_INDEX_REFRESH_INTERVAL", 1.0)
+GATE_INDEX_FULL_RELOAD_INTERVAL = env.float("GATE_INDEX_FULL_RELOAD_INTERVAL", 300.0)
+# Nombre maximal de scans acceptés par envoi d'un scanner
+GATE_CHECKIN_BATCH_MAX = env.int("GATE_CHECKIN_BATCH_MAX", 1000)
+# Chargement de l'index de tous les événements au démarrage du serveur (wsgi.py)
+GATE_WARM_INDEX_ON_STARTUP = env.bool("GATE_WARM_INDEX_ON_STARTUP", False)
+# Dossier des manifestes hors ligne des portes ("manage.py export_gate_manifests")
+GATE_MANIFEST_DIR = env("GATE_MANIFEST_DIR", default=str(BASE_DIR / "gate_manifests"))
+
+# Rapport de ventes PDF : processus de rendu (0 : rendu dans le processus du serveur) et durée du cache (secondes)
+SALES_REPORT_PROCESSES = env.int("SALES_REPORT_PROCESSES", 1)
+SALES_REPORT_CACHE_TIMEOUT = env.int("SALES_REPORT_CACHE_TIMEOUT", 3600)
+
+# Nombre d'événements par page du catalogue (cartes affichées par rangées de 3)
+EVENT_CATALOGUE_PAGE_SIZE = env.int("EVENT_CATALOGUE_PAGE_SIZE", 24)
+
+# Nombre maximal de résultats de la recherche d'événements
+EVENT_SEARCH_LIMIT = env.int("EVENT_SEARCH_LIMIT", 48)
+
+# Suggestions de la barre de recherche : nombre maximal de suggestions, délai (secondes) de rechargement complet
+# de l'index en mémoire (modifications faites par les autres processus), durée de cache HTTP des réponses
+# et construction de l'index au démarrage du serveur (wsgi.py)
+AUTOCOMPLETE_TOP_K = env.int("AUTOCOMPLETE_TOP_K", 8)
+AUTOCOMPLETE_FULL_RELOAD_INTERVAL = env.float("AUTOCOMPLETE_FULL_RELOAD_INTERVAL", 300.0)
+AUTOCOMPLETE_CACHE_SECONDS = env.int("AUTOCOMPLETE_CACHE_SECONDS", 60)
+AUTOCOMPLETE_WARM_ON_STARTUP = env.bool("AUTOCOMPLETE_WARM_ON_STARTUP", True)
+
+# Durée de conservation (secondes) des fragments HTML des pages événements (cartes du catalogue, détail)
+EVENT_FRAGMENT_CACHE_TIMEOUT = env.int("EVENT_FRAGMENT_CACHE_TIMEOUT", 3600)
+
+# Catalogue des offres gardé en mémoire par chaque processus : sa version (en base) est relue au plus toutes les
+# OFFER_CATALOGUE_CHECK_INTERVAL secondes, et le catalogue rechargé au plus tard après OFFER_CATALOGUE_MAX_AGE
+# (modification faite sans passer par le modèle). Le prix d'un billet est lu en base à son émission
+OFFER_CATALOGUE_CHECK_INTERVAL = env.float("OFFER_CATALOGUE_CHECK_INTERVAL", 2.0)
+OFFER_CATALOGUE_MAX_AGE = env.float("OFFER_CATALOGUE_MAX_AGE", 60.0)
+
 # Pour redirection vers la page login (décorateur @login_required)
 LOGIN_URL = "/login/"
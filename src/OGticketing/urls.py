@@ -6,8 +6,10 @@ from accounts.views import signup, logout_user, login_user, UpdateProfile, set_d
     contact, activate, UserChangePasswordView, UserChangePasswordDoneView, UserPasswordResetView, \
     UserPasswordResetDoneView, UserPasswordResetConfirmView, UserPasswordCompleteView
 from event_mgmt.views import index_event_mgmt, event_detail, add_to_cart, cart, delete_cart, \
-    create_checkout_session, checkout_success, stripe_webhook, update_quantities, accueil_site, mention, cgv
-from eticketing.views import tickets, SalesByOfferView, generate_sales_pdf
+    create_checkout_session, checkout_success, stripe_webhook, update_quantities, accueil_site, mention, cgv, \
+    event_search, event_autocomplete, fragment_cache_metrics
+from eticketing.views import tickets, SalesByOfferView, generate_sales_pdf, gate_scan, gate_metrics, \
+    gate_checkins, gate_entries, staff_export, event_sales_reports
 
 from OGticketing import settings
 
@@ -35,6 +37,9 @@ urlpatterns = [
     path('delete_address/<int:pk>/', delete_address, name='delete-address'),
     path('contact/', contact, name='contact'),
     path('index_event_mgmt', index_event_mgmt, name='index-event-mgmt'),
+    path('recherche/', event_search, name='event-search'),
+    path('autocomplete/', event_autocomplete, name='event-autocomplete'),
+    path('cache/fragments/', fragment_cache_metrics, name='fragment-cache-metrics'),
     path('stripe_webhook/', stripe_webhook, name='stripe-webhook'),
     path('cart/', cart, name='cart'),
     path('cart/update_quantities/', update_quantities, name='update-quantities'),
@@ -47,6 +52,12 @@ urlpatterns = [
     path('tickets', tickets, name='tickets'),
     path('ventes_par_offre/', SalesByOfferView.as_view(), name='ventes-par-offre'),
     path('generate_sales_pdf/', generate_sales_pdf, name='generate_sales_pdf'),
+    path('exports/<str:kind>/', staff_export, name='staff-export'),
+    path('rapports_evenements/', event_sales_reports, name='event-sales-reports'),
+    path('gate/<int:event_id>/scan/', gate_scan, name='gate-scan'),
+    path('gate/metrics/', gate_metrics, name='gate-metrics'),
+    path('gate/<int:event_id>/checkins/', gate_checkins, name='gate-checkins'),
+    path('gate/<int:event_id>/entries/', gate_entries, name='gate-entries'),
 
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
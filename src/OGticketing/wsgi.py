@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'OGticketing.settings')
 
 application = get_wsgi_application()
+
+# Chargement anticipé de l'index des billets pour que les premiers contrôles d'accès ne paient pas ce coût
+from django.conf import settings  # noqa: E402
+
+if settings.GATE_WARM_INDEX_ON_STARTUP:
+    from eticketing.function.gate import ticket_index  # noqa: E402
+    ticket_index.warm_all()
+
+# Index des suggestions de recherche construit avant la première saisie
+if settings.AUTOCOMPLETE_WARM_ON_STARTUP:
+    from event_mgmt.function.autocomplete import autocomplete_index  # noqa: E402
+    autocomplete_index.rebuild()
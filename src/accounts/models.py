@@ -1,6 +1,5 @@
 import uuid
 
-import stripe
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
 from django.db import models
@@ -9,10 +8,9 @@ from django.shortcuts import get_object_or_404
 from iso3166 import countries
 
 from OGticketing import settings
+from event_mgmt.function.stripe_api import get_stripe
 from event_mgmt.models import Event, Cart, Order
 
-stripe.api_key = settings.STRIPE_API_KEY
-
 
 # Création nouvelle classe de gestion user & superuser (car utilisation d'email pour le login et plus username)
 class CustomUserManager(BaseUserManager):
@@ -122,7 +120,7 @@ class ShippingAddress(models.Model):
         self.default = True
         self.save()
 
-        stripe.Customer.modify(
+        get_stripe().Customer.modify(
             self.user.stripe_id,
             shipping={"name": self.name,
                       "address": self.as_dict()},
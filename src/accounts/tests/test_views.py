@@ -9,6 +9,7 @@ from django.utils.http import urlsafe_base64_encode
 from accounts.forms import ContactForm
 from accounts.models import CustomUser
 from accounts.verification.email_verification_token_generator import email_verification_token
+from event_mgmt.function.outbox import deliver_outbox
 
 
 class LoginUserViewTests(TestCase):
@@ -178,7 +179,10 @@ class ContactViewTest(TestCase):
             'text': 'Test message'
         }
         response = self.client.post(self.contact_url, form_data)
-        self.assertEqual(len(mail.outbox), 2)  # 2 messages devraient être envoyés
+        # 2 messages mis en file, envoyés hors de la requête
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(deliver_outbox(), 2)
+        self.assertEqual(len(mail.outbox), 2)
         self.assertRedirects(response, reverse('contact'))
 
         # Vérification si les messages sont ajoutés dans la session User
@@ -1,12 +1,9 @@
-from smtplib import SMTPException
-
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import PasswordChangeView, PasswordChangeDoneView, PasswordResetView, \
     PasswordResetDoneView, PasswordResetConfirmView, PasswordResetCompleteView
-from django.core.mail import send_mail
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.utils.encoding import force_str
@@ -18,6 +15,7 @@ from accounts.forms import ContactForm, SignUpForm, SignInForm
 from accounts.models import ShippingAddress
 from accounts.verification.email_verification_token_generator import email_verification_token
 from accounts.verification.registration import send_email_verification
+from event_mgmt.function.outbox import queue_email
 
 # Récupération du modèle User nécessaire à la création d'un user dans la fonction signup
 User = get_user_model()
@@ -31,10 +29,8 @@ def signup(request):
             user = form.save(commit=False)
             user.is_active = False
             user.save()
-            try:
-                send_email_verification(request, user)
-            except SMTPException:
-                pass
+            # Email mis en file : aucune connexion SMTP pendant la requête
+            send_email_verification(request, user)
             return redirect('accueil-site')
 
     else:
@@ -130,14 +126,13 @@ def contact(request):
             email = form.cleaned_data["email"]
             subject = form.cleaned_data["subject"]
             text = form.cleaned_data["text"]
-            send_mail(subject=subject, message=f"De la part de {email} - {text}",
-                      recipient_list=[env('EMAIL_ID')], from_email=None)
-            send_mail(subject="Votre demande contact",
-                      message=f"Bonjour {user.first_name if user.is_authenticated else ''},"
-                              f"\n\n Nous avons bien reçu votre demande de support et nous nous "
-                              f"engageons à y répondre dans les plus brefs délais.\n  Bien cordialement \n\n"
-                              f" L'équipe support de la billeterie des JO 2024.",
-                      from_email=None, recipient_list=[email])
+            queue_email(subject=subject, body=f"De la part de {email} - {text}", to=[env('EMAIL_ID')])
+            queue_email(subject="Votre demande contact",
+                        body=f"Bonjour {user.first_name if user.is_authenticated else ''},"
+                             f"\n\n Nous avons bien reçu votre demande de support et nous nous "
+                             f"engageons à y répondre dans les plus brefs délais.\n  Bien cordialement \n\n"
+                             f" L'équipe support de la billeterie des JO 2024.",
+                        to=[email])
             messages.add_message(request, messages.INFO,
                                  "Le message a été envoyé. Si vous ne recevez pas l'email "
                                  "de confirmation, veuillez vérifier vos spams ou renvoyer votre "
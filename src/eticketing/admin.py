@@ -1,5 +1,8 @@
 from django.contrib import admin
-from eticketing.models import Eticket
+from eticketing.models import Eticket, CheckIn, SalesRollup, HourlySalesRollup
 
 
 admin.site.register(Eticket)
+admin.site.register(CheckIn)
+admin.site.register(SalesRollup)
+admin.site.register(HourlySalesRollup)
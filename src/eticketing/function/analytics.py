@@ -0,0 +1,127 @@
+import datetime
+from array import array
+
+import numpy as np
+from django.utils import timezone
+
+from eticketing.models import Eticket, HourlySalesRollup
+
+
+# Calculs de ventes vectorisés sur des colonnes NumPy. Les mêmes fonctions acceptent des billets individuels
+# (poids 1) ou les cumuls horaires (poids = nombre de billets de l'heure), ces derniers restant en O(événements)
+class SalesColumns:
+    def __init__(self, event_ids, offers, timestamps, weights=None, amounts=None):
+        self.event_ids = np.asarray(event_ids, dtype=np.int64)
+        self.offers = np.asarray(offers, dtype=np.int64)
+        # Secondes depuis l'epoch (UTC)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.weights = (np.ones(len(self.event_ids), dtype=np.int64) if weights is None
+                        else np.asarray(weights, dtype=np.int64))
+        # Montant de chaque ligne : prix enregistré du billet, ou revenu du cumul horaire
+        self.amounts = (np.zeros(len(self.event_ids), dtype=np.int64) if amounts is None
+                        else np.asarray(amounts, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    @property
+    def seats(self):
+        # Une offre correspond à un nombre de places (Solo 1, Duo 2, Familiale 4)
+        return self.offers * self.weights
+
+    @property
+    def revenue(self):
+        # Montants enregistrés à la vente (un changement de tarif ne modifie pas les ventes passées)
+        return self.amounts
+
+
+def load_tickets(event_ids=None, chunk_size=20000):
+    # Chargement colonne par colonne des billets émis (tableaux typés, sans liste de tuples intermédiaire)
+    queryset = Eticket.objects.order_by()
+    if event_ids is not None:
+        queryset = queryset.filter(event_id__in=event_ids)
+    events, offers, timestamps, prices = array("q"), array("q"), array("d"), array("q")
+    for event_id, offer, issued_at, price in queryset.values_list("event_id", "offer", "issued_at", "price").iterator(
+            chunk_size=chunk_size):
+        events.append(event_id)
+        offers.append(offer)
+        timestamps.append(issued_at.timestamp())
+        prices.append(price or 0)
+    return SalesColumns(np.frombuffer(events, dtype=np.int64), np.frombuffer(offers, dtype=np.int64),
+                        np.frombuffer(timestamps, dtype=np.float64), amounts=np.frombuffer(prices, dtype=np.int64))
+
+
+def load_hourly_rollups(event_ids=None, since=None):
+    # Mêmes colonnes à partir des cumuls horaires : une ligne par (événement, offre, heure)
+    queryset = HourlySalesRollup.objects.filter(tickets__gt=0).order_by()
+    if event_ids is not None:
+        queryset = queryset.filter(event_id__in=event_ids)
+    if since is not None:
+        queryset = queryset.filter(hour__gte=since)
+    rows = list(queryset.values_list("event_id", "offer", "hour", "tickets", "revenue"))
+    return SalesColumns([row[0] for row in rows], [row[1] for row in rows],
+                        [row[2].timestamp() for row in rows], [row[3] for row in rows], [row[4] for row in rows])
+
+
+def _per_event(columns, values, event_ids):
+    # Somme de values par événement, dans l'ordre de event_ids (0 pour un événement sans vente).
+    # Les identifiants sont des clés primaires denses : un bincount indexé par id évite tout tri
+    event_ids = np.asarray(event_ids, dtype=np.int64)
+    if not len(columns) or not len(event_ids):
+        return np.zeros(len(event_ids), dtype=np.float64)
+    size = int(max(columns.event_ids.max(), event_ids.max())) + 1
+    return np.bincount(columns.event_ids, weights=values, minlength=size)[event_ids]
+
+
+def seats_sold(columns, event_ids):
+    return _per_event(columns, columns.seats, event_ids).astype(np.int64)
+
+
+def sell_through(sold, seats_left):
+    # Taux de remplissage : places vendues / jauge initiale (places restantes + vendues). NaN sans jauge
+    sold = np.asarray(sold, dtype=np.float64)
+    capacity = sold + np.asarray([np.nan if left is None else left for left in seats_left], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(capacity > 0, sold / capacity, np.nan)
+
+
+def sales_velocity(columns, event_ids, now, window_hours=24):
+    # Places vendues par heure sur la fenêtre glissante se terminant à now
+    recent = columns.timestamps >= now.timestamp() - window_hours * 3600
+    return _per_event(columns, np.where(recent, columns.seats, 0), event_ids) / window_hours
+
+
+def projected_sell_out(seats_left, velocity, now):
+    # Date d'épuisement prévue au rythme actuel (None : pas de jauge, pas de vente récente ou déjà complet)
+    left = np.asarray([np.nan if value is None else value for value in seats_left], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hours = np.where((velocity > 0) & (left > 0), left / velocity, np.nan)
+    return [None if np.isnan(value) else now + datetime.timedelta(hours=float(value)) for value in hours]
+
+
+def hourly_histogram(columns, start, end):
+    # Billets vendus par heure entre start et end : (début de chaque heure en timestamp, billets)
+    first = np.floor(start.timestamp() / 3600) * 3600
+    edges = np.arange(first, end.timestamp(), 3600)
+    buckets = np.floor((columns.timestamps - first) / 3600).astype(np.int64)
+    inside = (buckets >= 0) & (buckets < len(edges))
+    counts = np.bincount(buckets[inside], weights=columns.weights[inside], minlength=len(edges))
+    return edges, counts.astype(np.int64)
+
+
+def event_analytics(events, now=None, window_hours=24):
+    # Indicateurs par événement, calculés depuis les cumuls horaires :
+    # {event_id: {"seats_sold", "sell_through", "velocity", "sell_out_at"}}
+    now = now or timezone.now()
+    event_ids = [event.pk for event in events]
+    columns = load_hourly_rollups(event_ids)
+    seats_left = [event.eventSeatAvailable for event in events]
+    sold = seats_sold(columns, event_ids)
+    rates = sell_through(sold, seats_left)
+    velocity = sales_velocity(columns, event_ids, now, window_hours)
+    sell_out = projected_sell_out(seats_left, velocity, now)
+    return {event_id: {"seats_sold": int(sold[i]),
+                       "sell_through": None if np.isnan(rates[i]) else float(rates[i]),
+                       "velocity": float(velocity[i]),
+                       "sell_out_at": sell_out[i]}
+            for i, event_id in enumerate(event_ids)}
@@ -0,0 +1,80 @@
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from eticketing.function.qr_payload import decode_payload
+from eticketing.models import CheckIn, Eticket
+
+
+def _scan_time(value, received_at):
+    # Date absente, mal formée ou impossible (30 février) : heure de réception du lot
+    try:
+        scanned_at = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        scanned_at = None
+    if scanned_at is None:
+        return received_at
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    # Horloge de terminal en avance : l'entrée ne peut pas être postérieure à sa réception
+    return min(scanned_at, received_at)
+
+
+def record_checkins(event_id, scans, gate=""):
+    # scans : [{"payload": contenu du QR Code, "scanned_at": date ISO}, ...] envoyés par un scanner.
+    # Renvoie les entrées acceptées, les doublons (avec la première entrée) et les scans refusés
+    received_at = timezone.now()
+    rejected = []
+    entries = {}
+    for position, scan in enumerate(scans):
+        # Un scan mal formé est refusé seul, sans faire échouer les autres entrées du lot
+        payload = scan.get("payload") if isinstance(scan, dict) else None
+        decoded = decode_payload(payload) if isinstance(payload, str) else None
+        if decoded is None:
+            rejected.append({"index": position, "reason": "unreadable"})
+            continue
+        ticket_id, ticket_event_id, _ = decoded
+        if ticket_event_id is not None and ticket_event_id != event_id:
+            rejected.append({"ticket_id": str(ticket_id), "reason": "wrong_event"})
+            continue
+        scanned_at = _scan_time(scan.get("scanned_at"), received_at)
+        # Même billet scanné plusieurs fois dans le lot : seule la première entrée compte
+        if ticket_id not in entries or scanned_at < entries[ticket_id]:
+            entries[ticket_id] = scanned_at
+
+    batch_id = uuid.uuid4()
+    with transaction.atomic():
+        # 1 requête : billets de ce lot réellement émis pour cet événement
+        valid = set(Eticket.objects.filter(event_id=event_id, ticket_id__in=entries)
+                    .values_list("ticket_id", flat=True))
+        for ticket_id in entries.keys() - valid:
+            rejected.append({"ticket_id": str(ticket_id), "reason": "unknown_ticket"})
+
+        # 1 requête : insertion groupée, les billets déjà entrés sont ignorés par la base (contrainte unique)
+        CheckIn.objects.bulk_create(
+            [CheckIn(ticket_id=ticket_id, event_id=event_id, gate=gate, scanned_at=entries[ticket_id],
+                     batch_id=batch_id) for ticket_id in valid],
+            ignore_conflicts=True)
+
+        # 1 requête : relecture pour distinguer les lignes créées par ce lot des entrées antérieures
+        accepted, duplicates = [], []
+        for checkin in CheckIn.objects.filter(ticket_id__in=valid):
+            if checkin.batch_id == batch_id:
+                accepted.append(str(checkin.ticket_id))
+            else:
+                duplicates.append({"ticket_id": str(checkin.ticket_id), "gate": checkin.gate,
+                                   "first_scanned_at": checkin.scanned_at.isoformat()})
+
+    return {"accepted": accepted, "duplicates": duplicates, "rejected": rejected}
+
+
+def entry_stats(event_id, window_minutes=5):
+    # Compteurs d'entrées d'un événement (index événement / heure de scan)
+    since = timezone.now() - timedelta(minutes=window_minutes)
+    checkins = CheckIn.objects.filter(event_id=event_id)
+    total = checkins.count()
+    recent = checkins.filter(scanned_at__gte=since).count()
+    return {"total": total, f"last_{window_minutes}_minutes": recent, "per_minute": recent / window_minutes}
@@ -0,0 +1,124 @@
+import csv
+import datetime
+import json
+import zlib
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from eticketing.models import Eticket
+from event_mgmt.models import Order
+
+
+# Exports disponibles : requête, colonnes exportées (champs values_list) et champ date utilisé par le filtre
+EXPORTS = {
+    "tickets": {
+        "queryset": lambda: Eticket.objects.all(),
+        "columns": ["id", "ticket_id", "user__email", "event_id", "event__eventName", "offer", "qr_status",
+                    "issued_at"],
+        "date_field": "issued_at",
+    },
+    "orders": {
+        "queryset": lambda: Order.objects.filter(ordered=True),
+        "columns": ["id", "user__email", "event_id", "event__eventName", "quantity", "ordered_date"],
+        "date_field": "ordered_date",
+    },
+}
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+# Nombre de lignes lues par requête : la mémoire reste constante quel que soit le volume exporté
+CHUNK_SIZE = 2000
+
+
+def export_rows(kind, event_id=None, since=None, until=None):
+    export = EXPORTS[kind]
+    queryset = export["queryset"]()
+    if event_id is not None:
+        queryset = queryset.filter(event_id=event_id)
+    if since is not None:
+        queryset = queryset.filter(**{f"{export['date_field']}__gte": since})
+    if until is not None:
+        queryset = queryset.filter(**{f"{export['date_field']}__lt": until})
+    # Ordre par clé primaire : un export interrompu peut être repris à partir du dernier id reçu
+    return export["columns"], queryset.order_by("pk").values_list(*export["columns"]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _parse_moment(value):
+    # Date (2024-07-26, minuit) ou date et heure ISO ; sans fuseau, l'heure est celle du site
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        moment = datetime.datetime.combine(day, datetime.time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def export_filters(event=None, since=None, until=None):
+    # Filtres reçus sous forme de texte (paramètres GET ou options de commande)
+    filters = {}
+    if event:
+        if not str(event).isdigit():
+            raise ValueError(f"Invalid event id: {event}")
+        filters["event_id"] = int(event)
+    if since:
+        filters["since"] = _parse_moment(since)
+    if until:
+        filters["until"] = _parse_moment(until)
+    return filters
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+class _Line:
+    # Tampon d'une ligne pour csv.writer : write renvoie la ligne formatée au lieu de l'écrire
+    def write(self, value):
+        return value
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns).encode()
+    for row in rows:
+        yield writer.writerow([_value(value) for value in row]).encode()
+
+
+def jsonl_lines(columns, rows):
+    for row in rows:
+        yield (json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + "\n").encode()
+
+
+def buffered(chunks, size=64 * 1024):
+    # Regroupement des lignes en blocs d'environ size octets (moins d'écritures sur la connexion)
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_chunks(chunks):
+    # Compression gzip à la volée : les octets compressés sont émis au fur et à mesure
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind, export_format="csv", compress=False, **filters):
+    # Générateur d'octets de l'export (CSV ou JSON Lines, éventuellement gzip)
+    columns, rows = export_rows(kind, **filters)
+    chunks = buffered(csv_lines(columns, rows) if export_format == "csv" else jsonl_lines(columns, rows))
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,131 @@
+import hmac
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from eticketing.function.qr_payload import decode_payload
+from eticketing.models import Eticket
+
+
+class TicketIndex:
+    # Index en mémoire des billets valides par événement : {event_id: ensemble des ticket_id}.
+    # Chargé une fois puis complété de façon incrémentale (billets créés après le dernier identifiant connu)
+    def __init__(self):
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def _load(self, event_id, after_pk=0):
+        rows = Eticket.objects.filter(event_id=event_id, pk__gt=after_pk).values_list("pk", "ticket_id")
+        tickets = set()
+        last_pk = after_pk
+        for pk, ticket_id in rows.iterator(chunk_size=5000):
+            tickets.add(ticket_id)
+            last_pk = max(last_pk, pk)
+        return tickets, last_pk
+
+    def warm(self, event_id):
+        tickets, last_pk = self._load(event_id)
+        now = time.monotonic()
+        with self._lock:
+            self._events[event_id] = {"tickets": tickets, "last_pk": last_pk, "refreshed": now, "loaded": now}
+
+    def warm_all(self):
+        for event_id in Eticket.objects.values_list("event_id", flat=True).distinct():
+            self.warm(event_id)
+
+    def refresh(self, event_id):
+        entry = self._events[event_id]
+        tickets, last_pk = self._load(event_id, after_pk=entry["last_pk"])
+        with self._lock:
+            entry["tickets"].update(tickets)
+            entry["last_pk"] = max(entry["last_pk"], last_pk)
+            entry["refreshed"] = time.monotonic()
+
+    def contains(self, event_id, ticket_id):
+        entry = self._events.get(event_id)
+        now = time.monotonic()
+        # Rechargement complet périodique pour oublier les billets supprimés
+        if entry is None or now - entry["loaded"] > settings.GATE_INDEX_FULL_RELOAD_INTERVAL:
+            self.warm(event_id)
+            return ticket_id in self._events[event_id]["tickets"]
+        if ticket_id in entry["tickets"]:
+            return True
+        # Billet inconnu : il vient peut-être d'être émis. Rafraîchissement limité dans le temps pour qu'une
+        # série de faux billets ne se transforme pas en série de requêtes
+        if now - entry["refreshed"] > settings.GATE_INDEX_REFRESH_INTERVAL:
+            self.refresh(event_id)
+            return ticket_id in entry["tickets"]
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+class ScanMetrics:
+    # Compteurs et latences (en secondes) des derniers contrôles effectués par ce processus
+    def __init__(self, size=10000):
+        self._latencies = deque(maxlen=size)
+        self._counts = {"valid": 0, "invalid": 0}
+        self._lock = threading.Lock()
+
+    def record(self, valid, latency):
+        with self._lock:
+            self._latencies.append((time.monotonic(), latency))
+            self._counts["valid" if valid else "invalid"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._latencies)
+            counts = dict(self._counts)
+        latencies = sorted(latency for _, latency in samples)
+        window = samples[-1][0] - samples[0][0] if len(samples) > 1 else 0
+
+        def percentile(rank):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * rank))] * 1000 if latencies else None
+
+        return {**counts,
+                "p50_ms": percentile(0.50), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99),
+                "scans_per_second": len(samples) / window if window else None}
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._counts = {"valid": 0, "invalid": 0}
+
+
+ticket_index = TicketIndex()
+scan_metrics = ScanMetrics()
+
+
+def validate_scan(event_id, payload):
+    started = time.perf_counter()
+    decoded = decode_payload(payload)
+    if decoded is None:
+        result = {"valid": False, "reason": "unreadable"}
+    else:
+        ticket_id, ticket_event_id, offer = decoded
+        # Format compact : un billet d'un autre événement est refusé sans consulter l'index
+        if ticket_event_id is not None and ticket_event_id != event_id:
+            result = {"valid": False, "reason": "wrong_event", "ticket_id": str(ticket_id)}
+        elif ticket_index.contains(event_id, ticket_id):
+            result = {"valid": True, "ticket_id": str(ticket_id), "offer": offer}
+        else:
+            result = {"valid": False, "reason": "unknown_ticket", "ticket_id": str(ticket_id)}
+    scan_metrics.record(result["valid"], time.perf_counter() - started)
+    return result
+
+
+def gate_token_required(view):
+    # Les scanners s'authentifient avec un jeton (en-tête "Authorization: Token <jeton>")
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme != "Token" or not any(hmac.compare_digest(token, allowed) for allowed in settings.GATE_API_TOKENS):
+            return JsonResponse({"error": "forbidden"}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
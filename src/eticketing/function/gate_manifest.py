@@ -0,0 +1,119 @@
+import bisect
+import hashlib
+import mmap
+import os
+import re
+import struct
+from pathlib import Path
+
+# Manifeste hors ligne d'un événement : en-tête fixe puis empreintes des billets (8 octets chacune) triées.
+# Aucune dépendance à Django : le module peut être copié tel quel sur les scanners des portes
+MAGIC = b"OGMF"
+VERSION = 1
+# magic, version, id de l'événement, date de génération (timestamp), nombre d'empreintes, dernier pk exporté
+HEADER = struct.Struct(">4sBIdIQ")
+HASH_SIZE = 8
+
+_FILENAME = re.compile(r"^event-(\d+)(?:\.delta-(\d+))?\.manifest$")
+
+
+def ticket_hash(ticket_id):
+    # Empreinte tronquée de l'UUID du billet : le manifeste ne permet pas de reconstituer les identifiants
+    return hashlib.blake2b(ticket_id.bytes, digest_size=HASH_SIZE).digest()
+
+
+def manifest_path(directory, event_id, after_pk=None):
+    # Export complet : event-<id>.manifest, delta : event-<id>.delta-<dernier pk du fichier précédent>.manifest
+    name = f"event-{event_id}.manifest" if after_pk is None else f"event-{event_id}.delta-{after_pk:012d}.manifest"
+    return Path(directory) / name
+
+
+def write_manifest(path, event_id, hashes, generated_at, last_pk):
+    hashes = sorted(set(hashes))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Écriture dans un fichier temporaire puis renommage : un scanner ne lit jamais un fichier incomplet
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, event_id, generated_at, len(hashes), last_pk))
+        file.write(b"".join(hashes))
+    os.replace(tmp_path, path)
+    return len(hashes)
+
+
+class GateManifest:
+    # Lecture d'un manifeste par projection en mémoire : seules les pages consultées par la recherche
+    # dichotomique sont chargées, quel que soit le nombre de billets
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.event_id, self.generated_at, self.count, self.last_pk = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a gate manifest: {self.path}")
+        if len(self._map) != HEADER.size + self.count * HASH_SIZE:
+            self.close()
+            raise ValueError(f"Truncated gate manifest: {self.path}")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # Accès indexé utilisé par bisect
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        start = HEADER.size + index * HASH_SIZE
+        return self._map[start:start + HASH_SIZE]
+
+    def contains_hash(self, digest):
+        index = bisect.bisect_left(self, digest)
+        return index < self.count and self[index] == digest
+
+    def __contains__(self, ticket_id):
+        return self.contains_hash(ticket_hash(ticket_id))
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventManifests:
+    # Export complet d'un événement et ses deltas successifs, tels que présents dans directory
+    def __init__(self, directory, event_id):
+        self.event_id = event_id
+        self.manifests = [GateManifest(path) for path in manifest_files(directory, event_id)]
+
+    @property
+    def last_pk(self):
+        return max((manifest.last_pk for manifest in self.manifests), default=0)
+
+    def __contains__(self, ticket_id):
+        digest = ticket_hash(ticket_id)
+        return any(manifest.contains_hash(digest) for manifest in self.manifests)
+
+    def close(self):
+        for manifest in self.manifests:
+            manifest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def manifest_files(directory, event_id):
+    # Export complet puis deltas dans l'ordre de génération ; les deltas antérieurs au dernier export complet
+    # sont supprimés par l'export complet, il n'en reste donc pas à ignorer ici
+    files = []
+    for path in Path(directory).glob(f"event-{event_id}.*manifest"):
+        match = _FILENAME.match(path.name)
+        if match and int(match.group(1)) == event_id:
+            files.append((int(match.group(2) or -1), path))
+    return [path for _, path in sorted(files)]
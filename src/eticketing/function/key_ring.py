@@ -0,0 +1,38 @@
+import base64
+import hashlib
+from functools import cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def _configured_keys():
+    # QR_CODE_KEYS : clés Fernet, la première chiffre les nouveaux billets, les suivantes restent acceptées
+    # au contrôle (rotation). Sans configuration, une clé est dérivée de SECRET_KEY : elle est identique
+    # pour tous les processus et survit aux redémarrages
+    if settings.QR_CODE_KEYS:
+        return [key.encode() for key in settings.QR_CODE_KEYS]
+    digest = hashlib.sha256(f"eticketing.qr_code:{settings.SECRET_KEY}".encode()).digest()
+    return [base64.urlsafe_b64encode(digest)]
+
+
+@cache
+def get_key_ring():
+    # cryptography n'est chargé que pour les QR Codes de l'ancien format (chiffrés)
+    from cryptography.fernet import Fernet, MultiFernet
+
+    return MultiFernet([Fernet(key) for key in _configured_keys()])
+
+
+@cache
+def get_signing_keys():
+    # Clés HMAC des QR Codes compacts, dérivées des mêmes clés (même ordre, donc même rotation)
+    return [hashlib.sha256(b"eticketing.qr_payload:" + key).digest() for key in _configured_keys()]
+
+
+@receiver(setting_changed)
+def reset_key_ring(setting, **kwargs):
+    if setting in ("QR_CODE_KEYS", "SECRET_KEY"):
+        get_key_ring.cache_clear()
+        get_signing_keys.cache_clear()
@@ -1,6 +1,9 @@
-from django.core.mail import EmailMessage
 from django.conf import settings
 
+from eticketing.function.qr_rendering import render_qr_codes
+from eticketing.models import Eticket
+from event_mgmt.function.outbox import queue_email
+
 
 def send_eticket_email(eticket):
     subject = "Votre e-billet pour l'événement"
@@ -13,13 +16,25 @@ def send_eticket_email(eticket):
                f"La Billeterie des Jeux Olympiques de Paris 2024.")
     email_from = settings.EMAIL_HOST_USER
     recipient_list = [eticket.user.email]
-    email = EmailMessage(subject, message, email_from, recipient_list)
 
     # Chemin du fichier QR Code
     qr_code_path = eticket.qr_code.path
 
-    # Ajouter le fichier QR Code comme pièce jointe
-    email.attach_file(qr_code_path)
+    # Mise en file de l'e-mail avec le QR Code en pièce jointe (envoi par "manage.py deliver_outbox"),
+    # une seule fois par billet même si la tâche est rejouée
+    return queue_email(subject, message, recipient_list, from_email=email_from, attachments=[qr_code_path],
+                       key=f"eticket:{eticket.pk}")
+
+
+# Exécutée par le worker après la finalisation d'un panier : génération des QR Codes puis envoi des mails
+def send_issued_etickets(payload):
+    etickets = list(Eticket.objects.filter(pk__in=payload["ticket_ids"]).select_related("user", "event"))
+    render_qr_codes([eticket for eticket in etickets if eticket.qr_status != Eticket.QR_READY])
+
+    for eticket in etickets:
+        if eticket.qr_status != Eticket.QR_READY:
+            # Échec de génération : la tâche sera retentée (les QR Codes déjà générés ne sont pas refaits)
+            raise RuntimeError(f"QR code rendering failed for e-ticket {eticket.pk}")
 
-    # Envoi de l'e-mail
-    email.send()
+    for eticket in etickets:
+        send_eticket_email(eticket)
@@ -0,0 +1,64 @@
+import base64
+import hashlib
+import hmac
+import re
+import struct
+import uuid
+
+from eticketing.function.key_ring import get_key_ring, get_signing_keys
+
+
+# Format compact v1 : version (1 octet), ticket_id (16), id de l'événement (4), offre (1), puis signature HMAC-SHA256
+# tronquée à 10 octets. Les 32 octets sont encodés en base32 sans remplissage (52 caractères A-Z2-7), ce qui
+# permet au QR Code d'utiliser le mode alphanumérique (version 3 au lieu de ~10 pour un jeton Fernet)
+VERSION = 1
+_BODY = struct.Struct(">B16sIB")
+SIGNATURE_SIZE = 10
+_COMPACT = re.compile(r"^[A-Z2-7]{52}$")
+
+
+def _sign(body, key):
+    return hmac.new(key, body, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def encode_payload(ticket_id, event_id, offer):
+    body = _BODY.pack(VERSION, ticket_id.bytes, event_id, offer)
+    return base64.b32encode(body + _sign(body, get_signing_keys()[0])).decode().rstrip("=")
+
+
+def decode_compact_payload(payload):
+    # Renvoie (ticket_id, event_id, offre) ou None si le contenu n'est pas un billet signé valide
+    if not isinstance(payload, str) or not _COMPACT.match(payload):
+        return None
+    raw = base64.b32decode(payload + "====")
+    body, signature = raw[:_BODY.size], raw[_BODY.size:]
+    version, ticket_bytes, event_id, offer = _BODY.unpack(body)
+    if version != VERSION:
+        return None
+    # Toutes les clés du trousseau sont acceptées (billets signés avant une rotation)
+    if not any(hmac.compare_digest(signature, _sign(body, key)) for key in get_signing_keys()):
+        return None
+    return uuid.UUID(bytes=ticket_bytes), event_id, offer
+
+
+# Ancien format (billets émis avant le format compact) : "email,ticket_id,nom de l'événement,offre" chiffré (Fernet)
+def encode_legacy_payload(email, ticket_id, event_name, offer):
+    return get_key_ring().encrypt(",".join([email, str(ticket_id), event_name, str(offer)]).encode()).decode()
+
+
+def decode_legacy_payload(payload):
+    from cryptography.fernet import InvalidToken
+
+    if not isinstance(payload, str):
+        return None
+    # Le nom de l'événement peut contenir des virgules : seuls le 2e et le dernier champ sont utilisés
+    try:
+        fields = get_key_ring().decrypt(payload.encode()).decode().split(",")
+        return uuid.UUID(fields[1]), None, int(fields[-1])
+    except (InvalidToken, ValueError, IndexError, UnicodeDecodeError):
+        return None
+
+
+def decode_payload(payload):
+    # Renvoie (ticket_id, event_id, offre) ; event_id vaut None pour l'ancien format qui ne le contient pas
+    return decode_compact_payload(payload) or decode_legacy_payload(payload)
@@ -0,0 +1,51 @@
+from django.core.files.base import ContentFile
+
+from eticketing.models import Eticket, render_qr_png
+
+
+def _render_batch(batch):
+    # Exécutée dans un processus du pool : uniquement du calcul, aucun accès à la base ni aux fichiers
+    return [(ticket_id, render_qr_png(payload).getvalue()) for ticket_id, payload in batch]
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def render_qr_codes(etickets, executor=None, batch_size=50):
+    # Génère et enregistre les images des billets, renvoie le nombre de QR Codes générés.
+    # Le chiffrement reste dans ce processus (clé), les images sont produites par lots dans le pool
+    # (executor : ProcessPoolExecutor fourni par l'appelant ; sans pool, rendu dans le processus courant)
+    etickets = {eticket.ticket_id: eticket for eticket in etickets}
+    items = [(ticket_id, eticket.qr_code_payload()) for ticket_id, eticket in etickets.items()]
+    batches = list(_batches(items, batch_size))
+
+    if executor is not None:
+        futures = [(batch, executor.submit(_render_batch, batch)) for batch in batches]
+        results = [_batch_result(batch, future.result) for batch, future in futures]
+    else:
+        results = [_batch_result(batch, lambda batch=batch: _render_batch(batch)) for batch in batches]
+
+    rendered = 0
+    for batch_result in results:
+        for ticket_id, png in batch_result:
+            eticket = etickets[ticket_id]
+            if png is None:
+                eticket.qr_status = Eticket.QR_FAILED
+                continue
+            eticket.qr_code.save(f"{ticket_id}.png", ContentFile(png), save=False)
+            eticket.qr_status = Eticket.QR_READY
+            rendered += 1
+
+    # Une seule mise à jour groupée pour tous les billets traités
+    Eticket.objects.bulk_update(etickets.values(), ["qr_code", "qr_status"], batch_size=500)
+    return rendered
+
+
+def _batch_result(batch, get_result):
+    # Un lot en erreur n'empêche pas les autres : ses billets sont marqués en échec
+    try:
+        return get_result()
+    except Exception:
+        return [(ticket_id, None) for ticket_id, _ in batch]
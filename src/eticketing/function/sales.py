@@ -0,0 +1,222 @@
+import hashlib
+import json
+import multiprocessing
+import threading
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+from django.utils.text import slugify
+
+from eticketing.models import Eticket, HourlySalesRollup, SalesRollup
+from event_mgmt.function.offers import offer_label, offers_for
+
+
+def sales_matrix(event_ids):
+    # Ventes par événement et par offre lues dans les cumuls (une ligne par couple événement / offre) :
+    # {event_id: [{"offer", "label", "total", "revenue"}, ...]} trié par offre
+    rows = (SalesRollup.objects.filter(event_id__in=event_ids, tickets__gt=0)
+            .values_list("event_id", "offer", "tickets", "revenue")
+            .order_by("event_id", "offer"))
+    matrix = defaultdict(list)
+    for event_id, offer, tickets, revenue in rows:
+        matrix[event_id].append({"offer": offer, "label": offer_label(offer, event_id),
+                                 "total": tickets, "revenue": revenue})
+    return matrix
+
+
+def offer_totals():
+    # Ventes et revenu par offre, tous événements confondus : {offre: (billets, revenu)}
+    rows = SalesRollup.objects.values("offer").annotate(total=Sum("tickets"), amount=Sum("revenue")).order_by()
+    return {row["offer"]: (row["total"], row["amount"]) for row in rows}
+
+
+def hourly_sales(since):
+    # Billets vendus et revenu par heure depuis since, tous événements confondus
+    return list(HourlySalesRollup.objects.filter(hour__gte=since).values("hour")
+                .annotate(total=Sum("tickets"), amount=Sum("revenue")).order_by("hour"))
+
+
+def rebuild_sales_rollups():
+    # Reconstruction complète des cumuls à partir des billets et de leur prix enregistré (reprise après incident)
+    with transaction.atomic():
+        rows = list(Eticket.objects.values("event_id", "offer", hour=TruncHour("issued_at"))
+                    .annotate(tickets=Count("id"), revenue=Coalesce(Sum("price"), 0)).order_by())
+        totals = defaultdict(lambda: [0, 0])
+        for row in rows:
+            totals[(row["event_id"], row["offer"])][0] += row["tickets"]
+            totals[(row["event_id"], row["offer"])][1] += row["revenue"]
+
+        HourlySalesRollup.objects.all().delete()
+        SalesRollup.objects.all().delete()
+        HourlySalesRollup.objects.bulk_create([HourlySalesRollup(**row) for row in rows], batch_size=1000)
+        SalesRollup.objects.bulk_create(
+            [SalesRollup(event_id=event_id, offer=offer, tickets=tickets, revenue=revenue)
+             for (event_id, offer), (tickets, revenue) in totals.items()], batch_size=1000)
+    return len(totals), len(rows)
+
+
+# Processus de rendu des rapports, créé à la première demande et partagé par tous les threads du serveur
+_report_executor = None
+_report_executor_lock = threading.Lock()
+
+
+def _get_report_executor():
+    global _report_executor
+    with _report_executor_lock:
+        if _report_executor is None:
+            # "spawn" : pas de fork d'un serveur multi-thread (verrous éventuellement tenus par d'autres threads)
+            _report_executor = ProcessPoolExecutor(max_workers=settings.SALES_REPORT_PROCESSES,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+        return _report_executor
+
+
+def _discard_report_executor(executor):
+    # Processus de rendu arrêté (mémoire, signal) : un nouveau pool sera créé à la prochaine demande
+    global _report_executor
+    with _report_executor_lock:
+        if _report_executor is executor:
+            _report_executor = None
+
+
+def _render_in_worker(*args):
+    # matplotlib et reportlab ne sont chargés qu'à la première demande de rapport
+    from eticketing.function.sales_report import build_sales_pdf
+
+    if not settings.SALES_REPORT_PROCESSES:
+        return build_sales_pdf(*args)
+    executor = _get_report_executor()
+    try:
+        return executor.submit(build_sales_pdf, *args).result()
+    except BrokenProcessPool:
+        _discard_report_executor(executor)
+        raise
+
+
+def sales_report_data():
+    # Données du rapport lues dans les cumuls par offre (quelques lignes, quel que soit le nombre de billets)
+    totals = offer_totals()
+    # Offres du catalogue par défaut, même sans vente, et offres propres à un événement ayant des ventes
+    offers = sorted(set(offers_for()) | set(totals))
+    offer_sales = {offer_label(offer): totals.get(offer, (0, 0))[0] for offer in offers}
+    offer_revenue = {offer_label(offer): totals.get(offer, (0, 0))[1] for offer in offers}
+    total_sales = sum(count for count, _ in totals.values())
+    total_revenue = sum(revenue for _, revenue in totals.values())
+    return offer_sales, offer_revenue, total_sales, total_revenue
+
+
+def sales_pdf():
+    # PDF mis en cache sous une clé dérivée des chiffres de ventes : il n'est régénéré que si les ventes
+    # ont changé depuis le dernier téléchargement
+    data = sales_report_data()
+    version = hashlib.sha256(json.dumps(data).encode()).hexdigest()[:32]
+    key = f"eticketing:sales_pdf:{version}"
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = _render_in_worker(*data)
+        cache.set(key, pdf, settings.SALES_REPORT_CACHE_TIMEOUT)
+    return pdf
+
+
+def event_reports_data(events):
+    # Données des rapports par événement lues dans les cumuls (3 requêtes quel que soit le nombre d'événements)
+    event_ids = [event.pk for event in events]
+    offers = defaultdict(list)
+    for event_id, offer, tickets, revenue in (SalesRollup.objects.filter(event_id__in=event_ids, tickets__gt=0)
+                                              .order_by("offer").values_list("event_id", "offer", "tickets",
+                                                                             "revenue")):
+        offers[event_id].append((offer, tickets, revenue))
+    daily = defaultdict(lambda: defaultdict(int))
+    for event_id, hour, tickets in (HourlySalesRollup.objects.filter(event_id__in=event_ids, tickets__gt=0)
+                                    .values_list("event_id", "hour", "tickets")):
+        daily[event_id][timezone.localtime(hour).date()] += tickets
+
+    # Places vendues, rythme de vente et épuisement prévu (calcul vectorisé sur les cumuls horaires)
+    from eticketing.function.analytics import event_analytics
+    analytics = event_analytics(events)
+
+    for event in events:
+        seats_sold = analytics[event.pk]["seats_sold"]
+        sell_out_at = analytics[event.pk]["sell_out_at"]
+        yield {
+            "event_id": event.pk,
+            "name": event.eventName,
+            "date": timezone.localtime(event.eventDateHour).strftime("%d/%m/%Y %H:%M") if event.eventDateHour else "",
+            "place": event.eventPlace,
+            "seats_sold": seats_sold,
+            # eventSeatAvailable est décrémenté à chaque vente : la jauge initiale est la somme des deux
+            "capacity": event.eventSeatAvailable + seats_sold if event.eventSeatAvailable is not None else None,
+            "offers": [(offer_label(offer, event.pk), tickets, revenue)
+                       for offer, tickets, revenue in offers[event.pk]],
+            "daily": [(day.strftime("%d/%m"), tickets) for day, tickets in sorted(daily[event.pk].items())],
+            "velocity": analytics[event.pk]["velocity"],
+            "sell_out": timezone.localtime(sell_out_at).strftime("%d/%m/%Y %H:%M") if sell_out_at else "",
+        }
+
+
+def render_event_reports(events, executor=None, window=None):
+    # Génère les PDF des événements dans le pool de processus, dans l'ordre : (event_id, nom, PDF).
+    # Au plus window rendus sont en cours ou en attente de lecture, la mémoire reste bornée
+    from eticketing.function.sales_report import build_event_pdf
+
+    reports = event_reports_data(events)
+    if executor is None and not settings.SALES_REPORT_PROCESSES:
+        for report in reports:
+            yield report["event_id"], report["name"], build_event_pdf(report)
+        return
+
+    executor = executor or _get_report_executor()
+    window = window or 2 * max(1, settings.SALES_REPORT_PROCESSES)
+    pending = deque()
+    try:
+        for report in reports:
+            pending.append((report["event_id"], report["name"], executor.submit(build_event_pdf, report)))
+            if len(pending) >= window:
+                event_id, name, future = pending.popleft()
+                yield event_id, name, future.result()
+        while pending:
+            event_id, name, future = pending.popleft()
+            yield event_id, name, future.result()
+    except BrokenProcessPool:
+        _discard_report_executor(executor)
+        raise
+    finally:
+        # Téléchargement interrompu : les rendus pas encore démarrés sont annulés
+        for _, _, future in pending:
+            future.cancel()
+
+
+class _ZipOutput:
+    # Flux d'écriture non positionnable : zipfile ajoute alors un descripteur après chaque fichier et n'a pas
+    # besoin de revenir en arrière, l'archive peut être envoyée au fur et à mesure
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def event_reports_zip(events, executor=None, window=None):
+    # Archive ZIP des rapports par événement, produite par morceaux (un morceau par PDF)
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for event_id, name, pdf in render_event_reports(events, executor=executor, window=window):
+            archive.writestr(f"{event_id:05d}-{slugify(name) or 'evenement'}.pdf", pdf)
+            yield output.take()
+    yield output.take()
@@ -0,0 +1,163 @@
+from io import BytesIO
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+
+# Rendu du rapport de ventes sans Django ni état global pyplot : exécuté dans un processus séparé
+# (eticketing.function.sales.sales_pdf), il reçoit uniquement des données sérialisables et renvoie le PDF
+def pie_chart_png(offer_sales):
+    # Figure autonome (API objet) : aucun état partagé entre threads ou rendus successifs
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.pie(list(offer_sales.values()), labels=list(offer_sales.keys()), autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+
+    # Sauvegarde du graphique dans un objet BytesIO
+    image_buffer = BytesIO()
+    fig.savefig(image_buffer, format='png')
+    image_buffer.seek(0)
+    return image_buffer
+
+
+def build_sales_pdf(offer_sales, offer_revenue, total_sales, total_revenue):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    # Calculer la position pour centrer le titre
+    title = "Rapport de ventes pour la billetterie des J.O."
+    title_x = (width - p.stringWidth(title, "Helvetica-Bold", 16)) / 2
+    title_y = height - 50
+
+    # En-tête
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(title_x, title_y, title)
+
+    # Encadrer le titre
+    p.setStrokeColor(colors.black)
+    p.setLineWidth(1)
+    p.rect(title_x - 10, title_y - 10, p.stringWidth(title, "Helvetica-Bold", 16) + 20, 30, stroke=1, fill=0)
+
+    # Pied de page
+    p.setFont("Helvetica", 10)
+    p.drawString(30, 30, "Rapport généré par le site 'steveparis.pythonanywhere.com'")
+
+    # Ajout du graphique au PDF avec une position ajustée
+    p.drawImage(ImageReader(pie_chart_png(offer_sales)), 50, height - 350, width=500, height=250)
+
+    # Ajout des données de ventes dans un tableau
+    data = [['Offre', 'Nombre de Ventes', 'Revenu Total']]
+    for offer, count in offer_sales.items():
+        data.append([offer, count, offer_revenue[offer]])
+
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    # Calculer la position pour centrer le tableau
+    table_width, table_height = table.wrap(0, 0)
+    table_x = (width - table_width) / 2
+    table_y = height - 500
+
+    table.drawOn(p, table_x, table_y)
+
+    # Styliser les textes pour le bas de la page
+    p.setFont("Helvetica-Bold", 18)
+    sales_text = f"Nombre total de ventes: {total_sales}"
+    revenue_text = f"Revenu total: {total_revenue}€"
+    sales_text_x = (width - p.stringWidth(sales_text, "Helvetica-Bold", 18)) / 2
+    revenue_text_x = (width - p.stringWidth(revenue_text, "Helvetica-Bold", 18)) / 2
+    p.drawString(sales_text_x, 200, sales_text)
+    p.drawString(revenue_text_x, 160, revenue_text)
+
+    # Finaliser et sauvegarder le PDF
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def daily_sales_png(daily):
+    fig = Figure(figsize=(8, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.bar([day for day, _ in daily], [tickets for _, tickets in daily], color="#4a90d9")
+    ax.set_ylabel("Billets vendus")
+    ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+    fig.tight_layout()
+
+    image_buffer = BytesIO()
+    fig.savefig(image_buffer, format='png')
+    image_buffer.seek(0)
+    return image_buffer
+
+
+def build_event_pdf(report):
+    # Rapport d'un événement : ventes par offre, taux de remplissage et ventes par jour
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawCentredString(width / 2, height - 50, f"Rapport de ventes : {report['name']}")
+    p.setFont("Helvetica", 11)
+    p.drawCentredString(width / 2, height - 70, " - ".join(filter(None, [report["date"], report["place"]])))
+
+    # Taux de remplissage (places vendues / jauge initiale)
+    p.setFont("Helvetica-Bold", 13)
+    if report["capacity"]:
+        fill_rate = report["seats_sold"] / report["capacity"] * 100
+        p.drawString(50, height - 110, f"Places vendues : {report['seats_sold']} / {report['capacity']} "
+                                       f"({fill_rate:.1f} %)")
+    else:
+        p.drawString(50, height - 110, f"Places vendues : {report['seats_sold']} (jauge non renseignée)")
+
+    # Rythme de vente sur les dernières 24 heures et date d'épuisement prévue à ce rythme
+    p.setFont("Helvetica", 11)
+    pace = f"Rythme de vente (24 h) : {report['velocity']:.1f} place(s) / heure"
+    if report["sell_out"]:
+        pace += f" - épuisement prévu le {report['sell_out']}"
+    p.drawString(50, height - 128, pace)
+
+    # Ventes par offre
+    data = [['Offre', 'Nombre de Ventes', 'Revenu Total']]
+    data += [[label, tickets, f"{revenue} €"] for label, tickets, revenue in report["offers"]]
+    data.append(['Total', sum(row[1] for row in report["offers"]),
+                 f"{sum(row[2] for row in report['offers'])} €"])
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+    table_width, table_height = table.wrap(0, 0)
+    table.drawOn(p, (width - table_width) / 2, height - 150 - table_height)
+
+    # Ventes par jour
+    if report["daily"]:
+        p.setFont("Helvetica-Bold", 13)
+        p.drawString(50, height - 330, "Ventes par jour")
+        p.drawImage(ImageReader(daily_sales_png(report["daily"])), 50, height - 560, width=500, height=200)
+
+    p.setFont("Helvetica", 10)
+    p.drawString(30, 30, "Rapport généré par le site 'steveparis.pythonanywhere.com'")
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
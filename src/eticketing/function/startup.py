@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+
+# Bibliothèques lourdes qui ne doivent être chargées qu'à la première utilisation (paiement, rapports, QR Codes)
+HEAVY_MODULES = ("stripe", "matplotlib", "reportlab", "qrcode", "cryptography", "PIL", "numpy")
+
+# Imports réalisés par les chemins qui en ont besoin, pour mesurer un worker qui les aurait chargés au démarrage
+EAGER_IMPORTS = ("stripe", "matplotlib.figure", "matplotlib.backends.backend_agg", "reportlab.pdfgen.canvas",
+                 "reportlab.platypus", "qrcode", "cryptography.fernet")
+
+_PROBE = """
+import importlib, json, sys
+import django
+django.setup()
+import OGticketing.urls
+for name in {imports!r}:
+    importlib.import_module(name)
+rss = None
+try:
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+except OSError:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"rss_kb": rss, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_startup(extra_imports=()):
+    # Démarrage d'un worker dans un nouvel interpréteur (python -X importtime) : chargement des URLs puis
+    # des imports supplémentaires. Renvoie le temps d'import total, la mémoire résidente et les bibliothèques
+    # lourdes chargées
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "OGticketing.settings"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(imports=tuple(extra_imports), heavy=HEAVY_MODULES)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+
+    # Lignes "import time: self [us] | cumulative | module" : la somme des temps propres est le temps total
+    import_us = sum(int(line.split("|")[0].split(":")[1]) for line in result.stderr.splitlines()
+                    if line.startswith("import time:") and "self [us]" not in line)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"import_ms": import_us / 1000, "rss_kb": probe["rss_kb"], "heavy": probe["heavy"]}
@@ -0,0 +1,47 @@
+import time
+import uuid
+
+import qrcode
+from django.core.management.base import BaseCommand
+
+from eticketing.function.qr_payload import decode_payload, encode_legacy_payload, encode_payload
+from eticketing.models import render_qr_png
+
+
+class Command(BaseCommand):
+    help = ("Compare l'ancien format de QR Code (jeton Fernet) et le format compact signé : version du QR Code, "
+            "taille du PNG, temps de génération et de décodage.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200, help="Nombre de billets générés par format.")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        # Billets fictifs : aucune écriture en base
+        tickets = [uuid.uuid4() for _ in range(iterations)]
+        formats = {
+            "ancien (Fernet)": lambda ticket_id: encode_legacy_payload(
+                "prenom.nom@example.com", ticket_id, "Athlétisme - Finale du 100 m", 3),
+            "compact signé": lambda ticket_id: encode_payload(ticket_id, 1234, 3),
+        }
+
+        self.stdout.write(f"{'Format':<18}{'Caractères':>12}{'Version QR':>12}{'PNG (octets)':>14}"
+                          f"{'Génération (ms)':>17}{'Décodage (µs)':>15}")
+        for name, encode in formats.items():
+            payloads = [encode(ticket_id) for ticket_id in tickets]
+
+            started = time.perf_counter()
+            sizes = [len(render_qr_png(payload.encode()).getvalue()) for payload in payloads]
+            generation = (time.perf_counter() - started) / iterations
+
+            started = time.perf_counter()
+            for payload in payloads:
+                decode_payload(payload)
+            decoding = (time.perf_counter() - started) / iterations
+
+            qr = qrcode.QRCode()
+            qr.add_data(payloads[0].encode())
+            qr.make(fit=True)
+
+            self.stdout.write(f"{name:<18}{len(payloads[0]):>12}{qr.version:>12}{sum(sizes) / iterations:>14.0f}"
+                              f"{generation * 1000:>17.2f}{decoding * 1e6:>15.1f}")
@@ -0,0 +1,66 @@
+import datetime
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eticketing.function.analytics import (SalesColumns, hourly_histogram, projected_sell_out, sales_velocity,
+                                           seats_sold, sell_through)
+
+
+class Command(BaseCommand):
+    help = ("Compare les indicateurs de ventes vectorisés (NumPy) et une implémentation Python en boucle "
+            "sur un jeu de billets synthétique (aucune écriture en base).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=1_000_000, help="Nombre de billets générés.")
+        parser.add_argument("--events", type=int, default=500, help="Nombre d'événements.")
+        parser.add_argument("--days", type=int, default=90, help="Période de vente (jours).")
+        parser.add_argument("--seed", type=int, default=2024, help="Graine du générateur aléatoire.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        start = now - datetime.timedelta(days=options["days"])
+        rng = np.random.default_rng(options["seed"])
+        event_ids = np.arange(1, options["events"] + 1)
+        columns = SalesColumns(rng.choice(event_ids, options["tickets"]),
+                               rng.choice([1, 2, 4], options["tickets"], p=[0.5, 0.3, 0.2]),
+                               rng.uniform(start.timestamp(), now.timestamp(), options["tickets"]))
+        seats_left = rng.integers(0, 5000, len(event_ids)).tolist()
+        event_list = event_ids.tolist()
+        rows = list(zip(columns.event_ids.tolist(), columns.offers.tolist(), columns.timestamps.tolist()))
+
+        def vectorised():
+            sold = seats_sold(columns, event_list)
+            velocity = sales_velocity(columns, event_list, now)
+            return (sold, sell_through(sold, seats_left), projected_sell_out(seats_left, velocity, now),
+                    hourly_histogram(columns, start, now))
+
+        def loops():
+            # Même calcul billet par billet
+            since = now.timestamp() - 24 * 3600
+            sold, recent = defaultdict(int), defaultdict(int)
+            hours = Counter()
+            for event_id, offer, timestamp in rows:
+                sold[event_id] += offer
+                if timestamp >= since:
+                    recent[event_id] += offer
+                hours[int(timestamp // 3600)] += 1
+            result = {}
+            for event_id, left in zip(event_list, seats_left):
+                velocity = recent[event_id] / 24
+                result[event_id] = (sold[event_id], sold[event_id] / (sold[event_id] + left) if sold[event_id] + left
+                                    else None, now + datetime.timedelta(hours=left / velocity)
+                                    if velocity and left else None)
+            return result, hours
+
+        self.stdout.write(f"{len(columns)} billet(s), {len(event_list)} événement(s), {options['days']} jour(s)")
+        timings = {}
+        for name, compute in (("NumPy (vectorisé)", vectorised), ("Python (boucles)", loops)):
+            started = time.perf_counter()
+            compute()
+            timings[name] = time.perf_counter() - started
+            self.stdout.write(f"{name:<20}{timings[name] * 1000:>10.1f} ms")
+        self.stdout.write(f"Accélération : x{timings['Python (boucles)'] / timings['NumPy (vectorisé)']:.1f}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from eticketing.function.startup import EAGER_IMPORTS, measure_startup
+
+
+class Command(BaseCommand):
+    help = ("Mesure le démarrage d'un worker (temps d'import et mémoire résidente) avec chargement différé des "
+            "bibliothèques lourdes, puis en les chargeant toutes au démarrage (comportement précédent).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Nombre de mesures (la médiane est retenue).")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Démarrage':<28}{'Imports (ms)':>14}{'RSS (Mo)':>10}  Bibliothèques lourdes")
+        for name, imports in (("chargement différé", ()), ("tout chargé au démarrage", EAGER_IMPORTS)):
+            runs = sorted((measure_startup(imports) for _ in range(options["runs"])), key=lambda run: run["import_ms"])
+            run = runs[len(runs) // 2]
+            self.stdout.write(f"{name:<28}{run['import_ms']:>14.0f}{run['rss_kb'] / 1024:>10.1f}  "
+                              f"{', '.join(run['heavy']) or '-'}")
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eticketing.function.exports import EXPORTS, FORMATS, export_filters, export_stream
+
+
+class Command(BaseCommand):
+    help = ("Exporte les billets ou les commandes en CSV ou JSON Lines (lecture par paquets, mémoire constante), "
+            "avec filtres par événement et par période et compression gzip optionnelle.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS), help="Données à exporter.")
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="Format de sortie.")
+        parser.add_argument("--event", help="Identifiant de l'événement.")
+        parser.add_argument("--since", help="Date de début incluse (AAAA-MM-JJ ou date et heure ISO).")
+        parser.add_argument("--until", help="Date de fin exclue (AAAA-MM-JJ ou date et heure ISO).")
+        parser.add_argument("--gzip", action="store_true", help="Compresse la sortie (gzip).")
+        parser.add_argument("--output", help="Fichier de destination (sortie standard si absent).")
+
+    def handle(self, *args, **options):
+        try:
+            filters = export_filters(options["event"], options["since"], options["until"])
+        except ValueError as error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        written = 0
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in export_stream(options["kind"], options["format"], options["gzip"], **filters):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        if options["output"]:
+            self.stderr.write(f"{written} octet(s) écrit(s) dans {options['output']} "
+                              f"en {time.perf_counter() - started:.1f} s.")
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from eticketing.function.gate_manifest import EventManifests, manifest_files, manifest_path, ticket_hash, \
+    write_manifest
+from eticketing.models import Eticket
+from event_mgmt.models import Event
+
+
+class Command(BaseCommand):
+    help = ("Exporte pour chaque événement le manifeste hors ligne des billets valides (empreintes triées, "
+            "lues par projection en mémoire sur les scanners). --delta n'exporte que les billets émis depuis "
+            "le dernier fichier.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("event", nargs="?", help="Slug de l'événement (tous les événements si absent).")
+        parser.add_argument("--output", default=settings.GATE_MANIFEST_DIR, help="Dossier de destination.")
+        parser.add_argument("--delta", action="store_true",
+                            help="N'exporte que les billets émis depuis le dernier export (complet ou delta).")
+
+    def handle(self, *args, **options):
+        events = Event.objects.order_by("pk")
+        if options["event"]:
+            events = events.filter(eventSlug=options["event"])
+            if not events.exists():
+                raise CommandError(f"Événement introuvable : {options['event']}")
+
+        for event_id in events.values_list("pk", flat=True):
+            count, path = self.export(event_id, options["output"], options["delta"])
+            self.stdout.write(f"{path.name} : {count} billet(s).")
+
+    def export(self, event_id, directory, delta):
+        previous = manifest_files(directory, event_id)
+        after_pk = None
+        if delta and previous:
+            with EventManifests(directory, event_id) as manifests:
+                after_pk = manifests.last_pk
+
+        # Date relevée avant la lecture : un billet émis pendant l'export figurera au plus tard dans le delta suivant
+        generated_at = time.time()
+        hashes = []
+        last_pk = after_pk or 0
+        rows = Eticket.objects.filter(event_id=event_id, pk__gt=last_pk).values_list("pk", "ticket_id")
+        for pk, ticket_id in rows.iterator(chunk_size=5000):
+            hashes.append(ticket_hash(ticket_id))
+            last_pk = max(last_pk, pk)
+
+        path = manifest_path(directory, event_id, after_pk)
+        count = write_manifest(path, event_id, hashes, generated_at, last_pk)
+        if after_pk is None:
+            # Export complet : les fichiers précédents (et leurs deltas) sont remplacés
+            for old_path in previous:
+                if old_path != path:
+                    old_path.unlink()
+        return count, path
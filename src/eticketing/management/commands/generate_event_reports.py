@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eticketing.function.sales import event_reports_zip
+from event_mgmt.models import Event
+
+
+class Command(BaseCommand):
+    help = "Génère en parallèle les rapports de ventes PDF de chaque événement dans une archive ZIP (tâche planifiée)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Chemin de l'archive ZIP à créer.")
+        parser.add_argument("--event", action="append", help="Slug d'un événement (répétable, tous si absent).")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                            help="Nombre de processus de rendu (par défaut : nombre de CPU).")
+
+    def handle(self, *args, **options):
+        events = Event.objects.order_by("pk")
+        if options["event"]:
+            events = events.filter(eventSlug__in=options["event"])
+        events = list(events)
+        if not events:
+            raise CommandError("Aucun événement à traiter.")
+
+        started = time.perf_counter()
+        # Écriture dans un fichier temporaire renommé à la fin : une archive incomplète n'est jamais publiée
+        tmp_path = f"{options['output']}.tmp"
+        with ProcessPoolExecutor(max_workers=options["processes"]) as executor, open(tmp_path, "wb") as output:
+            for chunk in event_reports_zip(events, executor=executor, window=2 * options["processes"]):
+                output.write(chunk)
+        os.replace(tmp_path, options["output"])
+        self.stdout.write(f"{len(events)} rapport(s) générés dans {options['output']} "
+                          f"en {time.perf_counter() - started:.1f} s.")
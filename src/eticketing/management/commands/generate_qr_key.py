@@ -0,0 +1,10 @@
+from cryptography.fernet import Fernet
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Génère une clé Fernet pour QR_CODE_KEYS. Rotation : placer la nouvelle clé en tête de liste "
+            "et conserver les anciennes tant que des billets chiffrés avec elles sont en circulation.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(Fernet.generate_key().decode())
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from eticketing.function.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit entièrement les cumuls de ventes (par événement / offre et par heure) à partir des billets. "
+            "À utiliser après une restauration ou une correction manuelle des données.")
+
+    def handle(self, *args, **options):
+        totals, hourly = rebuild_sales_rollups()
+        self.stdout.write(f"{totals} cumul(s) par offre et {hourly} cumul(s) horaire(s) reconstruits.")
@@ -0,0 +1,54 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eticketing.function.qr_rendering import render_qr_codes
+from eticketing.models import Eticket
+from event_mgmt.models import Event
+
+
+class Command(BaseCommand):
+    help = "Génère (ou régénère) en parallèle les images QR Code des billets d'un événement."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event", nargs="?", help="Slug de l'événement (tous les événements si absent).")
+        parser.add_argument("--regenerate", action="store_true",
+                            help="Régénère aussi les images déjà disponibles.")
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                            help="Nombre de processus de rendu (par défaut : nombre de CPU).")
+        parser.add_argument("--batch-size", type=int, default=50,
+                            help="Nombre de billets rendus par lot dans un processus.")
+        parser.add_argument("--chunk-size", type=int, default=2000,
+                            help="Nombre de billets chargés depuis la base à chaque passe.")
+
+    def handle(self, *args, **options):
+        etickets = Eticket.objects.select_related("user", "event").order_by("pk")
+        if options["event"]:
+            try:
+                etickets = etickets.filter(event=Event.objects.get(eventSlug=options["event"]))
+            except Event.DoesNotExist:
+                raise CommandError(f"Événement introuvable : {options['event']}")
+        if not options["regenerate"]:
+            etickets = etickets.exclude(qr_status=Eticket.QR_READY)
+
+        total = 0
+        last_pk = 0
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=options["processes"]) as executor:
+            # Chargement par paquets (pagination sur la clé primaire) : mémoire constante et aucune lecture
+            # d'une table en cours de modification
+            while chunk := list(etickets.filter(pk__gt=last_pk)[:options["chunk_size"]]):
+                total += self.render_chunk(chunk, executor, options["batch_size"])
+                last_pk = chunk[-1].pk
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f"{total} QR Code(s) généré(s) en {elapsed:.2f} s ({rate:.0f} billets/s).")
+
+    def render_chunk(self, chunk, executor, batch_size):
+        rendered = render_qr_codes(chunk, executor=executor, batch_size=batch_size)
+        if rendered < len(chunk):
+            self.stderr.write(f"{len(chunk) - rendered} QR Code(s) en échec.")
+        return rendered
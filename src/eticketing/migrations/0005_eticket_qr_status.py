@@ -0,0 +1,25 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+# Les billets existants ont déjà leur image (générée à la création)
+def mark_existing_qr_codes_ready(apps, schema_editor):
+    Eticket = apps.get_model('eticketing', 'Eticket')
+    Eticket.objects.exclude(qr_code='').exclude(qr_code__isnull=True).update(qr_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eticketing', '0004_eticket_offer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eticket',
+            name='qr_status',
+            field=models.CharField(choices=[('pending', 'En cours de génération'), ('ready', 'Disponible'), ('failed', 'En échec')], db_index=True, default='pending', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_qr_codes_ready, migrations.RunPython.noop),
+    ]
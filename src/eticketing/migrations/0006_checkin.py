@@ -0,0 +1,30 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eticketing', '0005_eticket_qr_status'),
+        ('event_mgmt', '0016_processedstripeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.UUIDField(unique=True)),
+                ('gate', models.CharField(blank=True, max_length=64)),
+                ('scanned_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('batch_id', models.UUIDField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkins', to='event_mgmt.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'scanned_at'], name='checkin_event_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncHour
+
+
+# Prix des offres au moment de la migration
+OFFER_PRICES = {1: 50, 2: 80, 4: 150}
+
+
+def build_rollups(apps, schema_editor):
+    # Billets existants : leur date d'émission est inconnue, ils sont rattachés à l'heure de la migration
+    Eticket = apps.get_model('eticketing', 'Eticket')
+    SalesRollup = apps.get_model('eticketing', 'SalesRollup')
+    HourlySalesRollup = apps.get_model('eticketing', 'HourlySalesRollup')
+    price = Case(*[When(offer=offer, then=Value(value)) for offer, value in OFFER_PRICES.items()],
+                 default=Value(0), output_field=IntegerField())
+    rows = Eticket.objects.values('event_id', 'offer', hour=TruncHour('issued_at')).annotate(
+        tickets=Count('id'), revenue=Sum(price)).order_by()
+    HourlySalesRollup.objects.bulk_create([HourlySalesRollup(**row) for row in rows])
+    totals = {}
+    for row in rows:
+        total = totals.setdefault((row['event_id'], row['offer']), [0, 0])
+        total[0] += row['tickets']
+        total[1] += row['revenue']
+    SalesRollup.objects.bulk_create([SalesRollup(event_id=event_id, offer=offer, tickets=tickets, revenue=revenue)
+                                     for (event_id, offer), (tickets, revenue) in totals.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eticketing', '0006_checkin'),
+        ('event_mgmt', '0017_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eticket',
+            name='issued_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offer', models.IntegerField()),
+                ('tickets', models.IntegerField(default=0)),
+                ('revenue', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='event_mgmt.event')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offer', models.IntegerField()),
+                ('hour', models.DateTimeField()),
+                ('tickets', models.IntegerField(default=0)),
+                ('revenue', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_sales_rollups', to='event_mgmt.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='hourlysalesrollup_hour_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysalesrollup',
+            constraint=models.UniqueConstraint(fields=('event', 'offer', 'hour'), name='hourlysalesrollup_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('event', 'offer'), name='salesrollup_event_offer_uniq'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
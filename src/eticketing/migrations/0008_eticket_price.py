@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+def fill_prices(apps, schema_editor):
+    # Billets déjà émis : prix actuel de leur offre (tarif de l'événement, à défaut l'offre par défaut)
+    Eticket = apps.get_model('eticketing', 'Eticket')
+    Offer = apps.get_model('event_mgmt', 'Offer')
+    prices = {(offer.event_id, offer.seats): offer.price for offer in Offer.objects.all()}
+    tickets = []
+    for eticket in Eticket.objects.only("event_id", "offer").iterator(chunk_size=2000):
+        eticket.price = prices.get((eticket.event_id, eticket.offer), prices.get((None, eticket.offer), 0))
+        tickets.append(eticket)
+    Eticket.objects.bulk_update(tickets, ["price"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eticketing', '0007_sales_rollups'),
+        ('event_mgmt', '0025_offercatalogueversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eticket',
+            name='price',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
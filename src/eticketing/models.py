@@ -1,20 +1,27 @@
 import uuid
+from collections import defaultdict
+from functools import reduce
 from io import BytesIO
+from operator import or_
 
-from cryptography.fernet import Fernet
-
-import qrcode
-from django.core.files.base import ContentFile
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 
 from accounts.models import CustomUser
+from eticketing.function.qr_payload import encode_payload
+from event_mgmt.function.offers import current_offer_price, offer_label
 from event_mgmt.models import Event
 
-key = Fernet.generate_key()
-cipher_suite = Fernet(key)
-
 
 class Eticket(models.Model):
+    QR_PENDING = "pending"
+    QR_READY = "ready"
+    QR_FAILED = "failed"
+    QR_STATUS_CHOICES = [(QR_PENDING, "En cours de génération"), (QR_READY, "Disponible"), (QR_FAILED, "En échec")]
+
     # Le Ebillet est lié à un seul utilisateur
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     # Le Ebillet est lié à un seul événement
@@ -25,27 +32,135 @@ class Eticket(models.Model):
     ticket_id = models.UUIDField(default=uuid.uuid4, editable=False)
     # Image pour le scan lors du contrôle
     qr_code = models.ImageField(upload_to='qr_code', blank=True, null=True)
+    # L'image est générée hors de la requête (eticketing.function.qr_rendering), le billet existe avant elle
+    qr_status = models.CharField(max_length=16, choices=QR_STATUS_CHOICES, default=QR_PENDING, db_index=True)
+    # Date d'émission (regroupement horaire des ventes)
+    issued_at = models.DateTimeField(default=timezone.now)
+    # Prix payé (prix de l'offre à l'émission) : base des cumuls de ventes, inchangé si le tarif change ensuite
+    price = models.IntegerField(blank=True, null=True)
 
     def __str__(self):
         return f"{self.event}"
 
-    def qr_code_maker(self):
-        data = [self.user.email, str(self.ticket_id), self.event.eventName, str(self.offer)]
-        data_string = ",".join(data)
-        encrypted_data = cipher_suite.encrypt(data_string.encode())
-        qr_img = qrcode.make(encrypted_data)
-        byte_arr = BytesIO()
-        qr_img.save(byte_arr, format='PNG')
-        byte_arr.seek(0)
-        return byte_arr
-
     def save(self, *args, **kwargs):
-        if not self.pk:  # only generate QR code for new records
-            temp = self.qr_code_maker()
-            self.qr_code.save(f"{self.ticket_id}.png", ContentFile(temp.read()), save=False)
+        # Billet émis hors du panier (administration) : prix de l'offre lu en base
+        if self.price is None:
+            self.price = current_offer_price(self.offer, self.event_id)
         super().save(*args, **kwargs)
 
+    # Données signées contenues dans le QR Code (format compact, voir eticketing.function.qr_payload)
+    def qr_code_payload(self):
+        return encode_payload(self.ticket_id, self.event_id, self.offer).encode()
+
+    def qr_code_maker(self):
+        return render_qr_png(self.qr_code_payload())
+
+
+# Fonction de module (et non méthode) pour pouvoir être exécutée dans un processus séparé
+def render_qr_png(payload):
+    # qrcode (et Pillow) ne sont chargés que par les processus qui génèrent des images
+    import qrcode
+
+    qr_img = qrcode.make(payload)
+    byte_arr = BytesIO()
+    qr_img.save(byte_arr, format='PNG')
+    byte_arr.seek(0)
+    return byte_arr
+
+
+class CheckIn(models.Model):
+    # Entrée d'un billet à l'événement : la contrainte d'unicité sur ticket_id interdit toute double entrée,
+    # même si deux portes envoient le même billet en même temps
+    ticket_id = models.UUIDField(unique=True)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="checkins")
+    # Porte / scanner ayant enregistré l'entrée
+    gate = models.CharField(max_length=64, blank=True)
+    # Heure du scan sur le terminal (qui peut être resté hors ligne) et heure de réception
+    scanned_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    # Lot de synchronisation : permet de savoir quelles lignes ont été créées par quel envoi
+    batch_id = models.UUIDField()
+
+    class Meta:
+        # Index utilisé par les compteurs d'entrées par événement
+        indexes = [models.Index(fields=["event", "scanned_at"], name="checkin_event_time_idx")]
+
+    def __str__(self):
+        return f"{self.ticket_id} ({self.gate})"
+
+
+class SalesRollup(models.Model):
+    # Cumul des ventes par événement et par offre, tenu à jour à chaque émission / suppression de billet :
+    # les rapports lisent une ligne par couple (événement, offre) au lieu de recompter les billets
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="sales_rollups")
+    offer = models.IntegerField()
+    tickets = models.IntegerField(default=0)
+    # Revenu en euros (prix de l'offre au moment de l'émission, lu dans le catalogue event_mgmt.Offer)
+    revenue = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["event", "offer"], name="salesrollup_event_offer_uniq")]
+
+    def __str__(self):
+        return f"{self.event} - {offer_label(self.offer, self.event_id)} : {self.tickets}"
+
+
+class HourlySalesRollup(models.Model):
+    # Même cumul, découpé par heure d'émission (évolution des ventes pendant les Jeux)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="hourly_sales_rollups")
+    offer = models.IntegerField()
+    hour = models.DateTimeField()
+    tickets = models.IntegerField(default=0)
+    revenue = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["event", "offer", "hour"],
+                                               name="hourlysalesrollup_uniq")]
+        indexes = [models.Index(fields=["hour"], name="hourlysalesrollup_hour_idx")]
+
+    def __str__(self):
+        return f"{self.event} - {offer_label(self.offer, self.event_id)} ({self.hour:%d/%m %Hh}) : {self.tickets}"
+
+
+def _apply_rollup(model, groups, create):
+    # groups : {clé (champs de la ligne): [billets, revenu]}. Les lignes manquantes sont créées à zéro
+    # (ignore_conflicts : sans risque si un autre processus les crée en même temps) puis toutes incrémentées
+    # en une seule requête, quel que soit le nombre de lignes concernées
+    if not groups:
+        return
+    if create:
+        model.objects.bulk_create([model(**dict(key)) for key in groups], ignore_conflicts=True)
+    tickets = Case(*[When(**dict(key), then=Value(value[0])) for key, value in groups.items()], default=Value(0))
+    revenue = Case(*[When(**dict(key), then=Value(value[1])) for key, value in groups.items()], default=Value(0))
+    model.objects.filter(reduce(or_, (Q(**dict(key)) for key in groups))).update(
+        tickets=F("tickets") + tickets, revenue=F("revenue") + revenue)
+
+
+def record_sales(etickets, sign=1):
+    # Mise à jour incrémentale des cumuls pour des billets émis (sign=1) ou supprimés (sign=-1).
+    # À appeler après un bulk_create, qui n'envoie pas le signal post_save
+    totals = defaultdict(lambda: [0, 0])
+    hourly = defaultdict(lambda: [0, 0])
+    for eticket in etickets:
+        # Prix enregistré sur le billet : une suppression retire exactement ce qui a été ajouté
+        price = eticket.price or 0
+        hour = timezone.localtime(eticket.issued_at).replace(minute=0, second=0, microsecond=0)
+        key = (("event_id", eticket.event_id), ("offer", eticket.offer))
+        for groups, group_key in ((totals, key), (hourly, key + (("hour", hour),))):
+            groups[group_key][0] += sign
+            groups[group_key][1] += sign * price
+
+    # Suppression : seules les lignes existantes sont décrémentées
+    _apply_rollup(SalesRollup, totals, create=sign > 0)
+    _apply_rollup(HourlySalesRollup, hourly, create=sign > 0)
 
 
+@receiver(post_save, sender=Eticket)
+def eticket_issued(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_sales([instance])
 
 
+@receiver(post_delete, sender=Eticket)
+def eticket_deleted(sender, instance, **kwargs):
+    record_sales([instance], sign=-1)
@@ -1,12 +1,29 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from cryptography.fernet import Fernet
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
-from io import BytesIO
+from io import BytesIO, StringIO
 import datetime
+import tempfile
+import uuid
 
 from accounts.models import CustomUser
-from eticketing.function.order_confirmation_email import send_eticket_email
-from eticketing.models import Eticket
-from event_mgmt.models import Event
+from eticketing.function.order_confirmation_email import send_eticket_email, send_issued_etickets
+from eticketing.function.key_ring import get_key_ring, get_signing_keys
+from eticketing.function.gate_manifest import EventManifests, GateManifest, manifest_files
+from eticketing.function.qr_payload import decode_payload, encode_legacy_payload
+from eticketing.function.qr_rendering import render_qr_codes
+from eticketing.function import sales_report
+from eticketing.function.analytics import event_analytics, hourly_histogram, load_hourly_rollups, load_tickets
+from eticketing.function.sales import hourly_sales, sales_matrix, sales_pdf
+from eticketing.models import Eticket, SalesRollup, HourlySalesRollup, record_sales
+from event_mgmt.function.outbox import deliver_outbox, queue_email
+from event_mgmt.models import Event, Offer
 
 
 class SendETicketEmailTest(TestCase):
@@ -37,7 +54,280 @@ class SendETicketEmailTest(TestCase):
         self.eticket.save()
 
     def test_send_eticket_email(self):
-        # Appel de la fonction à tester
+        # Appel de la fonction à tester : l'email est mis en file puis envoyé avec le QR Code en pièce jointe
         send_eticket_email(self.eticket)
+        deliver_outbox()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['steve.paris2024@gmail.com'])
+        self.assertEqual(len(mail.outbox[0].attachments), 1)
+
+
+class QrRenderingTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron", eventPlace="Chelles")
+        self.etickets = Eticket.objects.bulk_create([Eticket(user=self.user, event=self.event, offer=1)
+                                                     for _ in range(3)])
+
+    def test_eticket_is_created_with_pending_qr_code(self):
+        eticket = Eticket.objects.create(user=self.user, event=self.event, offer=2)
+        self.assertEqual(eticket.qr_status, Eticket.QR_PENDING)
+        self.assertFalse(eticket.qr_code)
+
+    def test_render_qr_codes(self):
+        rendered = render_qr_codes(Eticket.objects.select_related("user", "event"), batch_size=2)
+
+        self.assertEqual(rendered, 3)
+        for eticket in Eticket.objects.all():
+            self.assertEqual(eticket.qr_status, Eticket.QR_READY)
+            self.assertEqual(eticket.qr_code.name, f"qr_code/{eticket.ticket_id}.png")
+
+    def test_send_issued_etickets(self):
+        send_issued_etickets({"ticket_ids": [eticket.pk for eticket in self.etickets]})
+
+        self.assertEqual(deliver_outbox(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Eticket.objects.exclude(qr_status=Eticket.QR_READY).exists())
+
+    def test_send_issued_etickets_retry_does_not_duplicate_emails(self):
+        # Première tentative interrompue après le premier email mis en file
+        calls = []
+
+        def fail_after_first(*args, **kwargs):
+            calls.append(args)
+            if len(calls) > 1:
+                raise OSError("disk full")
+            return queue_email(*args, **kwargs)
+
+        with mock.patch("eticketing.function.order_confirmation_email.queue_email", side_effect=fail_after_first):
+            with self.assertRaises(OSError):
+                send_issued_etickets({"ticket_ids": [eticket.pk for eticket in self.etickets]})
+
+        # Tâche rejouée : un seul email par billet
+        send_issued_etickets({"ticket_ids": [eticket.pk for eticket in self.etickets]})
+        self.assertEqual(deliver_outbox(), 3)
+
+
+class KeyRingTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron")
+        self.eticket = Eticket.objects.create(user=self.user, event=self.event, offer=4)
+
+    def test_default_key_is_stable(self):
+        # Clé dérivée de SECRET_KEY : un autre processus (trousseau reconstruit) sait relire le billet
+        payload = self.eticket.qr_code_payload().decode()
+        get_key_ring.cache_clear()
+        get_signing_keys.cache_clear()
+        self.assertEqual(decode_payload(payload), (self.eticket.ticket_id, self.event.pk, 4))
+
+    def test_rotated_key_still_decodes_old_tickets(self):
+        old_key, new_key = Fernet.generate_key().decode(), Fernet.generate_key().decode()
+        with override_settings(QR_CODE_KEYS=[old_key]):
+            payload = self.eticket.qr_code_payload().decode()
+        with override_settings(QR_CODE_KEYS=[new_key, old_key]):
+            self.assertEqual(decode_payload(payload), (self.eticket.ticket_id, self.event.pk, 4))
+        with override_settings(QR_CODE_KEYS=[new_key]):
+            self.assertIsNone(decode_payload(payload))
+
+
+class QrPayloadTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Judo, finale")
+        self.eticket = Eticket.objects.create(user=self.user, event=self.event, offer=2)
+
+    def test_compact_payload(self):
+        payload = self.eticket.qr_code_payload().decode()
+
+        # 52 caractères de l'alphabet alphanumérique des QR Codes
+        self.assertEqual(len(payload), 52)
+        self.assertRegex(payload, r"^[A-Z2-7]+$")
+        self.assertEqual(decode_payload(payload), (self.eticket.ticket_id, self.event.pk, 2))
+
+    def test_tampered_payload_is_refused(self):
+        payload = self.eticket.qr_code_payload().decode()
+        # Modification d'un caractère du corps (offre ou événement) : la signature ne correspond plus
+        tampered = payload[:30] + ("A" if payload[30] != "A" else "B") + payload[31:]
+
+        self.assertIsNone(decode_payload(tampered))
+        self.assertIsNone(decode_payload(payload[:-1]))
+
+    def test_non_string_payload_is_refused(self):
+        for payload in (123, None, {"payload": "A" * 52}):
+            self.assertIsNone(decode_payload(payload))
+
+    def test_legacy_payload_is_still_accepted(self):
+        payload = encode_legacy_payload(self.user.email, self.eticket.ticket_id, self.event.eventName, 2)
+
+        self.assertEqual(decode_payload(payload), (self.eticket.ticket_id, None, 2))
+
+
+class GateManifestTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron", eventSlug="aviron")
+        self.other_event = Event.objects.create(eventName="Judo", eventSlug="judo")
+        self.etickets = [Eticket.objects.create(user=self.user, event=self.event, offer=1) for _ in range(20)]
+        self.other_eticket = Eticket.objects.create(user=self.user, event=self.other_event, offer=1)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def export(self, *args):
+        call_command("export_gate_manifests", *args, output=self.directory.name, stdout=StringIO())
+
+    def test_full_export_lookup(self):
+        self.export("aviron")
+
+        with GateManifest(manifest_files(self.directory.name, self.event.pk)[0]) as manifest:
+            self.assertEqual(manifest.event_id, self.event.pk)
+            self.assertEqual(len(manifest), 20)
+            self.assertEqual(manifest.last_pk, self.etickets[-1].pk)
+            for eticket in self.etickets:
+                self.assertIn(eticket.ticket_id, manifest)
+            self.assertNotIn(self.other_eticket.ticket_id, manifest)
+            self.assertNotIn(uuid.uuid4(), manifest)
+
+    def test_delta_export(self):
+        self.export()
+        new_eticket = Eticket.objects.create(user=self.user, event=self.event, offer=1)
+        self.export("--delta")
+
+        files = manifest_files(self.directory.name, self.event.pk)
+        self.assertEqual(len(files), 2)
+        with GateManifest(files[1]) as delta:
+            # Le delta ne contient que le billet émis après l'export complet
+            self.assertEqual(len(delta), 1)
+        with EventManifests(self.directory.name, self.event.pk) as manifests:
+            self.assertIn(new_eticket.ticket_id, manifests)
+            self.assertIn(self.etickets[0].ticket_id, manifests)
+
+        # Un nouvel export complet remplace les deltas
+        self.export()
+        self.assertEqual(len(manifest_files(self.directory.name, self.event.pk)), 1)
+
+
+class SalesRollupTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron")
+
+    def rollup(self):
+        return [(row['offer'], row['total'], row['revenue']) for row in sales_matrix([self.event.pk])[self.event.pk]]
+
+    def test_rollup_follows_issued_and_deleted_tickets(self):
+        Eticket.objects.create(user=self.user, event=self.event, offer=1)
+        record_sales(Eticket.objects.bulk_create([Eticket(user=self.user, event=self.event, offer=offer, price=price)
+                                                  for offer, price in ((1, 50), (4, 150))]))
+        self.assertEqual(self.rollup(), [(1, 2, 100), (4, 1, 150)])
+
+        Eticket.objects.filter(offer=4).delete()
+        self.assertEqual(self.rollup(), [(1, 2, 100)])
+
+    def test_price_change_keeps_recorded_revenue(self):
+        Eticket.objects.create(user=self.user, event=self.event, offer=2)
+        duo = Offer.objects.get(event__isnull=True, seats=2)
+        duo.price = 95
+        with self.captureOnCommitCallbacks(execute=True):
+            duo.save()
+        newer = Eticket.objects.create(user=self.user, event=self.event, offer=2)
+        self.assertEqual(newer.price, 95)
+        self.assertEqual(self.rollup(), [(2, 2, 175)])
+
+        # Le billet vendu 80 € retire 80 €, pas le prix actuel
+        Eticket.objects.exclude(pk=newer.pk).delete()
+        self.assertEqual(self.rollup(), [(2, 1, 95)])
+
+        # La reconstruction donne les mêmes cumuls que les mises à jour incrémentales
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.rollup(), [(2, 1, 95)])
+
+    def test_hourly_rollup(self):
+        issued_at = timezone.now().replace(minute=30)
+        Eticket.objects.create(user=self.user, event=self.event, offer=2, issued_at=issued_at)
+        Eticket.objects.create(user=self.user, event=self.event, offer=2, issued_at=issued_at - datetime.timedelta(hours=1))
+
+        buckets = hourly_sales(issued_at - datetime.timedelta(hours=3))
+        self.assertEqual([(bucket['hour'].minute, bucket['total'], bucket['amount']) for bucket in buckets],
+                         [(0, 1, 80), (0, 1, 80)])
+
+    def test_rebuild(self):
+        for offer in (1, 2, 2):
+            Eticket.objects.create(user=self.user, event=self.event, offer=offer)
+        SalesRollup.objects.update(tickets=0, revenue=0)
+        HourlySalesRollup.objects.all().delete()
+
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+
+        self.assertEqual(self.rollup(), [(1, 1, 50), (2, 2, 160)])
+        self.assertEqual(sum(HourlySalesRollup.objects.values_list("tickets", flat=True)), 3)
+
+
+class SalesAnalyticsTest(TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+        self.event = Event.objects.create(eventName="Aviron", eventSeatAvailable=90)
+        self.empty = Event.objects.create(eventName="Voile")
+        # 10 places vendues dont 6 dans les dernières 24 heures
+        for offer, hours_ago in ((2, 1), (4, 5), (4, 48)):
+            Eticket.objects.create(user=self.user, event=self.event, offer=offer,
+                                   issued_at=self.now - datetime.timedelta(hours=hours_ago))
+
+    def test_event_analytics(self):
+        analytics = event_analytics([self.event, self.empty], now=self.now)
+
+        self.assertEqual(analytics[self.event.pk]["seats_sold"], 10)
+        self.assertAlmostEqual(analytics[self.event.pk]["sell_through"], 0.1)
+        self.assertAlmostEqual(analytics[self.event.pk]["velocity"], 6 / 24)
+        # 90 places restantes à 0,25 place par heure
+        self.assertEqual(analytics[self.event.pk]["sell_out_at"], self.now + datetime.timedelta(hours=360))
+        self.assertEqual(analytics[self.empty.pk],
+                         {"seats_sold": 0, "sell_through": None, "velocity": 0.0, "sell_out_at": None})
+
+    def test_tickets_and_rollups_agree(self):
+        tickets = load_tickets([self.event.pk])
+        self.assertEqual(len(tickets), 3)
+        self.assertEqual(int(tickets.seats.sum()), 10)
+        self.assertEqual(int(tickets.revenue.sum()), 80 + 150 + 150)
+
+        edges, counts = hourly_histogram(tickets, self.now - datetime.timedelta(hours=6), self.now)
+        self.assertEqual(len(edges), 7)
+        self.assertEqual(counts.tolist(), [0, 1, 0, 0, 0, 1, 0])
+
+    def test_revenue_uses_recorded_prices(self):
+        Offer.objects.filter(event__isnull=True, seats=4).update(price=200)
+        self.assertEqual(int(load_tickets([self.event.pk]).revenue.sum()), 80 + 150 + 150)
+        self.assertEqual(int(load_hourly_rollups([self.event.pk]).revenue.sum()), 80 + 150 + 150)
+
+
+class SalesPdfTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron")
+        Eticket.objects.create(user=self.user, event=self.event, offer=1)
+
+    def test_pdf_is_rendered_in_worker_process(self):
+        pdf = sales_pdf()
+        self.assertTrue(pdf.startswith(b"%PDF"))
 
+    @override_settings(SALES_REPORT_PROCESSES=0)
+    def test_pdf_is_cached_until_sales_change(self):
+        with mock.patch.object(sales_report, "build_sales_pdf", wraps=sales_report.build_sales_pdf) as build:
+            first = sales_pdf()
+            self.assertEqual(sales_pdf(), first)
+            self.assertEqual(build.call_count, 1)
 
+            # Nouvelle vente : nouvelle version des données, le rapport est régénéré
+            Eticket.objects.create(user=self.user, event=self.event, offer=2)
+            sales_pdf()
+            self.assertEqual(build.call_count, 2)
@@ -1,13 +1,25 @@
-from io import BytesIO
+import gzip
+import json
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
 from PyPDF2 import PdfReader
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.timezone import now
 
 from accounts.models import CustomUser
-from eticketing.models import Eticket
+from eticketing.function.gate import ticket_index
+from eticketing.function.startup import EAGER_IMPORTS, measure_startup
+from eticketing.models import Eticket, CheckIn, record_sales
+from event_mgmt.function.offers import offers_for
 from event_mgmt.models import Event
 
 
@@ -52,6 +64,19 @@ class TicketViewTest(TestCase):
         self.assertEqual(len(tickets_in_context), 1)
         self.assertEqual(tickets_in_context[0], self.eticket)
 
+    def test_tickets_view_not_modified(self):
+        self.client.login(email='testuser@example.com', password='password123')
+        etag = self.client.get(reverse('tickets'))['ETag']
+
+        # Mêmes billets : 304 sans contenu
+        response = self.client.get(reverse('tickets'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Nouveau billet : la page est renvoyée
+        Eticket.objects.create(user=self.user, event=self.event, offer=2)
+        response = self.client.get(reverse('tickets'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
 
 class SalesByOfferViewTest(TestCase):
 
@@ -104,6 +129,43 @@ class SalesByOfferViewTest(TestCase):
         self.assertEqual(event_sales_data[0]['offers'][1]['total'], 1)  # pour l'offre 2 de event1
 
 
+class SalesByOfferQueryCountTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='password')
+        self.client.login(email='admin@example.com', password='password')
+        # Copie locale du catalogue des offres déjà chargée par ce processus (libellés du tableau)
+        offers_for()
+
+    def create_events(self, count):
+        for number in range(count):
+            event = Event.objects.create(eventName=f'Événement {number}')
+            record_sales(Eticket.objects.bulk_create([Eticket(user=self.admin, event=event, offer=offer, price=price)
+                                                      for offer, price in ((1, 50), (1, 50), (2, 80), (4, 150))]))
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ventes-par-offre'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_depend_on_event_count(self):
+        self.create_events(1)
+        _, queries_for_one = self.dashboard_queries()
+        self.create_events(9)
+        response, queries_for_ten = self.dashboard_queries()
+
+        self.assertEqual(queries_for_one, queries_for_ten)
+        self.assertEqual(len(response.context['event_sales_data']), 10)
+
+    def test_revenue_is_computed_per_offer(self):
+        self.create_events(1)
+        response, _ = self.dashboard_queries()
+
+        offers = response.context['event_sales_data'][0]['offers']
+        self.assertEqual([(offer['label'], offer['total'], offer['revenue']) for offer in offers],
+                         [('Solo', 2, 100), ('Duo', 1, 80), ('Familiale', 1, 150)])
+
+
 class GenerateSalesPdfViewTests(TestCase):
     def setUp(self):
         # Utiliser le modèle utilisateur personnalisé
@@ -157,3 +219,202 @@ class GenerateSalesPdfViewTests(TestCase):
         self.assertIn("50", text)  # Revenu pour l'offre Solo
         self.assertIn("80", text)  # Revenu pour l'offre Duo
         self.assertIn("150", text)  # Revenu pour l'offre Familiale
+
+
+@override_settings(GATE_API_TOKENS=["gate-token"], GATE_INDEX_REFRESH_INTERVAL=0)
+class GateScanViewTest(TestCase):
+    def setUp(self):
+        ticket_index.clear()
+        self.user = CustomUser.objects.create(email='spectateur@example.com')
+        self.event = Event.objects.create(eventName='Judo, finale', eventSeatAvailable=100)
+        self.other_event = Event.objects.create(eventName='Aviron', eventSeatAvailable=100)
+        self.eticket = Eticket.objects.create(user=self.user, event=self.event, offer=2)
+
+    def scan(self, event, payload, token="gate-token"):
+        return self.client.post(reverse('gate-scan', kwargs={"event_id": event.pk}),
+                                data=json.dumps({"payload": payload}), content_type="application/json",
+                                HTTP_AUTHORIZATION=f"Token {token}")
+
+    def test_valid_ticket(self):
+        response = self.scan(self.event, self.eticket.qr_code_payload().decode())
+        self.assertEqual(response.json(), {"valid": True, "ticket_id": str(self.eticket.ticket_id), "offer": 2})
+
+    def test_ticket_for_another_event_is_refused(self):
+        response = self.scan(self.other_event, self.eticket.qr_code_payload().decode())
+        self.assertFalse(response.json()["valid"])
+        self.assertEqual(response.json()["reason"], "wrong_event")
+
+    def test_unreadable_payload_is_refused(self):
+        response = self.scan(self.event, "not-a-ticket")
+        self.assertEqual(response.json(), {"valid": False, "reason": "unreadable"})
+
+    def test_non_string_payload_is_rejected(self):
+        for payload in (123, None, ["A" * 52]):
+            response = self.scan(self.event, payload)
+            self.assertEqual(response.status_code, 400)
+
+    def test_ticket_issued_after_warm_up_is_accepted(self):
+        ticket_index.warm(self.event.pk)
+        eticket = Eticket.objects.create(user=self.user, event=self.event, offer=1)
+
+        response = self.scan(self.event, eticket.qr_code_payload().decode())
+        self.assertTrue(response.json()["valid"])
+
+    def test_scan_requires_gate_token(self):
+        response = self.scan(self.event, self.eticket.qr_code_payload().decode(), token="wrong")
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics(self):
+        self.scan(self.event, self.eticket.qr_code_payload().decode())
+        response = self.client.get(reverse('gate-metrics'), HTTP_AUTHORIZATION="Token gate-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.json()["valid"], 1)
+
+
+@override_settings(GATE_API_TOKENS=["gate-token"])
+class GateCheckInViewTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(email='spectateur@example.com')
+        self.event = Event.objects.create(eventName='Aviron', eventSeatAvailable=100)
+        self.etickets = [Eticket.objects.create(user=self.user, event=self.event, offer=1) for _ in range(3)]
+
+    def sync(self, scans, gate="Porte A"):
+        return self.client.post(reverse('gate-checkins', kwargs={"event_id": self.event.pk}),
+                                data=json.dumps({"gate": gate, "scans": scans}), content_type="application/json",
+                                HTTP_AUTHORIZATION="Token gate-token")
+
+    def scan(self, eticket, scanned_at="2024-07-27T18:00:00+02:00"):
+        return {"payload": eticket.qr_code_payload().decode(), "scanned_at": scanned_at}
+
+    def test_batch_is_recorded(self):
+        response = self.sync([self.scan(eticket) for eticket in self.etickets])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.json()["accepted"]),
+                         sorted(str(eticket.ticket_id) for eticket in self.etickets))
+        self.assertEqual(CheckIn.objects.filter(event=self.event, gate="Porte A").count(), 3)
+
+    def test_duplicates_are_reported(self):
+        self.sync([self.scan(self.etickets[0])], gate="Porte B")
+
+        response = self.sync([self.scan(self.etickets[0]), self.scan(self.etickets[1]), self.scan(self.etickets[1]),
+                              {"payload": "illisible"}])
+
+        data = response.json()
+        self.assertEqual(data["accepted"], [str(self.etickets[1].ticket_id)])
+        self.assertEqual(data["duplicates"][0]["ticket_id"], str(self.etickets[0].ticket_id))
+        self.assertEqual(data["duplicates"][0]["gate"], "Porte B")
+        self.assertEqual(data["rejected"], [{"index": 3, "reason": "unreadable"}])
+        self.assertEqual(CheckIn.objects.count(), 2)
+
+    def test_malformed_scans_do_not_fail_the_batch(self):
+        started = timezone.now()
+        response = self.sync([{"payload": None}, {"payload": 123}, self.scan(self.etickets[0]),
+                              self.scan(self.etickets[1], scanned_at="2024-02-30T10:00:00")])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["rejected"], [{"index": 0, "reason": "unreadable"}, {"index": 1, "reason": "unreadable"}])
+        self.assertEqual(sorted(data["accepted"]), sorted(str(eticket.ticket_id) for eticket in self.etickets[:2]))
+        # Date impossible : heure de réception du lot
+        self.assertGreaterEqual(CheckIn.objects.get(ticket_id=self.etickets[1].ticket_id).scanned_at, started)
+
+    def test_ticket_of_another_event_is_rejected(self):
+        other_event = Event.objects.create(eventName='Judo')
+        eticket = Eticket.objects.create(user=self.user, event=other_event, offer=1)
+
+        data = self.sync([self.scan(eticket)]).json()
+        self.assertEqual(data["rejected"], [{"ticket_id": str(eticket.ticket_id), "reason": "wrong_event"}])
+
+    def test_entry_counters(self):
+        self.sync([self.scan(eticket) for eticket in self.etickets])
+
+        response = self.client.get(reverse('gate-entries', kwargs={"event_id": self.event.pk}),
+                                   HTTP_AUTHORIZATION="Token gate-token")
+        self.assertEqual(response.json()["total"], 3)
+
+
+@override_settings(SALES_REPORT_PROCESSES=0)
+class EventSalesReportsViewTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='password')
+        self.client.login(email='admin@example.com', password='password')
+        self.events = [Event.objects.create(eventName=name, eventSeatAvailable=10) for name in ('Aviron', 'Judo')]
+        for offer in (1, 2, 4):
+            Eticket.objects.create(user=self.admin, event=self.events[0], offer=offer)
+
+    def test_zip_contains_one_report_per_event(self):
+        response = self.client.get(reverse('event-sales-reports'))
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(names, [f"{self.events[0].pk:05d}-aviron.pdf", f"{self.events[1].pk:05d}-judo.pdf"])
+
+        text = PdfReader(BytesIO(archive.read(names[0]))).pages[0].extract_text()
+        self.assertIn("Rapport de ventes : Aviron", text)
+        # 7 places vendues, 10 encore disponibles
+        self.assertIn("Places vendues : 7 / 17", text)
+
+    def test_command_writes_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rapports.zip")
+            call_command("generate_event_reports", path, processes=1, stdout=StringIO())
+            self.assertEqual(len(zipfile.ZipFile(path).namelist()), 2)
+
+
+class StaffExportViewTest(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(email='admin@example.com', password='password')
+        self.client.login(email='admin@example.com', password='password')
+        self.event = Event.objects.create(eventName='Aviron')
+        self.other_event = Event.objects.create(eventName='Judo, finale')
+        self.eticket = Eticket.objects.create(user=self.admin, event=self.event, offer=2)
+        Eticket.objects.create(user=self.admin, event=self.other_event, offer=1,
+                               issued_at=timezone.now() - timedelta(days=3))
+
+    def export(self, kind, **params):
+        response = self.client.get(reverse('staff-export', kwargs={"kind": kind}), params)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_export_with_filters(self):
+        response, content = self.export('tickets', event=self.event.pk)
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'ticket_id', 'user__email'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn(str(self.eticket.ticket_id), lines[1])
+
+        _, content = self.export('tickets', since=(timezone.now() - timedelta(days=1)).date().isoformat())
+        self.assertEqual(len(content.decode().splitlines()), 2)
+
+    def test_gzip_jsonl_export(self):
+        response, content = self.export('tickets', format='jsonl', gzip='1')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = [json.loads(line) for line in gzip.decompress(content).decode().splitlines()]
+        self.assertEqual({row['event__eventName'] for row in rows}, {'Aviron', 'Judo, finale'})
+
+    def test_invalid_filter_is_refused(self):
+        response = self.client.get(reverse('staff-export', kwargs={"kind": "tickets"}), {"since": "demain"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_requires_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('staff-export', kwargs={"kind": "orders"}))
+        self.assertEqual(response.status_code, 302)
+
+
+class StartupImportTest(TestCase):
+    # Budget relatif au démarrage qui charge toutes les bibliothèques lourdes, mesuré sur la même machine
+    # (environ 0,3 s contre 1,7 s) : une machine chargée ralentit les deux mesures, pas leur rapport
+    IMPORT_BUDGET_RATIO = 0.6
+
+    def test_url_conf_does_not_import_heavy_libraries(self):
+        lazy = measure_startup()
+        eager = measure_startup(EAGER_IMPORTS)
+
+        self.assertEqual(lazy["heavy"], [])
+        self.assertLess(lazy["import_ms"], eager["import_ms"] * self.IMPORT_BUDGET_RATIO)
+        self.assertLess(lazy["rss_kb"], eager["rss_kb"])
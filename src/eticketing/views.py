@@ -1,25 +1,29 @@
-from io import BytesIO
+import json
+from datetime import timedelta
 
-import matplotlib
 from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, JsonResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.utils import timezone
 from django.views.generic import ListView
-from django.db.models import Count
-from matplotlib import pyplot as plt
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-
-matplotlib.use('Agg')
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas
-
-from eticketing.models import Eticket
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from eticketing.function.checkin import entry_stats, record_checkins
+from eticketing.function.exports import EXPORTS, FORMATS, export_filters, export_stream
+from eticketing.function.gate import gate_token_required, scan_metrics, validate_scan
+from eticketing.function.sales import event_reports_zip, hourly_sales, sales_matrix, sales_pdf
+from event_mgmt.function.conditional import tickets_etag
 from event_mgmt.models import Event
 
 
+# Réponse 304 sans rendu si les billets de l'utilisateur n'ont pas changé (ETag)
+@condition(etag_func=tickets_etag)
 def tickets(request):
     # Récupération dans une variable "tickets" de tous les etickets liés à l'utilisateur
     tickets = request.user.eticket_set.all()
@@ -34,24 +38,29 @@ class SalesByOfferView(UserPassesTestMixin, ListView):
     # Nom de la variable contexte à utiliser dans le template
     context_object_name = 'event_list'
 
+    # Événements affichés par page (le tableau d'un événement est calculé pour la page courante uniquement)
+    paginate_by = 50
+
     def get_queryset(self):
         # Méthode qui récupère les données à afficher par la vue
         return Event.objects.annotate(
-            total_sales=Count('eticket') # Ajoute un champ calculé qui compte le nb de billets associés à chq événement
-        ).order_by('-total_sales') # Ordonne les événements par nb total de billets vendus, du plus grand au plus petit
+            # Nombre de billets vendus par événement, lu dans les cumuls par offre (pas de comptage des billets)
+            total_sales=Coalesce(Sum('sales_rollups__tickets'), 0)
+        ).order_by('-total_sales', 'pk') # Ordonne les événements par nb total de billets vendus (pk : pagination stable)
 
     def get_context_data(self, **kwargs):
         # Cette méthode permet d'ajouter des données supplémentaires au contexte du template
         context = super().get_context_data(**kwargs) # Appel à la méthode parente pour obtenir le contexte de base
-        event_sales_data = [] # Création d'une liste pour stocker les données de vente par offre pour chaque événement
-        for event in context['event_list']:
-            offers = Eticket.objects.filter(event=event).values('offer').annotate(total=Count('id')).order_by('offer')
-            # Récupération et regroupement des billets par 'offer', comptage et tri par offre pour chaque événement
-            event_sales_data.append({
-                'event': event,
-                'offers': offers
-            })
-        context['event_sales_data'] = event_sales_data # Ajout de la liste complète des données de vente au contexte
+        # Ventes et revenus par offre de tous les événements de la page en une seule requête groupée
+        matrix = sales_matrix([event.pk for event in context['event_list']])
+        # Remplissage, rythme de vente et épuisement prévu (calcul vectorisé, NumPy chargé à la première requête)
+        from eticketing.function.analytics import event_analytics
+        analytics = event_analytics(context['event_list'])
+        context['event_sales_data'] = [{'event': event, 'offers': matrix.get(event.pk, []),
+                                        'analytics': analytics[event.pk]}
+                                       for event in context['event_list']]
+        # Évolution des ventes sur les dernières 24 heures (cumuls horaires)
+        context['hourly_sales'] = hourly_sales(timezone.now() - timedelta(hours=24))
         return context
 
     def test_func(self):
@@ -64,118 +73,83 @@ class SalesByOfferView(UserPassesTestMixin, ListView):
 
 
 @staff_member_required
-def generate_sales_pdf(request):
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Calculer la position pour centrer le titre
-    title = "Rapport de ventes pour la billetterie des J.O."
-    title_x = (width - p.stringWidth(title, "Helvetica-Bold", 16)) / 2
-    title_y = height - 50
-
-    # En-tête
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(title_x, title_y, title)
-
-    # Encadrer le titre
-    p.setStrokeColor(colors.black)
-    p.setLineWidth(1)
-    p.rect(title_x - 10, title_y - 10, p.stringWidth(title, "Helvetica-Bold", 16) + 20, 30, stroke=1, fill=0)
-
-    # Pied de page
-    p.setFont("Helvetica", 10)
-    p.drawString(30, 30, "Rapport généré par le site 'steveparis.pythonanywhere.com'")
-
-    # Calcul des ventes
-    offer_counts = Eticket.objects.values('offer').annotate(total=Count('id'))
-    total_sales = 0
-    total_revenue = 0
-    offer_sales = {'Solo': 0, 'Duo': 0, 'Familiale': 0}
-
-    for offer in offer_counts:
-        if offer['offer'] == 1:
-            offer_sales['Solo'] = offer['total']
-            total_revenue += offer['total'] * 50
-        elif offer['offer'] == 2:
-            offer_sales['Duo'] = offer['total']
-            total_revenue += offer['total'] * 80
-        elif offer['offer'] == 4:
-            offer_sales['Familiale'] = offer['total']
-            total_revenue += offer['total'] * 150
-        total_sales += offer['total']
-
-    # Création du graphique
-    fig, ax = plt.subplots()
-    labels = offer_sales.keys()
-    sizes = offer_sales.values()
-    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-    ax.axis('equal')
-
-    # Sauvegarde du graphique dans un objet BytesIO
-    image_buffer = BytesIO()
-    plt.savefig(image_buffer, format='png')
-    plt.close(fig)
-    image_buffer.seek(0)
-    image = ImageReader(image_buffer)
-
-    # Ajout du graphique au PDF avec une position ajustée
-    p.drawImage(image, 50, height - 350, width=500, height=250)
-
-    # Ajout des données de ventes dans un tableau
-    data = [['Offre', 'Nombre de Ventes', 'Revenu Total']]
-    for offer, count in offer_sales.items():
-        if offer == 'Solo':
-            revenue = count * 50
-        elif offer == 'Duo':
-            revenue = count * 80
-        elif offer == 'Familiale':
-            revenue = count * 150
-        data.append([offer, count, revenue])
-
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    # Calculer la position pour centrer le tableau
-    table_width, table_height = table.wrap(0, 0)
-    table_x = (width - table_width) / 2
-    table_y = height - 500
-
-    table.drawOn(p, table_x, table_y)
-
-    # Styliser les textes pour le bas de la page
-    p.setFont("Helvetica-Bold", 18)
-    sales_text = f"Nombre total de ventes: {total_sales}"
-    revenue_text = f"Revenu total: {total_revenue}€"
-    sales_text_x = (width - p.stringWidth(sales_text, "Helvetica-Bold", 18)) / 2
-    revenue_text_x = (width - p.stringWidth(revenue_text, "Helvetica-Bold", 18)) / 2
-    p.drawString(sales_text_x, 200, sales_text)
-    p.drawString(revenue_text_x, 160, revenue_text)
-
-    # Finaliser et sauvegarder le PDF
-    p.showPage()
-    p.save()
-
-    buffer.seek(0)
-    return HttpResponse(buffer, content_type='application/pdf')
-
-
-
-
-
-
-
-
-
+@require_GET
+def staff_export(request, kind):
+    # Export des billets ou commandes en flux (CSV ou JSON Lines, gzip optionnel) :
+    # /exports/tickets/?format=jsonl&event=3&since=2024-07-26&until=2024-08-12&gzip=1
+    if kind not in EXPORTS:
+        return HttpResponseNotFound()
+    export_format = request.GET.get("format", "csv")
+    compress = request.GET.get("gzip") in ("1", "true")
+    try:
+        filters = export_filters(request.GET.get("event"), request.GET.get("since"), request.GET.get("until"))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    if export_format not in FORMATS:
+        return HttpResponseBadRequest(f"Unknown format: {export_format}")
+
+    filename = f"{kind}-{timezone.now():%Y%m%d-%H%M}.{export_format}" + (".gz" if compress else "")
+    response = StreamingHttpResponse(export_stream(kind, export_format, compress, **filters),
+                                     content_type="application/gzip" if compress else FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
 
 
+@staff_member_required
+@require_GET
+def event_sales_reports(request):
+    # Archive ZIP des rapports PDF de chaque événement, générés en parallèle et envoyés au fil de l'eau
+    events = list(Event.objects.order_by('pk').only('eventName', 'eventDateHour', 'eventPlace', 'eventSeatAvailable'))
+    response = StreamingHttpResponse(event_reports_zip(events), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="rapports-evenements-{timezone.now():%Y%m%d-%H%M}.zip"'
+    return response
 
 
+@staff_member_required
+def generate_sales_pdf(request):
+    # Rendu dans un processus séparé et mis en cache tant que les ventes ne changent pas
+    return HttpResponse(sales_pdf(), content_type='application/pdf')
+
+
+# Contrôle d'accès : le scanner envoie le contenu du QR Code lu ({"payload": "..."}) pour un événement
+@csrf_exempt
+@require_POST
+@gate_token_required
+def gate_scan(request, event_id):
+    try:
+        payload = json.loads(request.body)["payload"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "invalid request"}, status=400)
+    # Le contenu d'un QR Code est toujours une chaîne
+    if not isinstance(payload, str):
+        return JsonResponse({"error": "invalid request"}, status=400)
+    return JsonResponse(validate_scan(event_id, payload))
+
+
+@require_GET
+@gate_token_required
+def gate_metrics(request):
+    return JsonResponse(scan_metrics.snapshot())
+
+
+# Synchronisation des entrées enregistrées par un scanner (éventuellement resté hors ligne) :
+# {"gate": "Porte A", "scans": [{"payload": "...", "scanned_at": "2024-07-27T18:02:11+02:00"}, ...]}
+@csrf_exempt
+@require_POST
+@gate_token_required
+def gate_checkins(request, event_id):
+    try:
+        data = json.loads(request.body)
+        scans = data["scans"]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "invalid request"}, status=400)
+    if not isinstance(scans, list) or len(scans) > settings.GATE_CHECKIN_BATCH_MAX:
+        return JsonResponse({"error": f"scans must be a list of at most {settings.GATE_CHECKIN_BATCH_MAX} items"},
+                            status=400)
+    return JsonResponse(record_checkins(event_id, scans, gate=str(data.get("gate", ""))[:64]))
+
+
+@require_GET
+@gate_token_required
+def gate_entries(request, event_id):
+    return JsonResponse(entry_stats(event_id))
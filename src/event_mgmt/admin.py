@@ -1,7 +1,17 @@
 from django.contrib import admin
-from event_mgmt.models import Event, Order, Cart
+from event_mgmt.models import Event, Order, Cart, SeatHold, FulfilmentJob, ProcessedStripeEvent, \
+    OutboxEmail, Offer, EventFacet, CatalogueVersion, \
+    OfferCatalogueVersion
 
 # Register your models here.
 admin.site.register(Event)
 admin.site.register(Order)
 admin.site.register(Cart)
+admin.site.register(SeatHold)
+admin.site.register(FulfilmentJob)
+admin.site.register(ProcessedStripeEvent)
+admin.site.register(OutboxEmail)
+admin.site.register(Offer)
+admin.site.register(EventFacet)
+admin.site.register(CatalogueVersion)
+admin.site.register(OfferCatalogueVersion)
@@ -1,19 +1,12 @@
 from django import forms
+from event_mgmt.function.offers import offer_choices
 from event_mgmt.models import Order
 
 
 # Création formulaire pour ne modifier que la quantité dans le panier
-
-OFFRES = (
-    (1, "Offre Solo -> 1 place"),
-    (2, "Offre Duo  -> 2 places"),
-    (4, "Offre Familiale -> 4 places")
-)
-
-
 class OrderForm(forms.ModelForm):
-    # Changer l'offre
-    quantity = forms.ChoiceField(choices=OFFRES)
+    # Changer l'offre (offres du catalogue proposées pour l'événement de la commande)
+    quantity = forms.ChoiceField(choices=[])
     # Supprimer l'article
     delete = forms.BooleanField(initial=False, required=False, label="Supprimer cette réservation")
 
@@ -21,6 +14,10 @@ class OrderForm(forms.ModelForm):
         model = Order
         fields = ["quantity"]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["quantity"].choices = offer_choices(self.instance.event_id)
+
     def save(self, *args, **kwargs):
         if self.cleaned_data["delete"]:
             return self.instance.delete()
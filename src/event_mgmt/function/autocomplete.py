@@ -0,0 +1,224 @@
+import threading
+import time
+import unicodedata
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from event_mgmt.models import Event
+
+# Longueur maximale indexée à partir du début de chaque mot : une saisie plus longue est cherchée sur ses premiers
+# caractères, puis les suggestions trouvées sont filtrées sur la saisie complète
+MAX_PREFIX_LENGTH = 12
+
+
+def normalize(text):
+    # Minuscules sans accents ni ponctuation, espaces simples : "Château-de-Versailles" -> "chateau de versailles"
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char if char.isalnum() else " " for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+
+def _suffixes(label):
+    # Chemins indexés : le libellé à partir du début de chacun de ses mots ("finale 100 m", "100 m", "m")
+    text = normalize(label)
+    starts = [0] + [i + 1 for i, char in enumerate(text) if char == " "]
+    return {text[start:start + MAX_PREFIX_LENGTH].rstrip() for start in starts}
+
+
+class _Node:
+    __slots__ = ("children", "here", "top")
+
+    def __init__(self):
+        self.children = {}
+        # Entrées (rang, clé) dont un chemin s'arrête sur ce nœud
+        self.here = []
+        # Meilleures entrées du sous-arbre, triées par rang
+        self.top = ()
+
+
+class AutocompleteIndex:
+    # Arbre des préfixes des noms d'événements à venir et de leurs lieux. Chaque nœud garde ses k meilleures
+    # entrées (prochaines dates d'abord) : une suggestion est un parcours de la saisie, sans tri ni requête.
+    # Les modifications d'événements de ce processus sont appliquées au fil de l'eau, celles des autres processus
+    # au prochain rechargement complet (en tâche de fond, la requête en cours utilise l'index existant)
+    def __init__(self):
+        self._root = None
+        # {clé: (rang, libellé, données renvoyées)} ; clé ("event", id) ou ("venue", lieu normalisé)
+        self._entries = {}
+        # Rang des événements à venir de chaque lieu : {lieu normalisé: {id: rang}}
+        self._venues = {}
+        self._built = 0.0
+        self._rebuilding = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _event_rank(event):
+        # Événements datés d'abord, du plus proche au plus lointain, puis les événements sans date
+        if event.eventDateHour is None:
+            return (1, float(event.pk))
+        return (0, event.eventDateHour.timestamp())
+
+    @staticmethod
+    def _event_data(event):
+        return {"label": event.eventName, "type": "événement", "url": event.get_absolute_url(),
+                "date": event.eventDateHour.isoformat() if event.eventDateHour else None}
+
+    @staticmethod
+    def _is_listed(event):
+        return event.eventDateHour is None or event.eventDateHour >= timezone.now()
+
+    def _add(self, key, rank, label, data):
+        self._entries[key] = (rank, label, data)
+        for path in _suffixes(label):
+            nodes = [self._root]
+            for char in path:
+                nodes.append(nodes[-1].children.setdefault(char, _Node()))
+            nodes[-1].here.append((rank, key))
+            self._update_tops(nodes)
+
+    def _remove(self, key):
+        if key not in self._entries:
+            return
+        rank, label, _ = self._entries.pop(key)
+        for path in _suffixes(label):
+            nodes = [self._root]
+            for char in path:
+                nodes.append(nodes[-1].children[char])
+            nodes[-1].here.remove((rank, key))
+            self._update_tops(nodes)
+
+    @staticmethod
+    def _compute_top(node):
+        candidates = set(node.here)
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = tuple(sorted(candidates)[:settings.AUTOCOMPLETE_TOP_K])
+
+    def _update_tops(self, nodes):
+        # Recalcul des meilleures entrées le long du chemin modifié, des feuilles vers la racine
+        for node in reversed(nodes):
+            self._compute_top(node)
+
+    def _venue_data(self, place):
+        return {"label": place, "type": "lieu", "url": f"{reverse('event-search')}?{urlencode({'q': place})}"}
+
+    def _set_venue(self, place):
+        # Un lieu est proposé tant qu'il accueille un événement listé, au rang de son prochain événement
+        venue = normalize(place)
+        self._remove(("venue", venue))
+        ranks = self._venues.get(venue)
+        if ranks:
+            self._add(("venue", venue), min(ranks.values()), place, self._venue_data(place))
+
+    def _add_event(self, event):
+        rank = self._event_rank(event)
+        self._add(("event", event.pk), rank, event.eventName, self._event_data(event))
+        if normalize(event.eventPlace):
+            self._venues.setdefault(normalize(event.eventPlace), {})[event.pk] = rank
+
+    def rebuild(self):
+        events = list(Event.objects.filter(Q(eventDateHour__isnull=True) | Q(eventDateHour__gte=timezone.now()))
+                      .only("eventName", "eventSlug", "eventPlace", "eventDateHour"))
+        index = AutocompleteIndex()
+        index._root = _Node()
+        places = {}
+        # Construction en deux temps : entrées posées sur leurs nœuds, puis meilleures entrées calculées
+        # une seule fois par nœud (parcours en profondeur)
+        for event in events:
+            rank = index._event_rank(event)
+            index._entries[("event", event.pk)] = (rank, event.eventName, index._event_data(event))
+            if venue := normalize(event.eventPlace):
+                index._venues.setdefault(venue, {})[event.pk] = rank
+                places.setdefault(venue, event.eventPlace)
+        for venue, ranks in index._venues.items():
+            index._entries[("venue", venue)] = (min(ranks.values()), places[venue], index._venue_data(places[venue]))
+        for key, (rank, label, _) in index._entries.items():
+            for path in _suffixes(label):
+                node = index._root
+                for char in path:
+                    node = node.children.setdefault(char, _Node())
+                node.here.append((rank, key))
+        stack = [(index._root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                self._compute_top(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+
+        with self._lock:
+            self._root, self._entries, self._venues = index._root, index._entries, index._venues
+            self._built = time.monotonic()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            # Connexion ouverte par ce thread : fermée pour ne pas rester en attente côté base
+            connection.close()
+            self._rebuilding = False
+
+    def _ensure_fresh(self):
+        if self._root is None:
+            self.rebuild()
+        elif (time.monotonic() - self._built > settings.AUTOCOMPLETE_FULL_RELOAD_INTERVAL
+              and not self._rebuilding):
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def suggest(self, query, limit=None):
+        # Meilleures suggestions pour la saisie : [{"label", "type", "url", ("date")}, ...]
+        limit = min(limit or settings.AUTOCOMPLETE_TOP_K, settings.AUTOCOMPLETE_TOP_K)
+        text = normalize(query)
+        prefix = text[:MAX_PREFIX_LENGTH].rstrip()
+        if not prefix:
+            return []
+        self._ensure_fresh()
+        with self._lock:
+            node = self._root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            # Un événement passé depuis le dernier rechargement n'est plus proposé
+            now = (0, time.time())
+            entries = [self._entries[key] for rank, key in node.top if key[0] == "venue" or rank >= now]
+        if len(text) > MAX_PREFIX_LENGTH:
+            entries = [entry for entry in entries if f" {text}" in f" {normalize(entry[1])}"]
+        return [data for _, _, data in entries[:limit]]
+
+    def update_event(self, event):
+        # Événement enregistré par ce processus : mise à jour immédiate de l'index s'il est déjà construit
+        with self._lock:
+            if self._root is None:
+                return
+            self.remove_event(event.pk)
+            if self._is_listed(event):
+                self._add_event(event)
+                self._set_venue(event.eventPlace)
+
+    def remove_event(self, event_id):
+        with self._lock:
+            if self._root is None or ("event", event_id) not in self._entries:
+                return
+            self._remove(("event", event_id))
+            for venue, ranks in self._venues.items():
+                if ranks.pop(event_id, None) is not None:
+                    if not ranks:
+                        del self._venues[venue]
+                    self._set_venue(self._entries[("venue", venue)][1])
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._root = None
+            self._entries, self._venues = {}, {}
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,57 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from event_mgmt.function.facets import filter_events
+from event_mgmt.models import Event, EventFacet
+
+# Champs affichés par les cartes du catalogue (eventDateHour : position du curseur, version : clé du fragment)
+CARD_FIELDS = ("eventName", "eventSlug", "eventPlace", "eventPic", "eventDateHour", "version")
+
+
+def encode_cursor(event):
+    # Curseur opaque : date et identifiant du dernier événement de la page
+    date = event.eventDateHour.isoformat() if event.eventDateHour else None
+    return base64.urlsafe_b64encode(json.dumps([date, event.pk]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        date, pk = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        moment = parse_datetime(date) if date is not None else None
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if (date is not None and moment is None) or not isinstance(pk, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return moment, pk
+
+
+def event_page(after=None, size=None, filters=None):
+    # Page du catalogue triée par date (événements sans date à la fin) puis par identifiant, à partir du curseur
+    # after : chaque page est une lecture d'index bornée (eventDateHour, id), quelle que soit sa position.
+    # filters : filtres du catalogue (event_mgmt.function.facets.catalogue_filters)
+    size = size or settings.EVENT_CATALOGUE_PAGE_SIZE
+    date, pk = decode_cursor(after) if after else (None, None)
+    queryset = filter_events(Event.objects.only(*CARD_FIELDS), filters or {})
+
+    events = []
+    # Événements datés, sauf si le curseur est déjà dans les événements sans date
+    if after is None or date is not None:
+        dated = queryset.filter(eventDateHour__isnull=False)
+        if after:
+            # La borne eventDateHour >= date permet une recherche directe dans l'index avant le départage par id
+            dated = dated.filter(Q(eventDateHour__gt=date) | Q(pk__gt=pk), eventDateHour__gte=date)
+        events = list(dated.order_by("eventDateHour", "pk")[:size + 1])
+    # Puis les événements sans date, si la page n'est pas pleine (aucun s'il faut un jour précis)
+    if len(events) <= size and EventFacet.DAY not in (filters or {}):
+        undated = queryset.filter(eventDateHour__isnull=True)
+        if after and date is None:
+            undated = undated.filter(pk__gt=pk)
+        events += list(undated.order_by("pk")[:size + 1 - len(events)])
+
+    # Un événement de plus que la taille de page : il existe une page suivante
+    next_cursor = encode_cursor(events[size - 1]) if len(events) > size else None
+    return events[:size], next_cursor
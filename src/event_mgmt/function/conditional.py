@@ -0,0 +1,77 @@
+import hashlib
+
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from event_mgmt.models import Cart, CatalogueVersion, Event, SeatHold
+
+# Validateurs des requêtes GET conditionnelles (décorateur django.views.decorators.http.condition) : chaque
+# page est décrite par une lecture indexée, sans rendu du gabarit. Les mêmes données donnent le même ETag,
+# le navigateur reçoit alors un 304 Not Modified sans corps
+
+
+def touch_catalogue():
+    # Nouvelle version des pages du catalogue (les pages gardées par les navigateurs sont à recharger)
+    CatalogueVersion.objects.filter(pk=CatalogueVersion.SINGLETON).update(version=F("version") + 1,
+                                                                          updated_at=timezone.now())
+
+
+def _cart_size(request):
+    # Nombre d'articles du panier affiché dans le menu, lu dans la même requête que la page
+    # (None : visiteur anonyme ou utilisateur sans panier)
+    if not request.user.is_authenticated:
+        return Value(None, output_field=IntegerField())
+    return Subquery(Cart.objects.filter(user=request.user.pk).annotate(size=Count("orders")).values("size")[:1])
+
+
+def _etag(request, *state):
+    # Le menu (lien du profil, adresse e-mail, panier, accès administration) dépend de l'utilisateur connecté
+    user = request.user
+    viewer = (user.pk, user.email, user.is_superuser) if user.is_authenticated else ("anonyme",)
+    return hashlib.md5(repr((*viewer, *state)).encode()).hexdigest()
+
+
+def _catalogue_state(request):
+    # Les deux validateurs d'une même requête partagent la lecture en base
+    if not hasattr(request, "_catalogue_state"):
+        request._catalogue_state = (CatalogueVersion.objects.filter(pk=CatalogueVersion.SINGLETON)
+                                    .annotate(cart_size=_cart_size(request))
+                                    .values_list("version", "updated_at", "cart_size").first())
+    return request._catalogue_state
+
+
+def catalogue_etag(request, *args, **kwargs):
+    # Pages du catalogue et de la recherche (la requête : curseur, filtres, recherche, fait partie de l'URL)
+    state = _catalogue_state(request)
+    return _etag(request, "catalogue", *state) if state else None
+
+
+def catalogue_last_modified(request, *args, **kwargs):
+    # Date fiable pour un visiteur anonyme seulement (le panier d'un utilisateur change sans dater le catalogue)
+    state = _catalogue_state(request)
+    return state[1] if state and not request.user.is_authenticated else None
+
+
+def event_detail_etag(request, slug):
+    # Les places restantes tiennent compte des blocages en cours, qui expirent sans modifier l'événement :
+    # elles font partie du validateur (somme sur l'index des blocages de l'événement)
+    held = (SeatHold.objects.filter(event=OuterRef("pk"), status=SeatHold.ACTIVE, expires_at__gt=timezone.now())
+            .values("event").annotate(total=Sum("quantity")).values("total"))
+    state = (Event.objects.filter(eventSlug=slug).order_by("pk")
+             .annotate(held=Coalesce(Subquery(held), 0), cart_size=_cart_size(request))
+             .values_list("pk", "version", "updated_at", "held", "cart_size").first())
+    return _etag(request, "evenement", *state) if state else None
+
+
+def tickets_etag(request, *args, **kwargs):
+    # Billets de l'utilisateur : nombre, dernier émis, QR Codes générés, dernière modification de leurs événements
+    if not request.user.is_authenticated:
+        return None
+    state = (CustomUser.objects.filter(pk=request.user.pk)
+             .annotate(tickets=Count("eticket"), last_ticket=Max("eticket"),
+                       qr_ready=Count("eticket", filter=~Q(eticket__qr_code="") & Q(eticket__qr_code__isnull=False)),
+                       events_updated=Max("eticket__event__updated_at"), cart_size=_cart_size(request))
+             .values_list("tickets", "last_ticket", "qr_ready", "events_updated", "cart_size").first())
+    return _etag(request, "billets", *state) if state else None
@@ -0,0 +1,107 @@
+import datetime
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from event_mgmt.function.conditional import touch_catalogue
+from event_mgmt.models import Event, EventFacet
+
+# Champs de l'événement dont dépendent les compteurs
+FACET_FIELDS = ("eventPlace", "eventDateHour", "eventSeatAvailable")
+AVAILABILITY_LABELS = {EventFacet.AVAILABLE: "Places disponibles", EventFacet.SOLD_OUT: "Complet"}
+
+
+def _availability(seats):
+    # Un événement sans jauge renseignée n'est pas limité
+    return EventFacet.AVAILABLE if seats is None or seats > 0 else EventFacet.SOLD_OUT
+
+
+def compute_facets():
+    # Comptage complet en une lecture des trois champs : {(filtre, valeur): nombre d'événements}
+    counts = Counter()
+    for place, date, seats in Event.objects.values_list(*FACET_FIELDS).iterator(chunk_size=5000):
+        if place:
+            counts[(EventFacet.PLACE, place)] += 1
+        if date:
+            counts[(EventFacet.DAY, timezone.localdate(date).isoformat())] += 1
+        counts[(EventFacet.AVAILABILITY, _availability(seats))] += 1
+    return counts
+
+
+def refresh_facets():
+    # Recalcul de la table à l'enregistrement ou à la suppression d'un événement (opération d'administration)
+    counts = compute_facets()
+    with transaction.atomic():
+        EventFacet.objects.all().delete()
+        EventFacet.objects.bulk_create([EventFacet(facet=facet, value=value, count=count)
+                                        for (facet, value), count in counts.items()])
+
+
+def record_sold_out(event_ids):
+    # Après une vente : les événements qui viennent d'atteindre 0 place passent de "disponible" à "complet"
+    # (une vente n'est acceptée que s'il restait assez de places, ils étaient donc disponibles)
+    sold_out = Event.objects.filter(pk__in=event_ids, eventSeatAvailable__lte=0).count()
+    if not sold_out:
+        return
+    EventFacet.objects.bulk_create([EventFacet(facet=EventFacet.AVAILABILITY, value=EventFacet.SOLD_OUT)],
+                                   ignore_conflicts=True)
+    EventFacet.objects.filter(facet=EventFacet.AVAILABILITY).update(count=F("count") + Case(
+        When(value=EventFacet.SOLD_OUT, then=Value(sold_out)), default=Value(-sold_out)))
+    # Compteurs du catalogue modifiés : nouvelle version des pages du catalogue
+    touch_catalogue()
+
+
+def catalogue_filters(params):
+    # Filtres reçus dans l'URL du catalogue (?lieu=...&jour=2024-07-27&dispo=disponible)
+    filters = {}
+    if place := params.get(EventFacet.PLACE):
+        filters[EventFacet.PLACE] = place
+    if day := params.get(EventFacet.DAY):
+        if parse_date(day) is None:
+            raise ValueError(f"Invalid day: {day}")
+        filters[EventFacet.DAY] = day
+    if availability := params.get(EventFacet.AVAILABILITY):
+        if availability not in AVAILABILITY_LABELS:
+            raise ValueError(f"Invalid availability: {availability}")
+        filters[EventFacet.AVAILABILITY] = availability
+    return filters
+
+
+def filter_events(queryset, filters):
+    # Conditions compatibles avec les index du catalogue (égalité sur le lieu, intervalle de dates, jauge)
+    if EventFacet.PLACE in filters:
+        queryset = queryset.filter(eventPlace=filters[EventFacet.PLACE])
+    if EventFacet.DAY in filters:
+        start = timezone.make_aware(datetime.datetime.combine(parse_date(filters[EventFacet.DAY]), datetime.time()))
+        queryset = queryset.filter(eventDateHour__gte=start, eventDateHour__lt=start + datetime.timedelta(days=1))
+    if filters.get(EventFacet.AVAILABILITY) == EventFacet.AVAILABLE:
+        queryset = queryset.filter(Q(eventSeatAvailable__isnull=True) | Q(eventSeatAvailable__gt=0))
+    elif filters.get(EventFacet.AVAILABILITY) == EventFacet.SOLD_OUT:
+        queryset = queryset.filter(eventSeatAvailable__lte=0)
+    return queryset
+
+
+def facet_groups(filters):
+    # Filtres affichés avec leur nombre d'événements (une requête) ; chaque lien active ou retire sa valeur
+    # en conservant les autres filtres
+    groups = {facet: [] for facet, _ in EventFacet.FACET_CHOICES}
+    for facet in EventFacet.objects.filter(count__gt=0).order_by("facet", "value"):
+        active = filters.get(facet.facet) == facet.value
+        params = {key: value for key, value in filters.items() if key != facet.facet}
+        if not active:
+            params[facet.facet] = facet.value
+        if facet.facet == EventFacet.DAY:
+            label = parse_date(facet.value).strftime("%d/%m/%Y")
+        elif facet.facet == EventFacet.AVAILABILITY:
+            label = AVAILABILITY_LABELS[facet.value]
+        else:
+            label = facet.value
+        groups[facet.facet].append({"label": label, "count": facet.count, "active": active,
+                                    "query": urlencode(params)})
+    return [{"name": name, "values": groups[facet],
+             "all_query": urlencode({key: value for key, value in filters.items() if key != facet})}
+            for facet, name in EventFacet.FACET_CHOICES]
@@ -0,0 +1,55 @@
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Fragments HTML mis en cache par événement (gabarits event_mgmt, balise {% event_fragment %})
+FRAGMENT_KINDS = ("carte", "detail-image", "detail-description")
+
+
+def fragment_key(kind, event):
+    # La version de l'événement change à chaque enregistrement et à chaque vente de places : un fragment
+    # n'est jamais invalidé explicitement, l'ancienne clé n'est simplement plus lue et expire
+    return f"event_mgmt:fragment:{kind}:{event.pk}:{event.version}"
+
+
+class FragmentMetrics:
+    # Succès et échecs du cache de fragments de ce processus, par type de fragment
+    def __init__(self):
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+
+    def record(self, kind, hit):
+        with self._lock:
+            self._counts[kind]["hits" if hit else "misses"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = {kind: dict(values) for kind, values in self._counts.items()}
+        for values in counts.values():
+            total = values["hits"] + values["misses"]
+            values["hit_rate"] = values["hits"] / total if total else None
+        return counts
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+fragment_metrics = FragmentMetrics()
+
+
+def cached_fragment(kind, event, render):
+    key = fragment_key(kind, event)
+    html = cache.get(key)
+    fragment_metrics.record(kind, hit=html is not None)
+    if html is None:
+        html = render()
+        cache.set(key, html, settings.EVENT_FRAGMENT_CACHE_TIMEOUT)
+    return html
+
+
+def delete_fragments(event):
+    # Événement supprimé : ses fragments sont retirés du cache sans attendre leur expiration
+    cache.delete_many([fragment_key(kind, event) for kind in FRAGMENT_KINDS])
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from django.utils import timezone
+
+from event_mgmt.function.facets import record_sold_out
+from event_mgmt.models import Event, SeatHold
+
+
+# Nombre de tentatives lorsque la base répond "database is locked" (SQLite) pendant un pic de webhooks
+LOCK_RETRIES = 5
+# Attente initiale (en secondes) entre deux tentatives, doublée à chaque nouvel essai
+LOCK_BACKOFF = 0.05
+
+
+class InsufficientSeats(Exception):
+    # Levée lorsqu'un événement n'a plus assez de places pour honorer une commande
+    def __init__(self, event_id, requested):
+        self.event_id = event_id
+        self.requested = requested
+        super().__init__(f"Not enough seats left for event {event_id} ({requested} requested)")
+
+
+# Compteurs de contention par événement, partagés par tous les threads du processus
+_metrics = defaultdict(lambda: {"attempts": 0, "decremented": 0, "held": 0, "rejected": 0, "lock_retries": 0,
+                                "lock_wait": 0.0})
+_metrics_lock = threading.Lock()
+
+
+def _record(event_id, **increments):
+    with _metrics_lock:
+        stats = _metrics[event_id]
+        for name, value in increments.items():
+            stats[name] += value
+
+
+def get_contention_metrics():
+    # Copie des compteurs pour pouvoir les exposer sans risque de modification concurrente
+    with _metrics_lock:
+        return {event_id: dict(stats) for event_id, stats in _metrics.items()}
+
+
+def reset_contention_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def seats_by_event(orders):
+    # Regroupement des quantités par événement : une seule mise à jour par événement même si le panier
+    # contient plusieurs commandes pour la même épreuve
+    quantities = defaultdict(int)
+    for order in orders:
+        quantities[order.event_id] += order.quantity
+    return dict(quantities)
+
+
+class _Rejected(Exception):
+    pass
+
+
+def _decrement(quantities):
+    needed = Case(*[When(pk=event_id, then=Value(quantity)) for event_id, quantity in quantities.items()],
+                  output_field=IntegerField())
+    for event_id in quantities:
+        _record(event_id, attempts=1)
+
+    try:
+        with transaction.atomic():
+            # Décrément conditionnel de tous les événements en une seule requête : la base ignore les lignes
+            # qui n'ont plus assez de places (un événement sans jauge renseignée n'est pas limité)
+            updated = Event.objects.filter(
+                Q(eventSeatAvailable__isnull=True) | Q(eventSeatAvailable__gte=needed), pk__in=quantities
+            ).update(eventSeatAvailable=F("eventSeatAvailable") - needed, version=F("version") + 1,
+                     updated_at=timezone.now())
+            # Si un seul événement manque de places, aucune déduction n'est conservée
+            if updated != len(quantities):
+                raise _Rejected
+            # Compteurs du filtre de disponibilité du catalogue
+            record_sold_out(list(quantities))
+    except _Rejected:
+        rejected = list(Event.objects.filter(pk__in=quantities, eventSeatAvailable__lt=needed)
+                        .values_list("pk", flat=True))
+        for event_id in rejected:
+            _record(event_id, rejected=1)
+        event_id = min(rejected, default=None)
+        raise InsufficientSeats(event_id, quantities.get(event_id))
+
+    for event_id in quantities:
+        _record(event_id, decremented=1)
+
+
+def run_atomic(callback, event_ids):
+    # Exécute callback dans une transaction, rejouée avec un délai croissant si la base est verrouillée
+    delay = LOCK_BACKOFF
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with transaction.atomic():
+                return callback()
+        except OperationalError as error:
+            if "locked" not in str(error) or attempt == LOCK_RETRIES:
+                raise
+            for event_id in event_ids:
+                _record(event_id, lock_retries=1, lock_wait=delay)
+            time.sleep(delay)
+            delay *= 2
+
+
+def decrement_seats(quantities):
+    # quantities : {event_id: nombre de places}. Toutes les déductions réussissent ou aucune (transaction)
+    if not quantities:
+        return
+
+    # Dans une transaction englobante, impossible de rejouer : c'est l'appelant qui gère l'échec
+    if transaction.get_connection().in_atomic_block:
+        _decrement(quantities)
+    else:
+        run_atomic(lambda: _decrement(quantities), quantities)
+
+
+def _hold(user, quantities, checkout_session_id, expires_at):
+    # Un nouveau passage en caisse remplace les blocages encore actifs du même utilisateur
+    SeatHold.objects.filter(user=user, status=SeatHold.ACTIVE).update(status=SeatHold.RELEASED)
+    # Mise à jour neutre des événements concernés : prend le verrou en écriture (ligne ou base SQLite)
+    # avant de lire les places bloquées, les réservations concurrentes sont donc sérialisées
+    Event.objects.filter(pk__in=quantities).update(eventSeatAvailable=F("eventSeatAvailable"))
+    held = SeatHold.held_seats(quantities)
+
+    for event_id, capacity in Event.objects.filter(pk__in=quantities).order_by("pk").values_list(
+            "pk", "eventSeatAvailable"):
+        _record(event_id, attempts=1)
+        if capacity is not None and capacity - held.get(event_id, 0) < quantities[event_id]:
+            _record(event_id, rejected=1)
+            raise InsufficientSeats(event_id, quantities[event_id])
+        _record(event_id, held=1)
+
+    return SeatHold.objects.bulk_create([
+        SeatHold(event_id=event_id, user=user, quantity=quantity, checkout_session_id=checkout_session_id,
+                 expires_at=expires_at)
+        for event_id, quantity in quantities.items()
+    ])
+
+
+def hold_seats(user, quantities, checkout_session_id, expires_at):
+    # Blocage des places du panier jusqu'à expires_at (tout ou rien)
+    return run_atomic(lambda: _hold(user, quantities, checkout_session_id, expires_at), quantities)
+
+
+def convert_holds(checkout_session_id):
+    # Paiement validé : les places sont définitivement déduites, le blocage n'a plus lieu d'être
+    return SeatHold.objects.filter(checkout_session_id=checkout_session_id, status=SeatHold.ACTIVE).update(
+        status=SeatHold.CONVERTED)
+
+
+def release_holds(checkout_session_id):
+    return SeatHold.objects.filter(checkout_session_id=checkout_session_id, status=SeatHold.ACTIVE).update(
+        status=SeatHold.RELEASED)
+
+
+def release_expired_holds():
+    return SeatHold.objects.filter(status=SeatHold.ACTIVE, expires_at__lte=timezone.now()).update(
+        status=SeatHold.RELEASED)
@@ -0,0 +1,77 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from event_mgmt.models import FulfilmentJob
+
+
+# Fonction exécutée pour chaque type de tâche (chemin importé à la demande : pas d'import circulaire avec les vues)
+HANDLERS = {
+    "checkout.session.completed": "event_mgmt.views.fulfil_checkout_session",
+    "etickets.issued": "eticketing.function.order_confirmation_email.send_issued_etickets",
+}
+
+
+def enqueue(kind, payload):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return FulfilmentJob.objects.create(kind=kind, payload=payload)
+
+
+def claim_next_job():
+    # Tâches prêtes : en attente et dont le délai est écoulé, ou abandonnées par un worker arrêté brutalement
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.FULFILMENT_LOCK_TIMEOUT)
+    ready = (Q(status=FulfilmentJob.PENDING, run_after__lte=now)
+             | Q(status=FulfilmentJob.RUNNING, locked_at__lt=stale))
+
+    for job_id in FulfilmentJob.objects.filter(ready).order_by("run_after").values_list("pk", flat=True)[:10]:
+        # Prise en charge par mise à jour conditionnelle : un seul worker peut gagner une tâche donnée
+        claimed = FulfilmentJob.objects.filter(ready, pk=job_id).update(
+            status=FulfilmentJob.RUNNING, locked_at=now, attempts=F("attempts") + 1)
+        if claimed:
+            return FulfilmentJob.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    try:
+        import_string(HANDLERS[job.kind])(job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= settings.FULFILMENT_MAX_ATTEMPTS:
+            # Plus de nouvelle tentative : la tâche est mise de côté pour analyse (dead letter)
+            job.status = FulfilmentJob.DEAD
+        else:
+            job.status = FulfilmentJob.PENDING
+            delay = settings.FULFILMENT_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        job.save(update_fields=["status", "run_after", "last_error"])
+        return False
+
+    job.status = FulfilmentJob.DONE
+    job.save(update_fields=["status"])
+    return True
+
+
+def run_pending_jobs(limit=None):
+    # Exécute les tâches prêtes jusqu'à épuisement (ou limit), renvoie le nombre de tâches traitées
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def queue_stats():
+    stats = dict.fromkeys(dict(FulfilmentJob.STATUS_CHOICES), 0)
+    for row in FulfilmentJob.objects.values("status").annotate(total=Count("pk")):
+        stats[row["status"]] = row["total"]
+    return stats
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F, FilteredRelation, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from event_mgmt.models import Offer, OfferCatalogueVersion
+
+_lock = threading.Lock()
+# Copie locale du catalogue ; "checked" : dernière lecture de la version en base (horloge monotone)
+_catalogue = {"version": None, "loaded": 0.0, "checked": None, "current": None, "defaults": {}, "events": {}}
+
+
+def bump_catalogue_version():
+    # Dans la transaction qui modifie l'offre : la nouvelle version n'est visible qu'avec la modification
+    OfferCatalogueVersion.objects.filter(pk=OfferCatalogueVersion.SINGLETON).update(version=F("version") + 1)
+
+
+def forget_catalogue_version():
+    # Le processus qui a modifié une offre relit la version dès le prochain accès (sans attendre l'intervalle)
+    _catalogue["checked"] = None
+
+
+def reset_catalogue():
+    # Copie locale abandonnée (tests : les offres et la version sont annulées par le rollback)
+    with _lock:
+        _catalogue.update(version=None, loaded=0.0, checked=None, current=None, defaults={}, events={})
+
+
+def _current_version():
+    # Version partagée par tous les processus, relue en base au plus toutes les OFFER_CATALOGUE_CHECK_INTERVAL
+    # secondes (une lecture par clé primaire)
+    now = time.monotonic()
+    if _catalogue["checked"] is None or now - _catalogue["checked"] >= settings.OFFER_CATALOGUE_CHECK_INTERVAL:
+        _catalogue["current"] = (OfferCatalogueVersion.objects.filter(pk=OfferCatalogueVersion.SINGLETON)
+                                 .values_list("version", flat=True).first())
+        _catalogue["checked"] = now
+    return _catalogue["current"]
+
+
+def _is_current(version):
+    return (version == _catalogue["version"]
+            and time.monotonic() - _catalogue["loaded"] < settings.OFFER_CATALOGUE_MAX_AGE)
+
+
+def _load_catalogue():
+    # Catalogue complet en mémoire : quelques offres par défaut et les tarifs propres à certains événements
+    version = _current_version()
+    if _is_current(version):
+        return _catalogue
+    with _lock:
+        if not _is_current(version):
+            defaults, events = {}, {}
+            for offer in Offer.objects.all():
+                if offer.event_id is None:
+                    defaults[offer.seats] = offer
+                else:
+                    events.setdefault(offer.event_id, {})[offer.seats] = offer
+            _catalogue.update(version=version, loaded=time.monotonic(), defaults=defaults, events=events)
+    return _catalogue
+
+
+def offers_for(event_id=None):
+    # Offres d'un événement triées par nombre de places : {places: Offer}
+    catalogue = _load_catalogue()
+    offers = {**catalogue["defaults"], **catalogue["events"].get(event_id, {})}
+    return dict(sorted(offers.items()))
+
+
+def get_offer(seats, event_id=None):
+    return offers_for(event_id).get(seats)
+
+
+def offer_label(seats, event_id=None):
+    offer = get_offer(seats, event_id)
+    return offer.label if offer else str(seats)
+
+
+def offer_price(seats, event_id=None):
+    offer = get_offer(seats, event_id)
+    return offer.price if offer else 0
+
+
+def current_offer_price(seats, event_id=None):
+    # Prix lu en base et non dans la copie locale : prix enregistré sur un billet à son émission
+    # (tarif propre à l'événement, à défaut l'offre par défaut, 0 pour une offre inconnue)
+    price = (Offer.objects.filter(Q(event_id=event_id) | Q(event__isnull=True), seats=seats)
+             .order_by(F("event").asc(nulls_last=True)).values_list("price", flat=True).first())
+    return price or 0
+
+
+def offer_choices(event_id=None):
+    # Choix proposés dans le panier (ex : "Offre Duo -> 2 places")
+    return [(seats, f"Offre {offer.label} -> {seats} place{'s' if seats > 1 else ''}")
+            for seats, offer in offers_for(event_id).items()]
+
+
+def with_offer_price(queryset, seats_field="offer"):
+    # Prix actuel de l'offre calculé par la base, annotation offer_price (Eticket : offer, Order : quantity) :
+    # jointure sur le tarif propre à l'événement, à défaut l'offre par défaut du catalogue, 0 pour une offre inconnue
+    default_price = (Offer.objects.filter(event__isnull=True, seats=OuterRef(seats_field))
+                     .order_by().values("price")[:1])
+    return queryset.alias(
+        event_offer=FilteredRelation("event__offers", condition=Q(event__offers__seats=F(seats_field))),
+    ).annotate(offer_price=Coalesce(F("event_offer__price"), Subquery(default_price), Value(0)))
+
+
+def stripe_line_item(order):
+    # Ligne de paiement Stripe d'une commande : prix Stripe de l'offre s'il est renseigné,
+    # sinon prix à la place de l'événement multiplié par le nombre de places
+    offer = get_offer(order.quantity, order.event_id)
+    if offer and offer.stripe_price_id:
+        return {"price": offer.stripe_price_id, "quantity": 1}
+    return {"price": order.event.stripe_id, "quantity": order.quantity}
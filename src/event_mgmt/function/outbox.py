@@ -0,0 +1,115 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from event_mgmt.models import OutboxEmail
+
+
+def queue_email(subject, body, to, from_email=None, attachments=(), key=None):
+    # Mise en file d'un email : créé dans la transaction de l'appelant, il n'est envoyé que si celle-ci aboutit.
+    # Avec une clé, un email déjà en file sous cette clé est renvoyé tel quel (pas de doublon)
+    fields = {"subject": subject, "body": body, "to": list(to), "from_email": from_email or "",
+              "attachments": list(attachments)}
+    if key is None:
+        return OutboxEmail.objects.create(**fields)
+    return OutboxEmail.objects.get_or_create(key=key, defaults=fields)[0]
+
+
+def _ready():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT)
+    return now, (Q(status=OutboxEmail.PENDING, run_after__lte=now)
+                 | Q(status=OutboxEmail.SENDING, locked_at__lt=stale))
+
+
+def claim_batch(size):
+    now, ready = _ready()
+    claimed = []
+    for email_id in OutboxEmail.objects.filter(ready).order_by("run_after").values_list("pk", flat=True)[:size]:
+        # Mise à jour conditionnelle : un email n'est pris en charge que par un seul worker
+        if OutboxEmail.objects.filter(ready, pk=email_id).update(
+                status=OutboxEmail.SENDING, locked_at=now, attempts=F("attempts") + 1):
+            claimed.append(email_id)
+    return list(OutboxEmail.objects.filter(pk__in=claimed).order_by("pk"))
+
+
+def _message(email, connection):
+    message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+    for path in email.attachments:
+        message.attach_file(path)
+    return message
+
+
+def _failed(email, connection):
+    email.last_error = traceback.format_exc()
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxEmail.DEAD
+    else:
+        email.status = OutboxEmail.PENDING
+        delay = settings.OUTBOX_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+        email.run_after = timezone.now() + timedelta(seconds=delay)
+    email.save(update_fields=["status", "run_after", "last_error"])
+    # La connexion est peut-être rompue : elle sera rouverte pour l'email suivant
+    connection.close()
+
+
+def deliver_batch(connection, size=None):
+    # Envoie un lot d'emails sur la connexion fournie (ouverte une fois, réutilisée pour tout le lot).
+    # Renvoie (nombre d'emails pris en charge, nombre d'emails envoyés)
+    emails = claim_batch(size or settings.OUTBOX_BATCH_SIZE)
+    sent = []
+    for email in emails:
+        try:
+            # Sans effet si la connexion est déjà ouverte
+            connection.open()
+            _message(email, connection).send()
+        except Exception:
+            _failed(email, connection)
+        else:
+            sent.append(email.pk)
+    # Une seule requête pour marquer tout le lot comme envoyé
+    OutboxEmail.objects.filter(pk__in=sent).update(status=OutboxEmail.SENT, sent_at=timezone.now())
+    return len(emails), len(sent)
+
+
+def deliver_outbox(connection=None, batch_size=None, limit=None):
+    # Vide la file (ou envoie au plus limit emails) avec une seule connexion SMTP, fermée à la fin.
+    # Renvoie le nombre d'emails envoyés
+    connection = connection or get_connection()
+    delivered = 0
+    processed = 0
+    try:
+        while limit is None or processed < limit:
+            size = batch_size or settings.OUTBOX_BATCH_SIZE
+            if limit is not None:
+                size = min(size, limit - processed)
+            claimed, sent = deliver_batch(connection, size)
+            if not claimed:
+                break
+            processed += claimed
+            delivered += sent
+    finally:
+        connection.close()
+    return delivered
+
+
+def outbox_stats():
+    # Profondeur de la file par statut, âge du plus ancien email en attente et délai moyen de remise récent
+    now = timezone.now()
+    stats = dict.fromkeys(dict(OutboxEmail.STATUS_CHOICES), 0)
+    for row in OutboxEmail.objects.values("status").annotate(total=Count("pk")):
+        stats[row["status"]] = row["total"]
+
+    oldest = OutboxEmail.objects.filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING]).aggregate(
+        oldest=Min("created_at"))["oldest"]
+    stats["oldest_pending_seconds"] = (now - oldest).total_seconds() if oldest else None
+
+    recent = list(OutboxEmail.objects.filter(status=OutboxEmail.SENT, sent_at__isnull=False)
+                  .order_by("-sent_at").values_list("created_at", "sent_at")[:100])
+    stats["average_latency_seconds"] = (sum((sent_at - created_at).total_seconds() for created_at, sent_at in recent)
+                                        / len(recent) if recent else None)
+    return stats
@@ -0,0 +1,82 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from event_mgmt.function.catalogue import CARD_FIELDS
+from event_mgmt.models import Event
+
+# Table virtuelle FTS5 (migration 0020) : une ligne par événement, rowid = id de l'événement.
+# Tokenisation unicode61 sans accents : "epee" trouve "Épée", "chateauroux" trouve "Châteauroux"
+SEARCH_TABLE = "event_mgmt_event_fts"
+SEARCH_FIELDS = ("eventName", "eventPlace", "eventDescription")
+# Poids des colonnes dans le classement bm25 : le nom compte plus que le lieu, le lieu plus que la description
+SEARCH_WEIGHTS = (10.0, 3.0, 1.0)
+
+
+def search_available():
+    # FTS5 n'existe que sous SQLite : les autres bases utilisent le filtrage icontains
+    return connection.vendor == "sqlite"
+
+
+def index_events(events):
+    # (Ré)indexation d'événements enregistrés
+    if not search_available() or not events:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(events))})",
+                       [event.pk for event in events])
+        cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s)",
+                           [(event.pk, event.eventName, event.eventPlace, event.eventDescription) for event in events])
+
+
+def unindex_events(event_ids):
+    if not search_available() or not event_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(event_ids))})",
+                       list(event_ids))
+
+
+def rebuild_search_index():
+    # Reconstruction complète en une requête (reprise après un import en masse, bulk_create ou update)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+                       f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM {Event._meta.db_table}")
+        return cursor.rowcount
+
+
+def match_expression(query):
+    # Chaque mot saisi devient un préfixe entre guillemets (aucun opérateur FTS5 ne peut être injecté),
+    # tous les mots doivent être présents : "natation marseil" -> "natation"* "marseil"*
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_events(query, limit=None):
+    # Événements correspondant à la recherche, du plus pertinent au moins pertinent
+    limit = limit or settings.EVENT_SEARCH_LIMIT
+    expression = match_expression(query)
+    if not expression:
+        return []
+    if not search_available():
+        return list(naive_search(query)[:limit])
+
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                       f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s", [expression, limit])
+        event_ids = [row[0] for row in cursor.fetchall()]
+    events = Event.objects.only(*CARD_FIELDS).in_bulk(event_ids)
+    return [events[event_id] for event_id in event_ids if event_id in events]
+
+
+def naive_search(query):
+    # Filtrage LIKE sur chaque champ, sans classement (repli hors SQLite et référence du banc d'essai)
+    queryset = Event.objects.only(*CARD_FIELDS)
+    for word in re.findall(r"\w+", query):
+        queryset = queryset.filter(Q(eventName__icontains=word) | Q(eventPlace__icontains=word)
+                                   | Q(eventDescription__icontains=word))
+    return queryset.order_by("eventDateHour", "pk")
@@ -0,0 +1,12 @@
+from functools import cache
+
+from django.conf import settings
+
+
+@cache
+def get_stripe():
+    # SDK Stripe importé à la première utilisation (paiement, webhook, adresse par défaut) et non au chargement
+    # des URLs : les workers qui ne servent pas ces pages ne le chargent jamais
+    import stripe
+    stripe.api_key = settings.STRIPE_API_KEY
+    return stripe
@@ -0,0 +1,52 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from event_mgmt.function.catalogue import CARD_FIELDS, encode_cursor, event_page
+from event_mgmt.models import Event
+
+
+class Command(BaseCommand):
+    help = ("Mesure le temps d'affichage d'une page du catalogue (pagination par curseur et par OFFSET) "
+            "pour des catalogues de taille croissante. Les événements créés sont annulés à la fin.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000",
+                            help="Tailles de catalogue mesurées, séparées par des virgules.")
+        parser.add_argument("--repeat", type=int, default=20, help="Nombre de mesures par page.")
+
+    def timed(self, repeat, fetch):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fetch()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        repeat = options["repeat"]
+        start = timezone.now()
+
+        self.stdout.write(f"{'Événements':>12}{'Curseur début (ms)':>20}{'Curseur fin (ms)':>18}"
+                          f"{'OFFSET fin (ms)':>17}")
+        with transaction.atomic():
+            created = Event.objects.count()
+            for size in sizes:
+                # Créneaux d'un quart d'heure à partir de maintenant
+                Event.objects.bulk_create(
+                    [Event(eventName=f"Épreuve {i}", eventSlug=f"epreuve-{i}", eventPlace="Stade",
+                           eventDateHour=start + datetime.timedelta(minutes=15 * i)) for i in range(created, size)],
+                    batch_size=5000)
+                created = max(created, size)
+
+                page_size = 24
+                last = Event.objects.only(*CARD_FIELDS).order_by("-eventDateHour", "-pk")[page_size]
+                cursor = encode_cursor(last)
+                first_page = self.timed(repeat, lambda: event_page(size=page_size))
+                last_page = self.timed(repeat, lambda: event_page(cursor, size=page_size))
+                offset_page = self.timed(repeat, lambda: list(
+                    Event.objects.only(*CARD_FIELDS).order_by("eventDateHour", "pk")[created - page_size:created]))
+                self.stdout.write(f"{created:>12}{first_page:>20.2f}{last_page:>18.2f}{offset_page:>17.2f}")
+            transaction.set_rollback(True)
@@ -0,0 +1,56 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from event_mgmt.function.search import naive_search, rebuild_search_index, search_available, search_events
+from event_mgmt.models import Event
+
+SPORTS = ["Athlétisme", "Natation", "Escrime", "Épée", "Aviron", "Cyclisme sur piste", "Judo", "Tir à l'arc",
+          "Équitation", "Gymnastique", "Haltérophilie", "Pentathlon moderne", "Canoë-kayak", "Voile", "Basketball"]
+ROUNDS = ["Qualifications", "Séries", "Quart de finale", "Demi-finale", "Finale", "Match pour la médaille de bronze"]
+PLACES = ["Stade de France", "Grand Palais", "Château de Versailles", "Arena Paris Sud", "Marina de Marseille",
+          "Vélodrome de Saint-Quentin-en-Yvelines", "Stade Pierre-Mauroy", "Centre aquatique olympique",
+          "Parc des Princes", "Stade de Châteauroux"]
+QUERIES = ["natation", "epee finale", "chateau versailles", "demi finale judo", "marseille voile", "stade",
+           "pentathlon chateauroux"]
+
+
+class Command(BaseCommand):
+    help = ("Compare la recherche plein texte (FTS5) et le filtrage icontains sur un catalogue synthétique. "
+            "Les événements créés sont annulés à la fin.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=50000, help="Nombre d'événements générés.")
+        parser.add_argument("--repeat", type=int, default=10, help="Nombre de mesures par recherche.")
+
+    def timed(self, repeat, search):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            results = search()
+        return (time.perf_counter() - started) / repeat * 1000, results
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("La recherche plein texte (FTS5) n'est disponible qu'avec SQLite.")
+        rng = random.Random(2024)
+        with transaction.atomic():
+            Event.objects.bulk_create(
+                [Event(eventName=f"{rng.choice(SPORTS)} - {rng.choice(ROUNDS)}", eventSlug=f"epreuve-{i}",
+                       eventPlace=rng.choice(PLACES),
+                       eventDescription=f"Session {i} : {rng.choice(ROUNDS).lower()} de {rng.choice(SPORTS).lower()}.")
+                 for i in range(options["events"])], batch_size=5000)
+            started = time.perf_counter()
+            indexed = rebuild_search_index()
+            self.stdout.write(f"{indexed} événement(s) indexé(s) en {time.perf_counter() - started:.1f} s.")
+
+            self.stdout.write(f"{'Recherche':<22}{'FTS5 (ms)':>11}{'Résultats':>11}{'icontains (ms)':>16}"
+                              f"{'Résultats':>11}")
+            for query in QUERIES:
+                fts_time, _ = self.timed(options["repeat"], lambda: search_events(query, limit=50))
+                fts_total = len(search_events(query, limit=options["events"]))
+                naive_time, _ = self.timed(options["repeat"], lambda: list(naive_search(query)[:50]))
+                naive_total = naive_search(query).count()
+                self.stdout.write(f"{query:<22}{fts_time:>11.2f}{fts_total:>11}{naive_time:>16.2f}{naive_total:>11}")
+            transaction.set_rollback(True)
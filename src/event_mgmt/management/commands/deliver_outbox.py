@@ -0,0 +1,37 @@
+import signal
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from event_mgmt.function.outbox import deliver_outbox, outbox_stats
+
+
+class Command(BaseCommand):
+    help = ("Envoie les emails en file d'attente par lots, sur une seule connexion SMTP tant que la file "
+            "n'est pas vide. Plusieurs instances peuvent tourner en parallèle.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Nombre d'emails pris en charge par lot.")
+        parser.add_argument("--poll", type=float, default=2.0,
+                            help="Attente (secondes) lorsque la file est vide.")
+        parser.add_argument("--once", action="store_true", help="Vide la file une fois puis s'arrête.")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            sent = deliver_outbox(batch_size=options["batch_size"])
+            self.stdout.write(f"{sent} email(s) envoyé(s). File : {outbox_stats()}")
+            return
+
+        terminated = []
+        signal.signal(signal.SIGTERM, lambda *_: terminated.append(True))
+        connection = get_connection()
+        try:
+            while not terminated:
+                # La connexion reste ouverte pendant que la file se vide, puis est fermée en attendant la suite
+                # (les serveurs SMTP coupent les connexions inactives)
+                if not deliver_outbox(connection, batch_size=options["batch_size"]):
+                    time.sleep(options["poll"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Arrêt. File : {outbox_stats()}")
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from event_mgmt.models import ProcessedStripeEvent
+
+
+class Command(BaseCommand):
+    help = "Supprime les identifiants d'événements Stripe traités plus anciens que la durée de conservation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.STRIPE_EVENT_RETENTION_DAYS,
+                            help="Durée de conservation en jours (STRIPE_EVENT_RETENTION_DAYS par défaut).")
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - timedelta(days=options["days"])
+        deleted, _ = ProcessedStripeEvent.objects.filter(received_at__lt=limit).delete()
+        self.stdout.write(f"{deleted} événement(s) Stripe supprimé(s).")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from event_mgmt.function.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des événements (après un import en masse)."
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("La recherche plein texte (FTS5) n'est disponible qu'avec SQLite.")
+        self.stdout.write(f"{rebuild_search_index()} événement(s) indexé(s).")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from event_mgmt.function.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Remet en vente les places bloquées par des sessions de paiement expirées."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", type=int, default=0, metavar="SECONDS",
+                            help="Tourne en tâche de fond en relançant le nettoyage toutes les SECONDS secondes.")
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds()
+            self.stdout.write(f"{released} blocage(s) expiré(s) libéré(s).")
+            if not options["loop"]:
+                return
+            time.sleep(options["loop"])
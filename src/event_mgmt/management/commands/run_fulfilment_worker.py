@@ -0,0 +1,60 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from event_mgmt.function.jobs import queue_stats, run_pending_jobs
+
+
+def work(poll_interval, stop):
+    # Ctrl+C est géré par le processus parent, qui demande l'arrêt une fois la tâche en cours terminée
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Chaque processus ouvre sa propre connexion à la base (jamais partagée après un fork)
+    connections.close_all()
+    while not stop.is_set():
+        if not run_pending_jobs():
+            stop.wait(poll_interval)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Traite en tâche de fond les commandes payées (création des billets, emails) mises en file par le webhook."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=multiprocessing.cpu_count(),
+                            help="Nombre de processus worker (par défaut : nombre de CPU).")
+        parser.add_argument("--poll", type=float, default=1.0,
+                            help="Attente (secondes) lorsque la file est vide.")
+        parser.add_argument("--once", action="store_true",
+                            help="Traite les tâches prêtes dans ce processus puis s'arrête.")
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            processed = run_pending_jobs()
+            self.stdout.write(f"{processed} tâche(s) traitée(s). File : {queue_stats()}")
+            return
+
+        # Les connexions du parent ne doivent pas être héritées par les processus enfants
+        connections.close_all()
+        stop = multiprocessing.Event()
+        workers = [multiprocessing.Process(target=work, args=(options["poll"], stop), daemon=True)
+                   for _ in range(max(1, options["concurrency"]))]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} worker(s) démarré(s).")
+
+        # Arrêt propre : chaque worker termine la tâche en cours avant de quitter. Le gestionnaire de signal
+        # se contente de lever un drapeau (pas de verrou multiprocessing dans un gestionnaire de signal)
+        terminated = []
+        signal.signal(signal.SIGTERM, lambda *_: terminated.append(True))
+        try:
+            while not terminated and any(worker.is_alive() for worker in workers):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write("Workers arrêtés.")
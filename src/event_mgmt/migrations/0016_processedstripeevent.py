@@ -0,0 +1,22 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0015_fulfilmentjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedStripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True)),
+                ('type', models.CharField(max_length=64)),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Offres jusqu'ici codées en dur (formulaire du panier, rapports de ventes)
+DEFAULT_OFFERS = [(1, "Solo", 50), (2, "Duo", 80), (4, "Familiale", 150)]
+
+
+def create_default_offers(apps, schema_editor):
+    Offer = apps.get_model('event_mgmt', 'Offer')
+    Offer.objects.bulk_create([Offer(seats=seats, label=label, price=price) for seats, label, price in DEFAULT_OFFERS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0017_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Offer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.IntegerField()),
+                ('label', models.CharField(max_length=64)),
+                ('price', models.IntegerField()),
+                ('stripe_price_id', models.CharField(blank=True, max_length=90)),
+                ('event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='event_mgmt.event')),
+            ],
+            options={
+                'ordering': ['seats'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='offer',
+            constraint=models.UniqueConstraint(fields=('event', 'seats'), name='offer_event_seats_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='offer',
+            constraint=models.UniqueConstraint(condition=models.Q(('event__isnull', True)), fields=('seats',), name='offer_default_seats_uniq'),
+        ),
+        migrations.RunPython(create_default_offers, migrations.RunPython.noop),
+    ]
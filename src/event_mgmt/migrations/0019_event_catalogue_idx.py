@@ -0,0 +1,17 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0018_offer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['eventDateHour', 'id'], name='event_catalogue_idx'),
+        ),
+    ]
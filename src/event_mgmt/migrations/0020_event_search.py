@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+# Index plein texte des événements (SQLite FTS5), sans accents ni casse pour les noms français
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS event_mgmt_event_fts "
+        "USING fts5(eventName, eventPlace, eventDescription, tokenize='unicode61 remove_diacritics 2')")
+    schema_editor.execute(
+        "INSERT INTO event_mgmt_event_fts (rowid, eventName, eventPlace, eventDescription) "
+        "SELECT id, eventName, eventPlace, eventDescription FROM event_mgmt_event")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS event_mgmt_event_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0019_event_catalogue_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:16
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def compute_facets(apps, schema_editor):
+    # Compteurs initiaux des filtres du catalogue (lieu, jour, disponibilité)
+    Event = apps.get_model('event_mgmt', 'Event')
+    EventFacet = apps.get_model('event_mgmt', 'EventFacet')
+    counts = Counter()
+    for place, date, seats in Event.objects.values_list('eventPlace', 'eventDateHour', 'eventSeatAvailable'):
+        if place:
+            counts[('lieu', place)] += 1
+        if date:
+            counts[('jour', timezone.localdate(date).isoformat())] += 1
+        counts[('dispo', 'disponible' if seats is None or seats > 0 else 'complet')] += 1
+    EventFacet.objects.bulk_create([EventFacet(facet=facet, value=value, count=count)
+                                    for (facet, value), count in counts.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0020_event_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('lieu', 'Lieu'), ('jour', 'Jour'), ('dispo', 'Disponibilité')], max_length=16)),
+                ('value', models.CharField(max_length=128)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['eventPlace', 'eventDateHour', 'id'], name='event_place_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['eventSeatAvailable'], name='event_seats_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventfacet',
+            constraint=models.UniqueConstraint(fields=('facet', 'value'), name='eventfacet_facet_value_uniq'),
+        ),
+        migrations.RunPython(compute_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0021_event_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='version',
+            field=models.IntegerField(default=1, editable=False),
+        ),
+    ]
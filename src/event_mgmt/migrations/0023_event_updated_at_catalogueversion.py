@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-18 18:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_catalogue_version(apps, schema_editor):
+    CatalogueVersion = apps.get_model('event_mgmt', 'CatalogueVersion')
+    CatalogueVersion.objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0022_event_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_catalogue_version, migrations.RunPython.noop),
+    ]
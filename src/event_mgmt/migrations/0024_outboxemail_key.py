@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0023_event_updated_at_catalogueversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='key',
+            field=models.CharField(blank=True, max_length=128, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.3 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+def create_offer_catalogue_version(apps, schema_editor):
+    OfferCatalogueVersion = apps.get_model('event_mgmt', 'OfferCatalogueVersion')
+    OfferCatalogueVersion.objects.create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_mgmt', '0024_outboxemail_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferCatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_offer_catalogue_version, migrations.RunPython.noop),
+    ]
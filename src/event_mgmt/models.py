@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.templatetags.static import static
 from django.urls import reverse
 from django.utils import timezone
@@ -24,6 +26,19 @@ class Event(models.Model):
     eventDescription = models.TextField(blank=True)
     # Permet de faire le lien entre nos événements et ceux enregistrés sur Stripe
     stripe_id = models.CharField(max_length=90, blank=True)
+    # Incrémentée à chaque enregistrement et à chaque vente de places : clé des fragments HTML mis en cache
+    version = models.IntegerField(default=1, editable=False)
+    # Date de la dernière modification (enregistrement ou vente de places) : validateur des pages de l'événement
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Index de la pagination par curseur du catalogue (tri par date puis identifiant)
+            models.Index(fields=["eventDateHour", "id"], name="event_catalogue_idx"),
+            # Filtres du catalogue : pages d'un lieu dans le même ordre, événements complets
+            models.Index(fields=["eventPlace", "eventDateHour", "id"], name="event_place_idx"),
+            models.Index(fields=["eventSeatAvailable"], name="event_seats_idx"),
+        ]
 
     # Permet de modifier l'affichage dans interface Admin Django ( "Event object (x)" par défaut)
     def __str__(self):
@@ -35,11 +50,144 @@ class Event(models.Model):
     # Rempli automatiquement le champ eventSlug
     def save(self, *args, **kwargs):
         self.eventSlug = self.eventSlug or slugify(self.eventName)
+        # Nouvelle version : les fragments mis en cache pour la précédente ne sont plus utilisés. Incrémentée
+        # par la base dans la même mise à jour (une vente a pu l'incrémenter depuis le chargement de l'instance)
+        bumped = not self._state.adding
+        if bumped:
+            self.version = models.F("version") + 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "version", "updated_at"}
         super().save(*args, **kwargs)
+        if bumped:
+            self.refresh_from_db(fields=["version"])
 
     def eventpic_url(self):
         return self.eventPic.url if self.eventPic else static("picture/default_event.jpg")
 
+    # Places réellement proposées à la vente : jauge moins les places bloquées par un paiement en cours
+    def seats_left(self):
+        if self.eventSeatAvailable is None:
+            return None
+        return self.eventSeatAvailable - SeatHold.held_seats([self.pk]).get(self.pk, 0)
+
+
+class CatalogueVersion(models.Model):
+    # Ligne unique (créée par la migration) : version du catalogue, incrémentée à chaque modification visible dans
+    # la liste des événements (événement enregistré ou supprimé, événement devenu complet). Validateur des pages
+    # du catalogue : un visiteur qui revient ne recharge la page que si elle a changé
+    SINGLETON = 1
+
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Catalogue v{self.version}"
+
+
+class EventFacet(models.Model):
+    PLACE = "lieu"
+    DAY = "jour"
+    AVAILABILITY = "dispo"
+    FACET_CHOICES = [(PLACE, "Lieu"), (DAY, "Jour"), (AVAILABILITY, "Disponibilité")]
+    AVAILABLE = "disponible"
+    SOLD_OUT = "complet"
+
+    # Nombre d'événements par valeur de filtre du catalogue (lieu, jour, disponibilité), tenu à jour à
+    # l'enregistrement des événements et à la vente de places : le catalogue lit ces quelques lignes
+    # au lieu de regrouper tous les événements à chaque affichage
+    facet = models.CharField(max_length=16, choices=FACET_CHOICES)
+    value = models.CharField(max_length=128)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["facet", "value"], name="eventfacet_facet_value_uniq")]
+
+    def __str__(self):
+        return f"{self.get_facet_display()} : {self.value} ({self.count})"
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # Index de recherche et suggestions mis à jour si un champ indexé a pu changer (pas pour un simple
+    # changement de jauge). Les suggestions, en mémoire, ne suivent que les modifications validées
+    from event_mgmt.function.autocomplete import autocomplete_index
+    from event_mgmt.function.conditional import touch_catalogue
+    from event_mgmt.function.facets import FACET_FIELDS, refresh_facets
+    from event_mgmt.function.fragments import delete_fragments
+    from event_mgmt.function.search import SEARCH_FIELDS, index_events
+    if update_fields is None or set(update_fields) & set(SEARCH_FIELDS + ("eventDateHour",)):
+        index_events([instance])
+        transaction.on_commit(lambda: autocomplete_index.update_event(instance))
+    # Compteurs des filtres du catalogue recalculés si le lieu, la date ou la jauge ont pu changer
+    if update_fields is None or set(update_fields) & set(FACET_FIELDS):
+        refresh_facets()
+    # Nouvel événement : aucun fragment d'un ancien événement de même identifiant (base restaurée,
+    # séquence réinitialisée) ne doit être repris pour sa première version
+    if created:
+        delete_fragments(instance)
+    touch_catalogue()
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    from event_mgmt.function.autocomplete import autocomplete_index
+    from event_mgmt.function.conditional import touch_catalogue
+    from event_mgmt.function.facets import refresh_facets
+    from event_mgmt.function.fragments import delete_fragments
+    from event_mgmt.function.search import unindex_events
+    unindex_events([instance.pk])
+    refresh_facets()
+    delete_fragments(instance)
+    touch_catalogue()
+    event_id = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove_event(event_id))
+
+
+class Offer(models.Model):
+    # Offre du catalogue. Sans événement : offre proposée par défaut pour tous les événements ;
+    # avec un événement : libellé, prix ou prix Stripe propres à cet événement (remplace l'offre par défaut)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, blank=True, null=True, related_name="offers")
+    # Nombre de places de l'offre (valeur enregistrée dans Order.quantity et Eticket.offer)
+    seats = models.IntegerField()
+    label = models.CharField(max_length=64)
+    # Prix en euros
+    price = models.IntegerField()
+    # Identifiant du prix Stripe de l'offre (price_...). Vide : prix à la place de l'événement (Event.stripe_id)
+    stripe_price_id = models.CharField(max_length=90, blank=True)
+
+    class Meta:
+        ordering = ["seats"]
+        constraints = [
+            models.UniqueConstraint(fields=["event", "seats"], name="offer_event_seats_uniq"),
+            # NULL n'est jamais égal à NULL : l'unicité des offres par défaut demande sa propre contrainte
+            models.UniqueConstraint(fields=["seats"], condition=models.Q(event__isnull=True),
+                                    name="offer_default_seats_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.event or 'Par défaut'} - {self.label} ({self.price} €)"
+
+
+class OfferCatalogueVersion(models.Model):
+    # Ligne unique (créée par la migration) : version du catalogue des offres, incrémentée dans la transaction qui
+    # modifie une offre. Lue en base par chaque processus (serveur web, worker) pour recharger sa copie locale
+    SINGLETON = 1
+
+    version = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"Offres v{self.version}"
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def offer_changed(sender, **kwargs):
+    # Nouvelle version du catalogue pour tous les processus ; celui-ci relit la sienne une fois la modification
+    # validée
+    from event_mgmt.function.offers import bump_catalogue_version, forget_catalogue_version
+    bump_catalogue_version()
+    transaction.on_commit(forget_catalogue_version)
+
 
 class Order(models.Model):
     # Relation "plusieurs à un" (plusieurs produits reliés à un utilisateur)
@@ -64,23 +212,119 @@ class Cart(models.Model):
         return self.user.email
 
     def order_ok(self):
-        for order in self.orders.all():
-            order.ordered = True
-            order.ordered_date = timezone.now()
-            order.save()
+        # Une seule requête pour valider toutes les commandes du panier
+        self.orders.update(ordered=True, ordered_date=timezone.now())
 
         self.orders.clear()
         self.delete()
 
     def delete(self, *args, **kwargs):
-        orders = self.orders.all()
-
-        for order in orders:
-            order.delete()
+        # Suppression ensembliste des commandes encore présentes dans le panier
+        Order.objects.filter(cart=self).delete()
         super().delete(*args, **kwargs)
 
 
+class SeatHold(models.Model):
+    ACTIVE = "active"
+    CONVERTED = "converted"
+    RELEASED = "released"
+    STATUS_CHOICES = [(ACTIVE, "Active"), (CONVERTED, "Convertie"), (RELEASED, "Libérée")]
+
+    # Places bloquées pour un événement pendant la durée d'une session de paiement Stripe
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="holds")
+    user = models.ForeignKey(AUTH_USER_MODEL, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    # Identifiant de la session Stripe Checkout (permet de convertir ou libérer le blocage depuis le webhook)
+    checkout_session_id = models.CharField(max_length=255, db_index=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Index couvrant le calcul des places bloquées (événement, blocages actifs non expirés)
+        indexes = [models.Index(fields=["event", "status", "expires_at"], name="seathold_active_idx")]
+
+    def __str__(self):
+        return f"{self.event.eventName} ({self.quantity}) - {self.status}"
+
+    @classmethod
+    def held_seats(cls, event_ids):
+        # Une seule requête groupée : {event_id: places bloquées}. Un blocage expiré ne compte plus,
+        # même si le nettoyage n'est pas encore passé
+        rows = (cls.objects.filter(event_id__in=event_ids, status=cls.ACTIVE, expires_at__gt=timezone.now())
+                .values("event_id").annotate(total=models.Sum("quantity")))
+        return {row["event_id"]: row["total"] for row in rows}
+
+
+class FulfilmentJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+    STATUS_CHOICES = [(PENDING, "En attente"), (RUNNING, "En cours"), (DONE, "Terminée"), (DEAD, "En échec")]
+
+    # Type de tâche (ex : "checkout.session.completed"), associé à une fonction dans event_mgmt.function.jobs
+    kind = models.CharField(max_length=64)
+    # Données nécessaires à la tâche (ex : objet session Stripe reçu par le webhook)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # Date à partir de laquelle la tâche peut être (re)tentée (délai croissant après chaque échec)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Date de prise en charge par un worker (permet de reprendre une tâche dont le worker a planté)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Index utilisé par les workers pour trouver la prochaine tâche à exécuter
+        indexes = [models.Index(fields=["status", "run_after"], name="fulfilmentjob_queue_idx")]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class OutboxEmail(models.Model):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUS_CHOICES = [(PENDING, "En attente"), (SENDING, "En cours d'envoi"), (SENT, "Envoyé"), (DEAD, "En échec")]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    # Expéditeur vide : DEFAULT_FROM_EMAIL
+    from_email = models.CharField(max_length=255, blank=True)
+    # Liste des destinataires
+    to = models.JSONField(default=list)
+    # Chemins des fichiers joints (ex : QR Code du billet), lus au moment de l'envoi
+    attachments = models.JSONField(default=list, blank=True)
+    # Clé d'unicité facultative (ex : "eticket:42") : une tâche rejouée ne remet pas le même email en file
+    key = models.CharField(max_length=128, unique=True, blank=True, null=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    # Date à partir de laquelle l'envoi peut être (re)tenté (délai croissant après chaque échec)
+    run_after = models.DateTimeField(default=timezone.now)
+    # Date de prise en charge par un worker (permet de reprendre un envoi dont le worker a planté)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        # Index utilisé par les workers pour trouver les prochains emails à envoyer
+        indexes = [models.Index(fields=["status", "run_after"], name="outboxemail_queue_idx")]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
 
 
+class ProcessedStripeEvent(models.Model):
+    # Identifiant de l'événement Stripe (evt_...) : la contrainte d'unicité empêche tout double traitement
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=64)
+    # Indexé pour la purge régulière des anciens événements (manage.py prune_stripe_events)
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    def __str__(self):
+        return f"{self.event_id} ({self.type})"
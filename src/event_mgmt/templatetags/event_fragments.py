@@ -0,0 +1,30 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from event_mgmt.function.fragments import cached_fragment
+
+register = template.Library()
+
+
+class EventFragmentNode(template.Node):
+    def __init__(self, nodelist, kind, event):
+        self.nodelist = nodelist
+        self.kind = kind
+        self.event = event
+
+    def render(self, context):
+        event = self.event.resolve(context)
+        html = cached_fragment(self.kind.resolve(context), event, lambda: self.nodelist.render(context))
+        return mark_safe(html)
+
+
+@register.tag
+def event_fragment(parser, token):
+    # {% event_fragment "carte" event %} ... {% endevent_fragment %} : contenu identique pour tous les visiteurs,
+    # mis en cache selon la version de l'événement (les parties propres à l'utilisateur restent en dehors)
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name and an event.")
+    nodelist = parser.parse(("endevent_fragment",))
+    parser.delete_first_token()
+    return EventFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -0,0 +1,428 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from eticketing.models import Eticket
+from event_mgmt.function.inventory import InsufficientSeats, decrement_seats, get_contention_metrics, \
+    reset_contention_metrics, hold_seats, convert_holds, release_holds
+from event_mgmt.function.jobs import enqueue, run_pending_jobs
+from event_mgmt.forms import OrderForm
+from event_mgmt.function.autocomplete import autocomplete_index
+from event_mgmt.function.catalogue import decode_cursor, event_page
+from event_mgmt.function.facets import facet_groups
+from event_mgmt.function.offers import bump_catalogue_version, current_offer_price, offer_label, offer_price, \
+    reset_catalogue, stripe_line_item, with_offer_price
+from event_mgmt.function.search import rebuild_search_index, search_events
+from event_mgmt.function.outbox import deliver_outbox, outbox_stats, queue_email
+from event_mgmt.models import Event, SeatHold, Cart, Order, FulfilmentJob, ProcessedStripeEvent, \
+    OutboxEmail, Offer, EventFacet
+
+
+class InventoryTest(TestCase):
+    def setUp(self):
+        reset_contention_metrics()
+        self.event1 = Event.objects.create(eventName="Aviron", eventSeatAvailable=10)
+        self.event2 = Event.objects.create(eventName="Judo", eventSeatAvailable=3)
+
+    def test_decrement_seats(self):
+        decrement_seats({self.event1.pk: 4, self.event2.pk: 3})
+
+        self.event1.refresh_from_db()
+        self.event2.refresh_from_db()
+        self.assertEqual(self.event1.eventSeatAvailable, 6)
+        self.assertEqual(self.event2.eventSeatAvailable, 0)
+
+    def test_decrement_seats_rejected_when_not_enough_seats(self):
+        with self.assertRaises(InsufficientSeats):
+            decrement_seats({self.event1.pk: 4, self.event2.pk: 4})
+
+        # Aucune déduction ne doit subsister, y compris pour l'événement qui avait assez de places
+        self.event1.refresh_from_db()
+        self.event2.refresh_from_db()
+        self.assertEqual(self.event1.eventSeatAvailable, 10)
+        self.assertEqual(self.event2.eventSeatAvailable, 3)
+
+    def test_event_without_capacity_is_not_limited(self):
+        event = Event.objects.create(eventName="Breaking")
+        decrement_seats({event.pk: 4})
+        event.refresh_from_db()
+        self.assertIsNone(event.eventSeatAvailable)
+
+    def test_contention_metrics(self):
+        decrement_seats({self.event2.pk: 2})
+        with self.assertRaises(InsufficientSeats):
+            decrement_seats({self.event2.pk: 2})
+
+        metrics = get_contention_metrics()[self.event2.pk]
+        self.assertEqual(metrics["attempts"], 2)
+        self.assertEqual(metrics["decremented"], 1)
+        self.assertEqual(metrics["rejected"], 1)
+
+
+class SeatHoldTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="user@example.com", password="password")
+        self.other_user = CustomUser.objects.create_user(email="other@example.com", password="password")
+        self.event = Event.objects.create(eventName="Aviron", eventSeatAvailable=5)
+        self.expires_at = timezone.now() + timedelta(minutes=30)
+
+    def test_hold_reduces_seats_left(self):
+        hold_seats(self.user, {self.event.pk: 4}, "cs_1", self.expires_at)
+
+        self.assertEqual(self.event.seats_left(), 1)
+        # La jauge n'est déduite qu'au paiement
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.eventSeatAvailable, 5)
+
+    def test_hold_rejected_when_seats_already_held(self):
+        hold_seats(self.user, {self.event.pk: 4}, "cs_1", self.expires_at)
+
+        with self.assertRaises(InsufficientSeats):
+            hold_seats(self.other_user, {self.event.pk: 2}, "cs_2", self.expires_at)
+        self.assertFalse(SeatHold.objects.filter(checkout_session_id="cs_2").exists())
+
+    def test_new_checkout_replaces_previous_hold(self):
+        hold_seats(self.user, {self.event.pk: 4}, "cs_1", self.expires_at)
+        hold_seats(self.user, {self.event.pk: 4}, "cs_2", self.expires_at)
+
+        self.assertEqual(self.event.seats_left(), 1)
+        self.assertEqual(SeatHold.objects.get(checkout_session_id="cs_1").status, SeatHold.RELEASED)
+
+    def test_convert_and_release_holds(self):
+        hold_seats(self.user, {self.event.pk: 2}, "cs_1", self.expires_at)
+        hold_seats(self.other_user, {self.event.pk: 2}, "cs_2", self.expires_at)
+
+        self.assertEqual(convert_holds("cs_1"), 1)
+        self.assertEqual(release_holds("cs_2"), 1)
+        self.assertEqual(self.event.seats_left(), 5)
+
+    def test_expired_holds_are_released_by_command(self):
+        hold_seats(self.user, {self.event.pk: 4}, "cs_1", timezone.now() - timedelta(minutes=1))
+
+        # Un blocage expiré ne compte déjà plus dans les places restantes
+        self.assertEqual(self.event.seats_left(), 5)
+        call_command("release_expired_holds", stdout=StringIO())
+        self.assertEqual(SeatHold.objects.get().status, SeatHold.RELEASED)
+
+
+@override_settings(FULFILMENT_MAX_ATTEMPTS=2, FULFILMENT_RETRY_BACKOFF=0)
+class FulfilmentJobTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="user@example.com", password="password")
+        self.event = Event.objects.create(eventName="Aviron", eventSeatAvailable=10)
+        cart = Cart.objects.create(user=self.user)
+        cart.orders.add(Order.objects.create(user=self.user, event=self.event, quantity=2))
+        self.session = {"id": "cs_1", "customer": "cus_1", "customer_details": {"email": "user@example.com"}}
+
+    def test_job_completes_order(self):
+        job = enqueue("checkout.session.completed", self.session)
+
+        # Finalisation du panier, puis tâche de génération des QR Codes et d'envoi des billets
+        self.assertEqual(run_pending_jobs(), 2)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfilmentJob.DONE)
+        eticket = Eticket.objects.get(user=self.user)
+        self.assertEqual(eticket.qr_status, Eticket.QR_READY)
+        self.assertEqual(deliver_outbox(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failing_job_is_retried_then_dead(self):
+        self.session["customer_details"]["email"] = "unknown@example.com"
+        job = enqueue("checkout.session.completed", self.session)
+
+        run_pending_jobs(limit=1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfilmentJob.PENDING)
+        self.assertIn("DoesNotExist", job.last_error)
+
+        run_pending_jobs(limit=1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfilmentJob.DEAD)
+        self.assertEqual(job.attempts, 2)
+
+    def test_paid_session_for_sold_out_event_is_dead(self):
+        Event.objects.filter(pk=self.event.pk).update(eventSeatAvailable=1)
+        job = enqueue("checkout.session.completed", self.session)
+
+        run_pending_jobs(limit=1)
+        run_pending_jobs(limit=1)
+
+        # Client débité sans billet : tâche mise de côté pour remboursement, pas terminée
+        job.refresh_from_db()
+        self.assertEqual(job.status, FulfilmentJob.DEAD)
+        self.assertIn("InsufficientSeats", job.last_error)
+        self.assertFalse(Eticket.objects.exists())
+
+
+class PruneStripeEventsTest(TestCase):
+    def test_old_events_are_pruned(self):
+        old_event = ProcessedStripeEvent.objects.create(event_id="evt_old", type="checkout.session.completed")
+        ProcessedStripeEvent.objects.filter(pk=old_event.pk).update(received_at=timezone.now() - timedelta(days=40))
+        ProcessedStripeEvent.objects.create(event_id="evt_new", type="checkout.session.completed")
+
+        call_command("prune_stripe_events", days=30, stdout=StringIO())
+
+        self.assertEqual(list(ProcessedStripeEvent.objects.values_list("event_id", flat=True)), ["evt_new"])
+
+
+class CountingEmailBackend(EmailBackend):
+    # Serveur SMTP de test : compte les connexions ouvertes et refuse les destinataires "@down.example.com"
+    opened = 0
+
+    def open(self):
+        if not getattr(self, "is_open", False):
+            CountingEmailBackend.opened += 1
+            self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, messages):
+        if any(address.endswith("@down.example.com") for message in messages for address in message.to):
+            raise ConnectionResetError("SMTP connection lost")
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND="event_mgmt.tests.test_function.CountingEmailBackend", OUTBOX_MAX_ATTEMPTS=2,
+                   OUTBOX_RETRY_BACKOFF=0, OUTBOX_BATCH_SIZE=4)
+class OutboxTest(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+
+    def test_queue_is_drained_over_one_connection(self):
+        for i in range(10):
+            queue_email("Billet", "Votre billet", [f"user{i}@example.com"])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_outbox(), 10)
+
+        self.assertEqual(len(mail.outbox), 10)
+        # 3 lots de 4 emails maximum, une seule connexion
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(outbox_stats()[OutboxEmail.SENT], 10)
+
+    def test_failed_email_is_retried_then_dead(self):
+        failing = queue_email("Billet", "Votre billet", ["user@down.example.com"])
+        queue_email("Billet", "Votre billet", ["user@example.com"])
+
+        self.assertEqual(deliver_outbox(), 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, OutboxEmail.DEAD)
+        self.assertEqual(failing.attempts, 2)
+        self.assertIn("ConnectionResetError", failing.last_error)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class OfferCatalogueTest(TestCase):
+    def setUp(self):
+        reset_catalogue()
+        self.user = CustomUser.objects.create(email='user@example.com', password='password123')
+        self.event = Event.objects.create(eventName="Aviron", stripe_id="price_place")
+        self.other = Event.objects.create(eventName="Voile")
+        # Tarif propre à l'événement : nouvelle version du catalogue, relue par ce processus à la validation
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.create(event=self.event, seats=2, label="Duo Premium", price=120, stripe_price_id="price_duo")
+
+    def tearDown(self):
+        # Les offres et la version sont annulées par le rollback : la copie locale ne doit pas les garder
+        reset_catalogue()
+
+    def test_catalogue_is_cached_per_process(self):
+        offer_price(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(offer_price(2, self.event.pk), 120)
+            self.assertEqual(offer_label(2, self.event.pk), "Duo Premium")
+            self.assertEqual(offer_price(2, self.other.pk), 80)
+            self.assertEqual(offer_label(4, self.event.pk), "Familiale")
+            self.assertEqual(offer_price(3), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.filter(event__isnull=True, seats=4).get().delete()
+        self.assertEqual(offer_price(4), 0)
+
+    @override_settings(OFFER_CATALOGUE_CHECK_INTERVAL=0)
+    def test_version_is_shared_through_the_database(self):
+        self.assertEqual(offer_price(1), 50)
+        # Modification faite par un autre processus : seule la version en base change pour celui-ci
+        Offer.objects.filter(event__isnull=True, seats=1).update(price=55)
+        bump_catalogue_version()
+        self.assertEqual(offer_price(1), 55)
+
+    def test_current_offer_price_reads_the_database(self):
+        offer_price(1)
+        Offer.objects.filter(event=self.event, seats=2).update(price=130)
+        self.assertEqual(current_offer_price(2, self.event.pk), 130)
+        self.assertEqual(current_offer_price(2, self.other.pk), 80)
+        self.assertEqual(current_offer_price(3), 0)
+
+    def test_revenue_is_computed_in_sql(self):
+        for event, offer in ((self.event, 2), (self.other, 2), (self.event, 4), (self.other, 3)):
+            Eticket.objects.create(user=self.user, event=event, offer=offer)
+
+        with self.assertNumQueries(1):
+            revenue = dict(with_offer_price(Eticket.objects.all()).values_list("pk", "offer_price"))
+        self.assertEqual(sorted(revenue.values()), [0, 80, 120, 150])
+
+    def test_form_choices_and_stripe_line_items(self):
+        duo = Order.objects.create(user=self.user, event=self.event, quantity=2)
+        solo = Order.objects.create(user=self.user, event=self.event, quantity=1)
+
+        self.assertEqual(OrderForm(instance=duo).fields["quantity"].choices,
+                         [(1, "Offre Solo -> 1 place"), (2, "Offre Duo Premium -> 2 places"),
+                          (4, "Offre Familiale -> 4 places")])
+        self.assertEqual(stripe_line_item(duo), {"price": "price_duo", "quantity": 1})
+        self.assertEqual(stripe_line_item(solo), {"price": "price_place", "quantity": 1})
+
+
+class EventCatalogueTest(TestCase):
+    def setUp(self):
+        start = timezone.now().replace(microsecond=0)
+        # Deux événements à la même heure (départagés par id) et deux sans date (en fin de catalogue)
+        hours = [3, 1, 1, None, 2, None]
+        self.events = [Event.objects.create(eventName=f"Épreuve {i}",
+                                            eventDateHour=start + timedelta(hours=hour) if hour else None)
+                       for i, hour in enumerate(hours)]
+
+    def test_pages_follow_date_then_id(self):
+        names, cursor = [], None
+        while True:
+            with self.assertNumQueries(1 if cursor is None else 2):
+                events, cursor = event_page(cursor, size=2) if cursor else event_page(size=2)
+            names += [event.eventName for event in events]
+            if cursor is None:
+                break
+        self.assertEqual(names, ["Épreuve 1", "Épreuve 2", "Épreuve 4", "Épreuve 0", "Épreuve 3", "Épreuve 5"])
+
+    def test_invalid_cursor(self):
+        for cursor in ("abc", "WyJob3JzIiwgMV0"):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class EventSearchTest(TestCase):
+    def setUp(self):
+        self.fencing = Event.objects.create(eventName="Escrime - Épée Finale", eventPlace="Grand Palais")
+        self.versailles = Event.objects.create(eventName="Équitation - Dressage", eventPlace="Château de Versailles",
+                                               eventDescription="Finale par équipes.")
+
+    def names(self, query):
+        return [event.eventName for event in search_events(query)]
+
+    def test_accent_insensitive_prefix_search(self):
+        self.assertEqual(self.names("epee"), ["Escrime - Épée Finale"])
+        self.assertEqual(self.names("chateau versail"), ["Équitation - Dressage"])
+        self.assertEqual(self.names('"OR" NEAR('), [])
+
+    def test_name_ranks_before_description(self):
+        self.assertEqual(self.names("finale"), ["Escrime - Épée Finale", "Équitation - Dressage"])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.fencing.eventName = "Escrime - Sabre"
+        self.fencing.save()
+        self.assertEqual(self.names("epee"), [])
+        self.assertEqual(self.names("sabre"), ["Escrime - Sabre"])
+
+        self.versailles.delete()
+        self.assertEqual(self.names("versailles"), [])
+
+    def test_rebuild_after_bulk_create(self):
+        Event.objects.bulk_create([Event(eventName="Voile - Finale", eventPlace="Marina de Marseille")])
+        self.assertEqual(self.names("marseille"), [])
+
+        self.assertEqual(rebuild_search_index(), 3)
+        self.assertEqual(self.names("marseille"), ["Voile - Finale"])
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        autocomplete_index.clear()
+        now = timezone.now()
+        self.later = Event.objects.create(eventName="Natation - Finale 100 m", eventPlace="Paris La Défense Arena",
+                                          eventDateHour=now + timedelta(days=3))
+        self.sooner = Event.objects.create(eventName="Natation - Séries", eventPlace="Paris La Défense Arena",
+                                           eventDateHour=now + timedelta(days=1))
+        Event.objects.create(eventName="Natation - Passée", eventDateHour=now - timedelta(days=1))
+        self.fencing = Event.objects.create(eventName="Escrime - Épée", eventPlace="Grand Palais")
+
+    def tearDown(self):
+        autocomplete_index.clear()
+
+    def labels(self, query):
+        return [result["label"] for result in autocomplete_index.suggest(query)]
+
+    def test_upcoming_matches_without_queries(self):
+        autocomplete_index.rebuild()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels("nata"), ["Natation - Séries", "Natation - Finale 100 m"])
+            self.assertEqual(self.labels("FINALE 1"), ["Natation - Finale 100 m"])
+            self.assertEqual(self.labels("epee"), ["Escrime - Épée"])
+            self.assertEqual(self.labels("defense"), ["Paris La Défense Arena"])
+            self.assertEqual(self.labels("xyz"), [])
+
+    def test_index_follows_committed_changes(self):
+        autocomplete_index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fencing.eventName = "Escrime - Sabre"
+            self.fencing.save()
+        self.assertEqual(self.labels("epee"), [])
+        self.assertEqual(self.labels("sab"), ["Escrime - Sabre"])
+        self.assertEqual(self.labels("grand"), ["Grand Palais"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fencing.delete()
+        self.assertEqual(self.labels("escrime"), [])
+        # Plus aucun événement dans ce lieu : il n'est plus proposé
+        self.assertEqual(self.labels("grand"), [])
+
+
+class EventFacetTest(TestCase):
+    def setUp(self):
+        day = timezone.make_aware(timezone.datetime(2024, 7, 27, 10))
+        self.swim = Event.objects.create(eventName="Natation", eventPlace="Arena", eventDateHour=day,
+                                         eventSeatAvailable=2)
+        Event.objects.create(eventName="Water-polo", eventPlace="Arena", eventDateHour=day + timedelta(days=1),
+                             eventSeatAvailable=0)
+        Event.objects.create(eventName="Escrime", eventPlace="Grand Palais", eventDateHour=day)
+
+    def counts(self):
+        return {(facet.facet, facet.value): facet.count for facet in EventFacet.objects.filter(count__gt=0)}
+
+    def test_counts_follow_saves_and_sales(self):
+        self.assertEqual(self.counts(), {("lieu", "Arena"): 2, ("lieu", "Grand Palais"): 1,
+                                         ("jour", "2024-07-27"): 2, ("jour", "2024-07-28"): 1,
+                                         ("dispo", "disponible"): 2, ("dispo", "complet"): 1})
+
+        # Dernières places vendues : l'événement passe dans "complet" sans recomptage (et le catalogue change
+        # de version)
+        with self.assertNumQueries(7):
+            decrement_seats({self.swim.pk: 2})
+        self.assertEqual(self.counts()[("dispo", "complet")], 2)
+        self.assertEqual(self.counts()[("dispo", "disponible")], 1)
+
+        self.swim.delete()
+        self.assertEqual(self.counts()[("lieu", "Arena")], 1)
+
+    def test_filtered_pages(self):
+        def names(**filters):
+            return [event.eventName for event in event_page(filters=filters)[0]]
+
+        self.assertEqual(names(lieu="Arena"), ["Natation", "Water-polo"])
+        self.assertEqual(names(jour="2024-07-27"), ["Natation", "Escrime"])
+        self.assertEqual(names(lieu="Arena", dispo="complet"), ["Water-polo"])
+
+    def test_facet_links_keep_other_filters(self):
+        with self.assertNumQueries(1):
+            groups = facet_groups({"lieu": "Arena"})
+        places = groups[0]["values"]
+        self.assertEqual([(facet["label"], facet["count"], facet["active"]) for facet in places],
+                         [("Arena", 2, True), ("Grand Palais", 1, False)])
+        self.assertEqual(places[1]["query"], "lieu=Grand+Palais")
+        self.assertEqual(groups[2]["values"][0]["query"], "lieu=Arena&dispo=complet")
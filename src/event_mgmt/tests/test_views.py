@@ -1,14 +1,25 @@
 import json
+from datetime import timedelta
+from unittest import mock
+
+import stripe
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.forms import modelformset_factory, BaseModelFormSet
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from accounts.models import CustomUser, ShippingAddress
 from eticketing.models import Eticket
 from event_mgmt.forms import OrderForm
-from event_mgmt.models import Event, Cart, Order
+from event_mgmt.function.autocomplete import autocomplete_index
+from event_mgmt.function.fragments import fragment_metrics
+from event_mgmt.function.inventory import decrement_seats
+from event_mgmt.models import Event, Cart, Order, FulfilmentJob, ProcessedStripeEvent, SeatHold
 from event_mgmt.views import complete_order, save_shipping_address
 
 
@@ -44,6 +55,167 @@ class EventTest(TestCase):
         self.assertRedirects(response, f"{reverse("login")}?next={reverse("cart")}", status_code=302)
 
 
+@override_settings(EVENT_CATALOGUE_PAGE_SIZE=2)
+class EventCatalogueViewTest(TestCase):
+    def setUp(self):
+        for i in range(3):
+            Event.objects.create(eventName=f"Épreuve {i}")
+
+    def test_next_page_link(self):
+        response = self.client.get(reverse("index-event-mgmt"))
+        self.assertEqual([event.eventName for event in response.context["events"]], ["Épreuve 0", "Épreuve 1"])
+
+        response = self.client.get(reverse("index-event-mgmt"), {"apres": response.context["next_cursor"]})
+        self.assertEqual([event.eventName for event in response.context["events"]], ["Épreuve 2"])
+        self.assertIsNone(response.context["next_cursor"])
+        self.assertContains(response, "Début")
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("index-event-mgmt"), {"apres": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_filters_are_kept_across_pages(self):
+        for i in range(3):
+            Event.objects.create(eventName=f"Voile {i}", eventPlace="Marseille")
+
+        response = self.client.get(reverse("index-event-mgmt"), {"lieu": "Marseille"})
+        self.assertEqual([event.eventName for event in response.context["events"]], ["Voile 0", "Voile 1"])
+        self.assertContains(response, "Marseille (3)")
+
+        response = self.client.get(f"{reverse('index-event-mgmt')}?{response.context['next_query']}")
+        self.assertEqual([event.eventName for event in response.context["events"]], ["Voile 2"])
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse("index-event-mgmt"), {"jour": "demain"})
+        self.assertEqual(response.status_code, 400)
+
+
+class EventSearchViewTest(TestCase):
+    def test_search_results(self):
+        Event.objects.create(eventName="Escrime - Épée")
+        Event.objects.create(eventName="Natation")
+
+        response = self.client.get(reverse("event-search"), {"q": "epee"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([event.eventName for event in response.context["events"]], ["Escrime - Épée"])
+
+        response = self.client.get(reverse("event-search"), {"q": "aviron"})
+        self.assertContains(response, "Aucun événement ne correspond à votre recherche.")
+
+
+class EventAutocompleteViewTest(TestCase):
+    def tearDown(self):
+        autocomplete_index.clear()
+
+    def test_suggestions_are_cacheable(self):
+        event = Event.objects.create(eventName="Aviron - Finale")
+
+        response = self.client.get(reverse("event-autocomplete"), {"q": "avi"})
+        self.assertEqual(response.json()["results"][0]["url"], event.get_absolute_url())
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age=", response["Cache-Control"])
+
+
+class EventFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_metrics.reset()
+        self.event = Event.objects.create(eventName="Judo - Finale", eventPlace="Arena Champ-de-Mars",
+                                          eventSeatAvailable=10, eventDescription="Finale des +100 kg")
+
+    def test_cards_are_rendered_once_per_version(self):
+        self.client.get(reverse("index-event-mgmt"))
+        self.client.get(reverse("index-event-mgmt"))
+        self.assertEqual(fragment_metrics.snapshot()["carte"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+        self.event.eventPlace = "Paris La Défense Arena"
+        self.event.save()
+        response = self.client.get(reverse("index-event-mgmt"))
+        self.assertContains(response, "Paris La Défense Arena")
+        self.assertEqual(fragment_metrics.snapshot()["carte"]["misses"], 2)
+
+    def test_stale_instance_save_gets_a_new_version(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        decrement_seats({self.event.pk: 1})
+        self.client.get(reverse("index-event-mgmt"))
+
+        # Instance chargée avant la vente : sa version ne doit pas reprendre celle de la vente
+        stale.eventPlace = "Bercy"
+        stale.save()
+        self.assertEqual(stale.version, 3)
+        self.assertContains(self.client.get(reverse("index-event-mgmt")), "Bercy")
+
+    def test_seat_changes_invalidate_detail_fragments(self):
+        url = reverse("event-detail", args=[self.event.eventSlug])
+        self.client.get(url)
+        decrement_seats({self.event.pk: 4})
+        response = self.client.get(url)
+        self.assertContains(response, "6 places disponibles.")
+        self.assertEqual(fragment_metrics.snapshot()["detail-description"], {"hits": 0, "misses": 2, "hit_rate": 0.0})
+
+    def test_cart_count_is_rendered_per_user(self):
+        url = reverse("event-detail", args=[self.event.eventSlug])
+        self.client.get(url)
+        user = CustomUser.objects.create_user(email="visiteur@example.com", password="secret")
+        Order.objects.create(user=user, event=self.event)
+        Cart.objects.create(user=user).orders.set(Order.objects.filter(user=user))
+        self.client.force_login(user)
+
+        response = self.client.get(url)
+        self.assertContains(response, "voir mon panier (1)")
+        self.assertEqual(fragment_metrics.snapshot()["detail-image"]["hits"], 1)
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse("fragment-cache-metrics")).status_code, 302)
+        staff = CustomUser.objects.create_user(email="staff@example.com", password="secret", is_staff=True)
+        self.client.force_login(staff)
+        self.client.get(reverse("index-event-mgmt"))
+        response = self.client.get(reverse("fragment-cache-metrics"))
+        self.assertEqual(response.json()["carte"]["misses"], 1)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(eventName="Voile - Finale", eventPlace="Marseille", eventSeatAvailable=10)
+
+    def test_catalogue_not_modified(self):
+        response = self.client.get(reverse("index-event-mgmt"))
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        # Validateur calculé en une requête, sans rendu
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index-event-mgmt"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(reverse("index-event-mgmt"), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        Event.objects.create(eventName="Voile - Demi-finale", eventPlace="Marseille")
+        response = self.client.get(reverse("index-event-mgmt"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Voile - Demi-finale")
+
+    def test_event_detail_changes_with_seats_and_cart(self):
+        url = reverse("event-detail", args=[self.event.eventSlug])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        decrement_seats({self.event.pk: 1})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "9 places disponibles.")
+        etag = response["ETag"]
+
+        # Même événement, mais menu d'un utilisateur connecté puis panier modifié
+        user = CustomUser.objects.create_user(email="visiteur@example.com", password="secret")
+        self.client.force_login(user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+        Cart.objects.create(user=user).orders.add(Order.objects.create(user=user, event=self.event))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
 class EventMgmtLoggedInTest(TestCase):
     def setUp(self):
         self.user = CustomUser.objects.create_user(
@@ -113,6 +285,8 @@ class EventViewTests(TestCase):
         self.assertTemplateUsed(response, 'event_mgmt/event_detail.html')
         # Vérifier que le contexte contient l'événement correct
         self.assertEqual(response.context['event'], self.event)
+        # Vérifier que les places affichées tiennent compte des places bloquées
+        self.assertEqual(response.context['seats_left'], 100)
 
     def test_event_detail_view_not_found(self):
         # Tester avec un slug qui n'existe pas
@@ -297,6 +471,28 @@ class CartViewTestCase(TestCase):
         order_exists = Order.objects.filter(user=self.user, event=self.event).exists()
         self.assertTrue(order_exists)
 
+    @override_settings(SEAT_HOLD_MINUTES=30)
+    def test_checkout_session_expires_after_stripe_minimum(self):
+        self.client.get(reverse("add-to-cart", kwargs={"slug": self.event.eventSlug}))
+        session = mock.Mock(id="cs_test", url="https://checkout.stripe.com/c/pay/cs_test")
+        with mock.patch("stripe.checkout.Session.create", return_value=session) as create:
+            started = timezone.now()
+            response = self.client.get(reverse("create-checkout-session"))
+
+        self.assertEqual(response["Location"], session.url)
+        # Stripe exige au moins 30 minutes entre la création de la session et son expiration
+        self.assertGreater(create.call_args.kwargs["expires_at"], (started + timedelta(minutes=30)).timestamp())
+        self.assertEqual(SeatHold.objects.get(checkout_session_id="cs_test").status, SeatHold.ACTIVE)
+
+    def test_checkout_stripe_error_redirects_to_cart(self):
+        self.client.get(reverse("add-to-cart", kwargs={"slug": self.event.eventSlug}))
+        with mock.patch("stripe.checkout.Session.create", side_effect=stripe.error.APIConnectionError("hors ligne")):
+            response = self.client.get(reverse("create-checkout-session"))
+
+        self.assertRedirects(response, reverse("cart"), fetch_redirect_response=False)
+        # Les places bloquées sont remises en vente
+        self.assertFalse(SeatHold.objects.filter(status=SeatHold.ACTIVE).exists())
+
 
 class CheckoutSuccessViewTests(TestCase):
 
@@ -349,6 +545,66 @@ class CompleteOrderTestCase(TestCase):
         self.assertFalse(Cart.objects.filter(user=self.user).exists())
 
 
+    def test_complete_order_rejected_when_event_sold_out(self):
+        self.event.eventSeatAvailable = 1
+        self.event.save()
+
+        response = complete_order({'customer': 'stripe_customer_id'}, self.user)
+
+        # La commande est refusée : aucun billet, aucune place déduite et le panier est conservé
+        self.assertEqual(response.status_code, 409)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.eventSeatAvailable, 1)
+        self.assertEqual(Eticket.objects.count(), 0)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+class CompleteOrderQueryCountTest(TestCase):
+    def complete_cart(self, size):
+        user = CustomUser.objects.create(email=f"user{size}@example.com", password="password")
+        cart = Cart.objects.create(user=user)
+        for number in range(size):
+            event = Event.objects.create(eventName=f"Event {size}-{number}", eventSeatAvailable=100)
+            cart.orders.add(Order.objects.create(user=user, event=event, quantity=2))
+        user = CustomUser.objects.get(pk=user.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            complete_order({'customer': 'stripe_customer_id'}, user)
+        self.assertEqual(Eticket.objects.filter(user=user).count(), size)
+        return len(queries)
+
+    def test_complete_order_query_count_does_not_depend_on_cart_size(self):
+        # Finalisation ensembliste : même nombre de requêtes pour 1 ou 10 commandes
+        self.assertEqual(self.complete_cart(1), self.complete_cart(10))
+
+class StripeWebhookTest(TestCase):
+    def setUp(self):
+        self.session = {"id": "cs_1", "customer": "cus_1", "customer_details": {"email": "user@example.com"}}
+
+    def post_event(self, event_id, event_type="checkout.session.completed"):
+        payload = json.dumps({"id": event_id, "type": event_type, "data": {"object": self.session}})
+        with mock.patch("stripe.Webhook.construct_event", return_value=json.loads(payload)):
+            return self.client.post(reverse("stripe-webhook"), data=payload, content_type="application/json",
+                                    HTTP_STRIPE_SIGNATURE="signature")
+
+    def test_completed_session_is_queued(self):
+        response = self.post_event("evt_1")
+
+        # Le webhook répond sans créer de billet : le traitement est mis en file pour le worker
+        self.assertEqual(response.status_code, 200)
+        job = FulfilmentJob.objects.get()
+        self.assertEqual(job.payload, self.session)
+        self.assertEqual(Eticket.objects.count(), 0)
+
+    def test_duplicate_event_is_ignored(self):
+        self.post_event("evt_1")
+        response = self.post_event("evt_1")
+
+        # La seconde livraison du même événement est acquittée sans nouvelle tâche
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FulfilmentJob.objects.count(), 1)
+        self.assertEqual(ProcessedStripeEvent.objects.get().event_id, "evt_1")
+
+
 class ShippingAddressTest(TestCase):
 
     def setUp(self):
@@ -1,29 +1,88 @@
-import stripe
+import json
+import uuid
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
 from django.forms import modelformset_factory
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET
 
 from django.conf import settings
 
 from OGticketing.settings import env
 from accounts.models import CustomUser, ShippingAddress
-from eticketing.function.order_confirmation_email import send_eticket_email
-from eticketing.models import Eticket
+from eticketing.models import Eticket, record_sales
 from event_mgmt.forms import OrderForm
-from event_mgmt.models import Event, Cart, Order
+from event_mgmt.function.autocomplete import autocomplete_index
+from event_mgmt.function.catalogue import event_page
+from event_mgmt.function.conditional import catalogue_etag, catalogue_last_modified, event_detail_etag
+from event_mgmt.function.facets import catalogue_filters, facet_groups
+from event_mgmt.function.fragments import fragment_metrics
+from event_mgmt.function.inventory import InsufficientSeats, convert_holds, decrement_seats, hold_seats, \
+    release_holds, run_atomic, seats_by_event
+from event_mgmt.function.jobs import enqueue
+from event_mgmt.function.offers import stripe_line_item, with_offer_price
+from event_mgmt.function.search import search_events
+from event_mgmt.function.stripe_api import get_stripe
+from event_mgmt.models import Event, Cart, Order, SeatHold, ProcessedStripeEvent
+
+
+# Durée minimale d'une session de paiement Stripe (30 minutes imposées, plus une minute de marge)
+STRIPE_MIN_SESSION_MINUTES = 31
+
+
+# Page qui présente les événements, par pages successives (?apres=<curseur de la page précédente>),
+# filtrables par lieu, jour et disponibilité (?lieu=...&jour=2024-07-27&dispo=disponible).
+# Réponse 304 sans rendu si le catalogue n'a pas changé depuis la dernière visite (ETag / Last-Modified)
+@condition(etag_func=catalogue_etag, last_modified_func=catalogue_last_modified)
+def index_event_mgmt(request):
+    try:
+        filters = catalogue_filters(request.GET)
+        events, next_cursor = event_page(request.GET.get("apres"), filters=filters)
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
 
+    return render(request, 'event_mgmt/index_event_mgmt.html',
+                  context={"events": events, "next_cursor": next_cursor, "is_first_page": "apres" not in request.GET,
+                           "filters_query": urlencode(filters),
+                           "next_query": urlencode({**filters, "apres": next_cursor}) if next_cursor else None,
+                           "facet_groups": facet_groups(filters)})
 
-stripe.api_key = settings.STRIPE_API_KEY
 
+# Recherche d'événements (nom, lieu, description), résultats classés par pertinence : /recherche/?q=natation
+@condition(etag_func=catalogue_etag, last_modified_func=catalogue_last_modified)
+def event_search(request):
+    query = request.GET.get("q", "").strip()
+    events = search_events(query) if query else []
+
+    return render(request, 'event_mgmt/index_event_mgmt.html',
+                  context={"events": events, "query": query, "is_first_page": True})
 
-# Page qui présente tous les événements
-def index_event_mgmt(request):
-    events = Event.objects.all()
 
-    return render(request, 'event_mgmt/index_event_mgmt.html', context={"events": events})
+# Suggestions de la barre de recherche (événements à venir et lieux) lues dans l'index en mémoire,
+# sans requête en base : /autocomplete/?q=nata
+@require_GET
+def event_autocomplete(request):
+    response = JsonResponse({"results": autocomplete_index.suggest(request.GET.get("q", ""))})
+    # Mêmes suggestions pour tous les utilisateurs : réponse réutilisable par le navigateur et les caches partagés
+    patch_cache_control(response, public=True, max_age=settings.AUTOCOMPLETE_CACHE_SECONDS)
+    return response
+
+
+# Succès et échecs du cache des fragments HTML des pages événements (processus courant), par type de fragment
+@require_GET
+@staff_member_required
+def fragment_cache_metrics(request):
+    return JsonResponse(fragment_metrics.snapshot())
 
 
 def accueil_site(request):
@@ -38,9 +97,12 @@ def cgv(request):
     return render(request, 'event_mgmt/cgv.html')
 
 
+# Réponse 304 sans rendu si l'événement, ses places restantes et le panier affiché n'ont pas changé (ETag)
+@condition(etag_func=event_detail_etag)
 def event_detail(request, slug):
     event = get_object_or_404(Event, eventSlug=slug)
-    return render(request, 'event_mgmt/event_detail.html', context={"event": event})
+    return render(request, 'event_mgmt/event_detail.html',
+                  context={"event": event, "seats_left": event.seats_left()})
 
 
 def add_to_cart(request, slug):
@@ -74,11 +136,22 @@ def update_quantities(request):
 def create_checkout_session(request):
     # Récupération du panier de l'utilisateur
     cart = request.user.cart
+    orders = list(cart.orders.select_related("event"))
 
     # Création d'un dico à partir du parcours de toutes les commandes présentes dans le panier
-    line_items = [{"price": order.event.stripe_id,
-                   "quantity": order.quantity}
-                  for order in cart.orders.all()]
+    line_items = [stripe_line_item(order) for order in orders]
+
+    # Les places sont bloquées avant l'envoi vers Stripe, la session expire en même temps que le blocage.
+    # Stripe refuse une session qui expire moins de 30 minutes après sa création : une minute de marge
+    hold_minutes = max(settings.SEAT_HOLD_MINUTES, STRIPE_MIN_SESSION_MINUTES)
+    expires_at = timezone.now() + timedelta(minutes=hold_minutes)
+    hold_reference = f"pending-{uuid.uuid4()}"
+    try:
+        hold_seats(request.user, seats_by_event(orders), hold_reference, expires_at)
+    except InsufficientSeats:
+        messages.add_message(request, messages.ERROR,
+                             "Il ne reste plus assez de places pour l'un des événements de votre panier.")
+        return redirect('cart')
 
     checkout_data = {
                     "payment_method_types": ['card'],
@@ -97,7 +170,20 @@ def create_checkout_session(request):
         checkout_data["customer_creation"] = "always"
 
     # Unpacking du dictionnaire checkout_data
-    session = stripe.checkout.Session.create(**checkout_data)
+    stripe = get_stripe()
+    # Expiration calculée juste avant l'appel (le blocage a pris du temps)
+    checkout_data["expires_at"] = int((timezone.now() + timedelta(minutes=hold_minutes)).timestamp())
+    try:
+        session = stripe.checkout.Session.create(**checkout_data)
+    except stripe.error.StripeError:
+        # Stripe indisponible ou session refusée : places remises en vente, retour au panier
+        release_holds(hold_reference)
+        messages.add_message(request, messages.ERROR,
+                             "Le paiement est momentanément indisponible, veuillez réessayer.")
+        return redirect('cart')
+
+    # Rattachement du blocage à la session Stripe (conversion ou libération depuis le webhook)
+    SeatHold.objects.filter(checkout_session_id=hold_reference).update(checkout_session_id=session.id)
 
     return redirect(session.url, code=303)
 
@@ -124,6 +210,7 @@ def stripe_webhook(request):
     # Clé permettant de vérifier que la requête vient effectivement de Stripe (en tapant l'url dédiée par exemple)
     endpoint_secret = env('ENDPOINT_SECRET')
     event = None
+    stripe = get_stripe()
 
     try:
         # Essai de construction d'un événement
@@ -135,41 +222,73 @@ def stripe_webhook(request):
         # Signature invalide
         return HttpResponse(status=400)
 
-    if event['type'] == 'checkout.session.completed':
-        data = event['data']['object']
+    # Stripe livre un même événement "au moins une fois" : un doublon est acquitté sans aucun autre traitement
+    if ProcessedStripeEvent.objects.filter(event_id=event['id']).exists():
+        return HttpResponse(status=200)
 
-        try:
-            user = get_object_or_404(CustomUser, email=data['customer_details']['email'])
-        except KeyError:
-            return HttpResponse("Invalid user email", status=404)
+    try:
+        # L'événement n'est marqué comme traité que si son traitement est lui aussi enregistré
+        with transaction.atomic():
+            ProcessedStripeEvent.objects.create(event_id=event['id'], type=event['type'])
 
-        complete_order(data=data, user=user)
-        save_shipping_address(data=data, user=user)
+            if event['type'] == 'checkout.session.completed':
+                # Le traitement (billets, QR codes, emails) est confié au worker : réponse immédiate à Stripe
+                enqueue(event['type'], json.loads(payload)['data']['object'])
 
-        return HttpResponse(status=200)
+            if event['type'] == 'checkout.session.expired':
+                # Paiement abandonné : les places bloquées sont remises en vente
+                release_holds(event['data']['object']['id'])
+    except IntegrityError:
+        # Même événement reçu en parallèle : l'autre requête l'a déjà enregistré
+        pass
 
     # Si vérification de la signature réussi
     return HttpResponse(status=200)
 
 
+# Exécutée par le worker (manage.py run_fulfilment_worker) pour chaque paiement validé
+def fulfil_checkout_session(data):
+    user = CustomUser.objects.get(email=data['customer_details']['email'])
+    # Épreuve complète alors que le client a payé : InsufficientSeats fait échouer la tâche, rejouée puis mise de
+    # côté (dead letter) pour qu'un opérateur rembourse le client
+    finalise_order(data=data, user=user)
+    save_shipping_address(data=data, user=user)
+
+
 def complete_order(data, user):
-    orders = user.cart.orders.all()
-    for order in orders:
-        # Création des Ebillets pour chaque commande
-        eticket = Eticket.objects.create(user=user, event=order.event, offer=order.quantity)
-        # Envoi mail pour le Ebillet
-        send_eticket_email(eticket)
-        # Déduction des places vendues du total des sièges dispo pour l'événément
-        order.event.eventSeatAvailable -= order.quantity
-        order.event.save()
-
-    user.stripe_id = data['customer']
-    user.cart.order_ok()
-    user.save()
+    try:
+        finalise_order(data=data, user=user)
+    except InsufficientSeats:
+        return HttpResponse("Not enough seats available", status=409)
 
     return HttpResponse(status=200)
 
 
+def finalise_order(data, user):
+    # Prix de chaque offre lu en base avec les commandes : prix enregistré sur les billets émis
+    orders = list(with_offer_price(user.cart.orders.select_related("event"), seats_field="quantity"))
+    quantities = seats_by_event(orders)
+
+    def finalise():
+        # Déduction des places en premier : si une épreuve est complète, rien n'est créé pour ce panier
+        decrement_seats(quantities)
+        convert_holds(data.get('id'))
+        # Création des Ebillets de toutes les commandes en une seule insertion (QR Code généré ensuite)
+        etickets = Eticket.objects.bulk_create(
+            [Eticket(user=user, event=order.event, offer=order.quantity, price=order.offer_price)
+             for order in orders])
+        # Cumuls des ventes (bulk_create n'envoie pas post_save)
+        record_sales(etickets)
+        # Génération des QR Codes et envoi des mails par le worker, une fois la transaction validée
+        enqueue("etickets.issued", {"ticket_ids": [eticket.pk for eticket in etickets]})
+        user.stripe_id = data['customer']
+        user.cart.order_ok()
+        user.save(update_fields=["stripe_id"])
+
+    # Tout le panier est finalisé dans une seule transaction (rejouée si la base est momentanément verrouillée)
+    run_atomic(finalise, quantities)
+
+
 # Récupération des données renseignées dans Stripe pour les enregistrer dans notre BDD
 def save_shipping_address(data, user):
 